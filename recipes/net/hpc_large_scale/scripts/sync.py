@@ -1,7 +1,13 @@
+import argparse
+import fnmatch
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 import botocore
 from botocore.config import Config
-from ruamel.yaml import YAML
+from ruamel.yaml import YAML, YAMLError
 from ruamel.yaml.compat import StringIO
 
 from pathlib import Path
@@ -10,6 +16,22 @@ SCRIPTS = Path(__file__).resolve().parent
 RECIPE = Path(SCRIPTS).resolve().parent
 ASSETS = Path.joinpath(RECIPE, "assets")
 TEMPLATE_FILE_NAME = Path.joinpath(ASSETS, "main.yaml")
+REPO_ROOT = RECIPE.parent.parent.parent
+TEMPLATE_SUFFIXES = {".yaml", ".yml"}
+
+# Regions are looked up concurrently, at most this many at once
+MAX_WORKERS = 32
+REGION_OPT_STATUSES = ["ENABLED", "ENABLED_BY_DEFAULT", "DISABLED"]
+# Instance families (or exact types) that --hpc scores each zone against
+DEFAULT_HPC_INSTANCE_TYPES = ["hpc6a", "hpc7a", "hpc7g", "c7gn", "p5"]
+NO_OPT_IN = "opt-in-not-required"
+
+# A zone picked by --hpc, and why
+ZoneChoice = namedtuple("ZoneChoice", ["zone_id", "reason"])
+
+_session = None
+_clients = {}
+_clients_lock = threading.Lock()
 
 
 class MyYAML(YAML):
@@ -33,49 +55,252 @@ def region_map(template_file):
     # Extract the region and zone map from the CF template
     yaml = YAML(typ="rt")
     file_contents = yaml.load(template_file)
+    if not isinstance(file_contents, dict):
+        return {}
     return file_contents.get("Mappings", {}).get("RegionMap", {})
 
 
+def _region_map_lookups(node):
+    # The RegionMap keys node looks up with Fn::FindInMap, at any depth
+    if isinstance(node, dict):
+        args = node.get("Fn::FindInMap")
+        children = list(node.values())
+    elif isinstance(node, list):
+        tag = getattr(getattr(node, "tag", None), "value", None)
+        args = node if tag == "!FindInMap" else None
+        children = node
+    else:
+        return set()
+    keys = set()
+    if isinstance(args, list) and len(args) == 3 and args[0] == "RegionMap":
+        if isinstance(args[2], str):
+            keys.add(args[2])
+    for child in children:
+        keys |= _region_map_lookups(child)
+    return keys
+
+
+def guarded_zone_keys(template_file):
+    # Zone keys the template only looks up from resources and outputs that
+    # carry a Condition, so they may map to '' in a region with fewer zones
+    yaml = YAML(typ="rt")
+    file_contents = yaml.load(template_file)
+    if not isinstance(file_contents, dict):
+        return set()
+    guarded, unguarded = set(), set()
+    for section, items in file_contents.items():
+        if section not in ("Resources", "Outputs") or not isinstance(items, dict):
+            unguarded |= _region_map_lookups(items)
+            continue
+        for item in items.values():
+            lookups = _region_map_lookups(item)
+            if isinstance(item, dict) and "Condition" in item:
+                guarded |= lookups
+            else:
+                unguarded |= lookups
+    return guarded - unguarded
+
+
+def client(service, region=None):
+    # Return the shared client for (service, region), creating it on first use.
+    # Creation is serialized because boto3 sessions are not thread-safe; the
+    # clients themselves are, so every lookup for a region reuses one client
+    # and its connection pool.
+    global _session
+    with _clients_lock:
+        if _session is None:
+            _session = boto3.session.Session()
+        key = (service, region)
+        if key not in _clients:
+            config = Config(
+                region_name=region, retries={"max_attempts": 6, "mode": "adaptive"}
+            )
+            _clients[key] = _session.client(service, config=config)
+        return _clients[key]
+
+
 def regions():
-    # Retrieve a sorted list of all available AWS regions
-    account = boto3.client("account")
-    regions = account.list_regions()
-    status_sets = [["ENABLED"], ["ENABLED_BY_DEFAULT"], ["DISABLED"]]
-    region_names = []
-    for ss in status_sets:
-        regions = account.list_regions(RegionOptStatusContains=ss)
-        region_names.extend(
-            sorted([r.get("RegionName") for r in regions.get("Regions", {})])
-        )
-    unique = []
-    [unique.append(rn) for rn in region_names if rn not in unique]
-    return sorted(unique)
+    # Retrieve a sorted list of all AWS regions, whatever their opt-in status,
+    # in one paginated pass
+    paginator = client("account").get_paginator("list_regions")
+    region_names = set()
+    for page in paginator.paginate(RegionOptStatusContains=REGION_OPT_STATUSES):
+        region_names.update(r.get("RegionName") for r in page.get("Regions", []))
+    return sorted(region_names)
 
 
-def availability_zone_ids(region):
-    # Retrieve active zone IDs for a region
-    ec2 = boto3.client("ec2", config=Config(region_name=region))
-    # TODO - consider whether to favor AZ where OptInStatus is opt-in-not-required
-    zones = ec2.describe_availability_zones(
+def availability_zones(region):
+    # Retrieve a region's active zones (ZoneId, ZoneName, OptInStatus, ...)
+    ec2 = client("ec2", region)
+    return ec2.describe_availability_zones(
         Filters=[
             {"Name": "zone-type", "Values": ["availability-zone"]},
             {"Name": "state", "Values": ["available"]},
         ]
     ).get("AvailabilityZones")
-    zone_ids = sorted(list(z.get("ZoneId") for z in zones))
+
+
+def availability_zone_ids(region):
+    # Retrieve active zone IDs for a region. Opt-in status and instance
+    # offerings are only considered by --hpc (see rank_zones).
+    zone_ids = sorted(list(z.get("ZoneId") for z in availability_zones(region)))
     return zone_ids
 
 
+def zone_offerings(region, hpc_types):
+    # Which of hpc_types each of a region's zones offers, in one paginated
+    # query: {zone ID: set of hpc_types entries}. An entry is an instance
+    # family (any size counts) or an exact instance type.
+    patterns = {t: t if "." in t else t + ".*" for t in hpc_types}
+    paginator = client("ec2", region).get_paginator(
+        "describe_instance_type_offerings"
+    )
+    offered = {}
+    for page in paginator.paginate(
+        LocationType="availability-zone-id",
+        Filters=[{"Name": "instance-type", "Values": sorted(set(patterns.values()))}],
+    ):
+        for o in page.get("InstanceTypeOfferings", []):
+            zone = offered.setdefault(o.get("Location"), set())
+            zone.update(
+                t
+                for t, pattern in patterns.items()
+                if fnmatch.fnmatchcase(o.get("InstanceType", ""), pattern)
+            )
+    return offered
+
+
+def zone_reason(offered, hpc_types, opt_in_status):
+    # Why a zone ranks where it does, e.g.
+    # "offers 4/5 HPC types (no p5); opt-in-not-required"
+    missing = [t for t in hpc_types if t not in offered]
+    reason = f"offers {len(hpc_types) - len(missing)}/{len(hpc_types)} HPC types"
+    if missing and len(missing) < len(hpc_types):
+        reason += f" (no {', '.join(missing)})"
+    return f"{reason}; {opt_in_status or 'opt-in status unknown'}"
+
+
+def rank_zones(region, hpc_types):
+    # Rank a region's active zones for large-scale HPC, best first: most of
+    # hpc_types offered, then zones that need no opt-in, then by zone ID.
+    # Returns a ZoneChoice per zone.
+    zones = availability_zones(region)
+    offered = zone_offerings(region, hpc_types)
+
+    def rank(z):
+        coverage = len(offered.get(z.get("ZoneId"), ()))
+        return (-coverage, z.get("OptInStatus") != NO_OPT_IN, z.get("ZoneId"))
+
+    return [
+        ZoneChoice(
+            z.get("ZoneId"),
+            zone_reason(
+                offered.get(z.get("ZoneId"), set()), hpc_types, z.get("OptInStatus")
+            ),
+        )
+        for z in sorted(zones, key=rank)
+    ]
+
+
+def mapping_for(region_name, region_zone_ids, keys):
+    # Pair a template's zone keys (e.g. ZoneId1..ZoneId3) with the region's
+    # zone IDs. The first key gets the last of the first len(keys) sorted zone
+    # IDs, as generate_mapping always has; keys beyond the region's zone count
+    # map to ''. Callers only do that for keys the template guards with a
+    # condition (see too_few_zones).
+    chosen = list(region_zone_ids[: len(keys)])
+    chosen.reverse()
+    chosen += [""] * (len(keys) - len(chosen))
+    return {region_name: dict(zip(keys, chosen))}
+
+
+def hpc_mapping_for(region_name, choices, keys):
+    # Pair a template's zone keys with the region's ranked zones, best first:
+    # the first key gets the best zone. Keys beyond the region's zone count
+    # map to '', as in mapping_for.
+    chosen = [c.zone_id for c in choices[: len(keys)]]
+    chosen += [""] * (len(keys) - len(chosen))
+    return {region_name: dict(zip(keys, chosen))}
+
+
+def too_few_zones(zones, keys, guarded=()):
+    # Whether a region with these zones would map a key the template uses
+    # unconditionally (not in guarded) to ''
+    return any(k not in guarded for k in keys[len(zones) :])
+
+
+def region_mapping(region_name, zones, keys, hpc_types=None):
+    # zones is what zone_lookup(hpc_types) returned for the region
+    if hpc_types:
+        return hpc_mapping_for(region_name, zones, keys)
+    return mapping_for(region_name, zones, keys)
+
+
+def zone_lookup(hpc_types=None):
+    # The per-region lookup: ranked ZoneChoices with hpc_types (--hpc),
+    # sorted zone IDs otherwise
+    if hpc_types:
+        return lambda region_name: rank_zones(region_name, hpc_types)
+    return availability_zone_ids
+
+
+def report_zone_choices(choices_by_region, hpc_types, top):
+    # Print each region's top ranked zones and why they rank there. top only
+    # limits this report; every zone key is still filled from the ranking.
+    print(f"Zones ranked by coverage of {', '.join(hpc_types)}:")
+    for region_name, choices in sorted(choices_by_region.items()):
+        print(f"  {region_name}:")
+        for i, c in enumerate(choices[:top], 1):
+            print(f"    {i}. {c.zone_id}: {c.reason}")
+
+
 def generate_mapping(region_name):
     # Generate the region + zone mapping for a region to include in the CF template
-    mapping = {region_name: {}}
-    region_zone_ids = availability_zone_ids(region_name)[0:3]
-    zids = zone_ids()
-    while zids:
-        zid = zids.pop()
-        rzid = region_zone_ids.pop()
-        mapping[region_name][zid] = rzid
-    return mapping
+    region_zone_ids = availability_zone_ids(region_name)
+    return mapping_for(region_name, region_zone_ids, sorted(zone_ids()))
+
+
+def lookup_zone_ids(region_names, lookup=availability_zone_ids):
+    # Run lookup (by default, fetch the zone IDs) once per region,
+    # concurrently. Returns ({region: result}, regions the calling account
+    # cannot reach).
+    zone_ids_by_region = {}
+    unauth_regions = []
+    region_names = sorted(set(region_names))
+    if not region_names:
+        return zone_ids_by_region, unauth_regions
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(region_names))) as pool:
+        futures = [(r, pool.submit(lookup, r)) for r in region_names]
+        for region_name, future in futures:
+            try:
+                zone_ids_by_region[region_name] = future.result()
+            except botocore.exceptions.ClientError:
+                unauth_regions.append(region_name)
+    return zone_ids_by_region, unauth_regions
+
+
+def generate_mappings(region_names, keys=None, hpc_types=None, top=None, guarded=()):
+    # Generate mappings for many regions concurrently, in the order given.
+    # Returns (mappings, regions the calling account cannot reach
+    # (ClientError), regions with too few zones for the keys not in guarded).
+    # With hpc_types, zones are picked by rank_zones and the top (default: one
+    # per key) of each region's ranking is printed with its reasons.
+    keys = keys or sorted(zone_ids())
+    zones_by_region, unauth_regions = lookup_zone_ids(
+        region_names, zone_lookup(hpc_types)
+    )
+    if hpc_types:
+        report_zone_choices(zones_by_region, hpc_types, top or len(keys))
+    found = [r for r in region_names if r in zones_by_region]
+    short_regions = [
+        r for r in found if too_few_zones(zones_by_region[r], keys, guarded)
+    ]
+    mappings = [
+        region_mapping(r, zones_by_region[r], keys, hpc_types)
+        for r in found
+        if r not in short_regions
+    ]
+    return mappings, unauth_regions, short_regions
 
 
 def render_cf_yaml(mappings):
@@ -90,7 +315,166 @@ def render_cf_yaml(mappings):
     return yaml.dump(yaml_section)
 
 
+def find_region_map_templates(root):
+    # Every CloudFormation template under root with a non-empty
+    # Mappings/RegionMap
+    found = []
+    for path in sorted(root.rglob("*")):
+        if path.suffix not in TEMPLATE_SUFFIXES or not path.is_file():
+            continue
+        text = path.read_text()
+        if "RegionMap" not in text:
+            continue
+        try:
+            if region_map(text):
+                found.append(path)
+        except YAMLError:
+            pass  # not YAML ruamel can load (e.g. a Helm chart); not a template
+    return found
+
+
+def template_zone_keys(rmap):
+    # The zone keys a template's RegionMap uses, from its existing entries
+    keys = []
+    for zones in rmap.values():
+        keys.extend(k for k in zones if k not in keys)
+    return keys
+
+
+def insert_region_mappings(text, mappings):
+    # Append mappings to the template's RegionMap, in place. Only the new
+    # lines are inserted, after the last existing region; every other line,
+    # comment and quoting style of the template is left as it was. Positions
+    # come from ruamel's round-trip loader, which records each key's line.
+    rmap = region_map(text)
+    last = list(rmap.keys())[-1]
+    region_line, region_indent = rmap.lc.key(last)
+    zones = rmap[last]
+    zone_indent = zones.lc.key(next(iter(zones)))[1] if zones else region_indent + 2
+    end = max([region_line] + [zones.lc.key(k)[0] for k in zones]) + 1
+    new_lines = []
+    for m in mappings:
+        for region_name, zone_map in m.items():
+            new_lines.append(" " * region_indent + f"{region_name}:\n")
+            for k, v in zone_map.items():
+                value = v if v else "''"
+                new_lines.append(" " * zone_indent + f"{k}: {value}\n")
+    lines = text.splitlines(keepends=True)
+    if end == len(lines) and lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    return "".join(lines[:end] + new_lines + lines[end:])
+
+
+def sync_all(root, dry_run=False, hpc_types=None, top=None):
+    # Add every available region missing from any RegionMap under root. Each
+    # region's zone IDs are fetched once, however many templates need them.
+    # With hpc_types, zones are picked by rank_zones (see generate_mappings).
+    templates = find_region_map_templates(root)
+    print(f"Found {len(templates)} template(s) with a RegionMap under {root}")
+    print("Fetching available regions...")
+    available_regions = regions()
+    missing = {}
+    for path in templates:
+        template_regions = region_map(path.read_text())
+        missing[path] = [r for r in available_regions if r not in template_regions]
+    needed = sorted({r for regions_ in missing.values() for r in regions_})
+    print(f"Looking up zone IDs for {len(needed)} region(s)...")
+    zones_by_region, unauth_regions = lookup_zone_ids(
+        needed, zone_lookup(hpc_types)
+    )
+    keys_by_path = {p: template_zone_keys(region_map(p.read_text())) for p in templates}
+    guarded_by_path = {p: guarded_zone_keys(p.read_text()) for p in templates}
+    if hpc_types and zones_by_region:
+        most_keys = max(len(keys) for keys in keys_by_path.values())
+        report_zone_choices(zones_by_region, hpc_types, top or most_keys)
+    for path in templates:
+        text = path.read_text()
+        keys = keys_by_path[path]
+        found = [r for r in missing[path] if r in zones_by_region]
+        short_regions = [
+            r
+            for r in found
+            if too_few_zones(zones_by_region[r], keys, guarded_by_path[path])
+        ]
+        mappings = [
+            region_mapping(r, zones_by_region[r], keys, hpc_types)
+            for r in found
+            if r not in short_regions
+        ]
+        rel = path.relative_to(root)
+        if short_regions:
+            print(f"{rel}: too few zones for its unguarded zone keys: {short_regions}")
+        if not mappings:
+            print(f"{rel}: up to date")
+            continue
+        added = [r for m in mappings for r in m]
+        if dry_run:
+            print(f"{rel}: would add {added}")
+            continue
+        path.write_text(insert_region_mappings(text, mappings))
+        print(f"{rel}: added {added}")
+    if unauth_regions:
+        print("Inaccessible to the calling AWS account (not added):", unauth_regions)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate Mappings/RegionMap entries for AWS regions missing "
+        "from this recipe's template, or (--all) from every template in the repo."
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Update every template with a RegionMap under recipes/ in place.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="With --all: report what would be added without writing.",
+    )
+    parser.add_argument(
+        "--hpc",
+        action="store_true",
+        help="Pick each region's zones by how many of the --hpc-types they offer, "
+        "preferring zones that need no opt-in, and print the reason for each pick. "
+        "By default the first zone IDs in sorted order are used.",
+    )
+    parser.add_argument(
+        "--hpc-types",
+        default=",".join(DEFAULT_HPC_INSTANCE_TYPES),
+        help="With --hpc: comma-separated instance families or types to score "
+        "zones by (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        help="With --hpc: print this many of each region's ranked zones, with "
+        "the reasons. Every zone key is still filled from the ranking. Default: "
+        "one per zone key in the template.",
+    )
+    args = parser.parse_args(argv)
+    if args.dry_run and not args.all:
+        parser.error("--dry-run only applies with --all")
+    if args.top is not None and args.top < 1:
+        parser.error("--top must be at least 1")
+    args.hpc_types = [t.strip() for t in args.hpc_types.split(",") if t.strip()]
+    if args.hpc and not args.hpc_types:
+        parser.error("--hpc-types must name at least one instance family or type")
+    return args
+
+
 def main():
+    args = parse_args()
+    hpc_types = args.hpc_types if args.hpc else None
+    if args.all:
+        sync_all(
+            REPO_ROOT / "recipes",
+            dry_run=args.dry_run,
+            hpc_types=hpc_types,
+            top=args.top,
+        )
+        return
+
     print("Analyzing template file", TEMPLATE_FILE_NAME)
 
     # Load region mappings from CF YAML
@@ -99,22 +483,25 @@ def main():
     # Fetch available regions
     print("Fetching available regions...")
     available_regions = regions()
-    # Iterate over available regions, generating a mapping for missing ones
+    # Generate a mapping for every available region missing from the template
     print("Generating RegionMap(s)...")
-    mappings = []
-    unauth_regions = []
-    for ar in available_regions:
-        if ar not in template_regions:
-            try:
-                mappings.append(generate_mapping(ar))
-            except botocore.exceptions.ClientError:
-                unauth_regions.append(ar)
+    missing_regions = [ar for ar in available_regions if ar not in template_regions]
+    mappings, unauth_regions, short_regions = generate_mappings(
+        missing_regions,
+        hpc_types=hpc_types,
+        top=args.top,
+        guarded=guarded_zone_keys(TEMPLATE_FILE_NAME),
+    )
 
     print("RESULTS")
     print(
         "The following regions are not represented in the template file, but are inaccessible to the calling AWS account:"
     )
     print(unauth_regions)
+    print(
+        "The following regions have fewer zones than the template's zone keys, so they cannot be added:"
+    )
+    print(short_regions)
     print(
         "Additional default regions were detected. Include the following in the Mappings/RegionMap section of the template file."
     )
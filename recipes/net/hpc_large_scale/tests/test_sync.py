@@ -0,0 +1,302 @@
+# recipes/net/hpc_large_scale/tests/test_sync.py
+import importlib.util
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+
+SYNC = Path(__file__).resolve().parents[1] / "scripts" / "sync.py"
+spec = importlib.util.spec_from_file_location("sync", SYNC)
+sync = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sync)
+
+# region -> zone IDs; regions missing here are not enabled for the account
+ZONES = {
+    "us-east-1": ["use1-az6", "use1-az1", "use1-az4", "use1-az2"],
+    "eu-west-1": ["euw1-az3", "euw1-az1", "euw1-az2"],
+}
+
+
+class FakePaginator:
+    def __init__(self, pages):
+        self._pages = pages
+
+    def paginate(self, **kwargs):
+        self.kwargs = kwargs
+        yield from self._pages
+
+
+class FakeAccount:
+    def get_paginator(self, name):
+        return FakePaginator(
+            [
+                {"Regions": [{"RegionName": "us-east-1"}, {"RegionName": "ap-east-1"}]},
+                {"Regions": [{"RegionName": "eu-west-1"}, {"RegionName": "us-east-1"}]},
+            ]
+        )
+
+
+class FakeEC2:
+    def __init__(self, region):
+        self.region = region
+
+    def describe_availability_zones(self, Filters):
+        if self.region not in ZONES:
+            raise ClientError(
+                {"Error": {"Code": "AuthFailure", "Message": "not enabled"}},
+                "DescribeAvailabilityZones",
+            )
+        return {
+            "AvailabilityZones": [
+                {"ZoneId": z, "OptInStatus": "opt-in-not-required"}
+                for z in ZONES[self.region]
+            ]
+        }
+
+
+def fake_client(service, region=None):
+    return FakeAccount() if service == "account" else FakeEC2(region)
+
+
+def test_regions_are_deduplicated_and_sorted(monkeypatch):
+    monkeypatch.setattr(sync, "client", fake_client)
+    assert sync.regions() == ["ap-east-1", "eu-west-1", "us-east-1"]
+
+
+def test_lookup_keeps_inaccessible_regions_apart(monkeypatch):
+    monkeypatch.setattr(sync, "client", fake_client)
+    found, unauth = sync.lookup_zone_ids(["us-east-1", "ap-east-1", "eu-west-1"])
+    assert found == {
+        "eu-west-1": ["euw1-az1", "euw1-az2", "euw1-az3"],
+        "us-east-1": ["use1-az1", "use1-az2", "use1-az4", "use1-az6"],
+    }
+    assert unauth == ["ap-east-1"]
+
+
+def test_generate_mappings_keeps_the_given_region_order(monkeypatch):
+    monkeypatch.setattr(sync, "client", fake_client)
+    mappings, unauth, short = sync.generate_mappings(
+        ["us-east-1", "ap-east-1", "eu-west-1"]
+    )
+    assert [list(m)[0] for m in mappings] == ["us-east-1", "eu-west-1"]
+    assert mappings[0] == {
+        "us-east-1": {"ZoneId1": "use1-az4", "ZoneId2": "use1-az2", "ZoneId3": "use1-az1"}
+    }
+    assert unauth == ["ap-east-1"]
+    assert short == []
+
+
+def test_regions_too_small_for_unguarded_keys_are_skipped(monkeypatch):
+    monkeypatch.setattr(sync, "client", fake_client)
+    mappings, unauth, short = sync.generate_mappings(
+        ["us-east-1", "eu-west-1"], keys=KEYS
+    )
+    assert [list(m)[0] for m in mappings] == ["us-east-1"]
+    assert short == ["eu-west-1"]
+    mappings, _, short = sync.generate_mappings(
+        ["us-east-1", "eu-west-1"], keys=KEYS, guarded={"ZoneId4"}
+    )
+    assert mappings[1]["eu-west-1"]["ZoneId4"] == ""
+    assert short == []
+
+
+TEMPLATE = """\
+AWSTemplateFormatVersion: '2010-09-09'
+# Zones per region; '' where a region has fewer zones than keys
+Mappings:
+  RegionMap:
+    us-east-1:
+      ZoneId1: use1-az6
+      ZoneId2: use1-az2
+      ZoneId3: use1-az1
+      ZoneId4: use1-az4
+    eu-west-1:  # three zones only
+      ZoneId1: euw1-az3
+      ZoneId2: euw1-az1
+      ZoneId3: euw1-az2
+      ZoneId4: ''
+Resources:
+  Vpc:
+    Type: AWS::EC2::VPC
+    Properties:
+      CidrBlock: !Ref Cidr
+  SubnetA:
+    Type: AWS::EC2::Subnet
+    Properties:
+      AvailabilityZoneId: !FindInMap [RegionMap, !Ref "AWS::Region", ZoneId1]
+  SubnetB:
+    Type: AWS::EC2::Subnet
+    Properties:
+      AvailabilityZoneId:
+        Fn::FindInMap: [RegionMap, !Ref "AWS::Region", ZoneId2]
+  SubnetC:
+    Condition: HasMoreThan2Azs
+    Type: AWS::EC2::Subnet
+    Properties:
+      AvailabilityZoneId: !FindInMap [RegionMap, !Ref "AWS::Region", ZoneId3]
+  SubnetD:
+    Condition: HasMoreThan3Azs
+    Type: AWS::EC2::Subnet
+    Properties:
+      AvailabilityZoneId: !FindInMap [RegionMap, !Ref "AWS::Region", ZoneId4]
+Outputs:
+  ZoneD:
+    Value: !FindInMap [RegionMap, !Ref "AWS::Region", ZoneId4]
+    Condition: HasMoreThan3Azs
+"""
+
+
+KEYS = ["ZoneId1", "ZoneId2", "ZoneId3", "ZoneId4"]
+NEW_REGION_LINES = (
+    "    ca-west-1:\n"
+    "      ZoneId1: caw1-az2\n"
+    "      ZoneId2: caw1-az1\n"
+    "      ZoneId3: ''\n"
+    "      ZoneId4: ''\n"
+)
+
+
+def with_new_region(template):
+    end = template.index("Resources:")
+    return template[:end] + NEW_REGION_LINES + template[end:]
+
+
+def test_insert_adds_only_the_new_lines():
+    mappings = [sync.mapping_for("ca-west-1", ["caw1-az1", "caw1-az2"], KEYS)]
+    updated = sync.insert_region_mappings(TEMPLATE, mappings)
+    assert updated == with_new_region(TEMPLATE)
+    assert sync.region_map(updated)["ca-west-1"]["ZoneId3"] == ""
+
+
+def test_guarded_zone_keys_need_a_condition_on_every_lookup():
+    assert sync.guarded_zone_keys(TEMPLATE) == {"ZoneId3", "ZoneId4"}
+    unguarded_output = TEMPLATE + (
+        "  ZoneC:\n"
+        "    Value: !FindInMap [RegionMap, !Ref \"AWS::Region\", ZoneId3]\n"
+    )
+    assert sync.guarded_zone_keys(unguarded_output) == {"ZoneId4"}
+
+
+def test_sync_all_updates_templates_in_place(monkeypatch, tmp_path):
+    monkeypatch.setitem(ZONES, "ca-west-1", ["caw1-az2", "caw1-az1"])
+    monkeypatch.setitem(ZONES, "me-west-1", ["mew1-az1"])
+    monkeypatch.setattr(sync, "client", fake_client)
+    monkeypatch.setattr(
+        sync,
+        "regions",
+        lambda: ["ap-east-1", "ca-west-1", "eu-west-1", "me-west-1", "us-east-1"],
+    )
+    template = tmp_path / "recipe" / "assets" / "main.yaml"
+    template.parent.mkdir(parents=True)
+    template.write_text(TEMPLATE)
+    (tmp_path / "chart.yaml").write_text("RegionMap: [{{ .Values.unclosed\n")
+    (tmp_path / "list.yaml").write_text("- RegionMap\n")
+
+    assert sync.find_region_map_templates(tmp_path) == [template]
+    assert sync.template_zone_keys(sync.region_map(TEMPLATE)) == KEYS
+    sync.sync_all(tmp_path, dry_run=True)
+    assert template.read_text() == TEMPLATE
+    sync.sync_all(tmp_path)
+    # ap-east-1 is not enabled for the account, and me-west-1's one zone
+    # would leave the unconditional ZoneId2 subnet empty
+    assert template.read_text() == with_new_region(TEMPLATE)
+
+
+def test_dry_run_needs_all():
+    with pytest.raises(SystemExit):
+        sync.parse_args(["--dry-run"])
+
+
+class HpcEC2:
+    # Four zones: az1 needs opt-in, az2/az4 tie on coverage, az3 has nothing
+    ZONES = [
+        ("use1-az1", "opted-in"),
+        ("use1-az2", "opt-in-not-required"),
+        ("use1-az3", "opt-in-not-required"),
+        ("use1-az4", "opt-in-not-required"),
+    ]
+    OFFERINGS = {
+        "use1-az1": ["hpc7a.96xlarge", "hpc7a.48xlarge", "p5.48xlarge"],
+        "use1-az2": ["hpc7a.96xlarge", "c7gn.16xlarge"],
+        "use1-az3": ["c7gn.xlarge"],
+        "use1-az4": ["hpc7a.48xlarge", "c7gn.16xlarge"],
+    }
+
+    def describe_availability_zones(self, Filters):
+        return {
+            "AvailabilityZones": [
+                {"ZoneId": z, "OptInStatus": s} for z, s in self.ZONES
+            ]
+        }
+
+    def get_paginator(self, name):
+        assert name == "describe_instance_type_offerings"
+        self.paginator = FakePaginator(
+            [
+                {
+                    "InstanceTypeOfferings": [
+                        {"Location": z, "InstanceType": t}
+                        for z, types in self.OFFERINGS.items()
+                        for t in types
+                    ]
+                }
+            ]
+        )
+        return self.paginator
+
+
+def test_rank_zones_by_hpc_coverage_then_opt_in(monkeypatch):
+    ec2 = HpcEC2()
+    monkeypatch.setattr(sync, "client", lambda service, region=None: ec2)
+    hpc_types = ["hpc7a", "p5", "c7gn.16xlarge"]
+    choices = sync.rank_zones("us-east-1", hpc_types)
+
+    # Families match any size; exact types match only themselves.
+    assert ec2.paginator.kwargs == {
+        "LocationType": "availability-zone-id",
+        "Filters": [
+            {"Name": "instance-type", "Values": ["c7gn.16xlarge", "hpc7a.*", "p5.*"]}
+        ],
+    }
+    assert choices == [
+        sync.ZoneChoice(
+            "use1-az2", "offers 2/3 HPC types (no p5); opt-in-not-required"
+        ),
+        sync.ZoneChoice(
+            "use1-az4", "offers 2/3 HPC types (no p5); opt-in-not-required"
+        ),
+        sync.ZoneChoice(
+            "use1-az1", "offers 2/3 HPC types (no c7gn.16xlarge); opted-in"
+        ),
+        sync.ZoneChoice("use1-az3", "offers 0/3 HPC types; opt-in-not-required"),
+    ]
+
+
+def test_hpc_mapping_fills_every_key_from_the_ranking():
+    choices = [sync.ZoneChoice(z, "") for z in ["use1-az2", "use1-az4", "use1-az1"]]
+    assert sync.hpc_mapping_for("us-east-1", choices, KEYS[:3]) == {
+        "us-east-1": {
+            "ZoneId1": "use1-az2",
+            "ZoneId2": "use1-az4",
+            "ZoneId3": "use1-az1",
+        }
+    }
+
+
+def test_top_limits_only_the_report(monkeypatch, capsys):
+    monkeypatch.setattr(sync, "client", lambda service, region=None: HpcEC2())
+    mappings, _, _ = sync.generate_mappings(
+        ["us-east-1"], keys=KEYS[:3], hpc_types=["hpc7a"], top=1
+    )
+    assert mappings == [
+        {
+            "us-east-1": {
+                "ZoneId1": "use1-az2",
+                "ZoneId2": "use1-az4",
+                "ZoneId3": "use1-az1",
+            }
+        }
+    ]
+    report = capsys.readouterr().out
+    assert "1. use1-az2: offers 1/1 HPC types; opt-in-not-required" in report
+    assert "2." not in report
@@ -0,0 +1,175 @@
+"""On-disk cache for the PCS instance availability audit.
+
+Stores the results of EC2 DescribeAvailabilityZones and
+DescribeInstanceTypeOfferings per region so that repeat runs of
+scripts/audit_pcs_instance_availability.py only call AWS for regions and
+instance types whose cached entries are missing or older than the
+configured max age.
+
+Entries are keyed by (region, location_type, instance_type), so adding a
+type to the manifest only fetches that type; the rest of the region is
+served from cache. Each entry carries its own fetch timestamp and is judged
+fresh or stale individually.
+
+The cache is a single SQLite file. AZ names (e.g. us-east-1a) are mapped
+per AWS account, so use a separate --cache-dir per account.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+CACHE_FILENAME = "pcs-offerings.sqlite3"
+
+# Bump when the table layout changes; older files are discarded.
+SCHEMA_VERSION = 1
+
+# Location type stored in the offerings table. Entries hold the sorted list
+# of AZ names offering the type, [] when it is not offered in the region;
+# region-level availability is derived from them.
+LOCATION_AZ = "availability-zone"
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters, one per cached entry looked up."""
+
+    hits: int = 0
+    misses: int = 0
+    refreshed_regions: set[str] = field(default_factory=set)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = (100.0 * self.hits / total) if total else 0.0
+        return (
+            f"Offerings cache: {self.hits} hit(s), {self.misses} miss(es) "
+            f"({rate:.0f}% hit rate), {len(self.refreshed_regions)} region(s) "
+            "queried from AWS"
+        )
+
+
+class OfferingsCache:
+    """Thread-safe SQLite cache of per-region offerings with per-entry TTLs.
+
+    max_age is in seconds. Regions listed in refresh_regions are always
+    treated as stale on read (their fresh results are still written back).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_age: float,
+        refresh_regions: Iterable[str] = (),
+    ) -> None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.path = cache_dir / CACHE_FILENAME
+        self.max_age = max_age
+        self.refresh_regions = set(refresh_regions)
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        import sqlite3  # only runs with --cache-dir need it
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self) -> None:
+        with self._lock, self._conn:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                self._conn.execute("DROP TABLE IF EXISTS offerings")
+                self._conn.execute("DROP TABLE IF EXISTS zones")
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS offerings ("
+                " region TEXT NOT NULL,"
+                " location_type TEXT NOT NULL,"
+                " instance_type TEXT NOT NULL,"
+                " locations TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (region, location_type, instance_type))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS zones ("
+                " region TEXT PRIMARY KEY,"
+                " total_azs INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _cutoff(self, region: str) -> float | None:
+        """Oldest acceptable fetched_at for region, or None if forced stale."""
+        if region in self.refresh_regions:
+            return None
+        return time.time() - self.max_age
+
+    def get_total_azs(self, region: str) -> int | None:
+        cutoff = self._cutoff(region)
+        row = None
+        if cutoff is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT total_azs FROM zones WHERE region = ? AND fetched_at >= ?",
+                    (region, cutoff),
+                ).fetchone()
+        with self._lock:
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+        return int(row[0])
+
+    def put_total_azs(self, region: str, total_azs: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO zones VALUES (?, ?, ?)",
+                (region, total_azs, time.time()),
+            )
+
+    def get_offerings(
+        self, region: str, location_type: str, instance_types: Iterable[str]
+    ) -> dict[str, list[str]]:
+        """Return {instance_type: locations} for fresh entries only.
+
+        Types absent from the result are stale or were never fetched.
+        """
+        wanted = sorted(set(instance_types))
+        cutoff = self._cutoff(region)
+        found: dict[str, list[str]] = {}
+        if cutoff is not None and wanted:
+            placeholders = ",".join("?" * len(wanted))
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT instance_type, locations FROM offerings"
+                    " WHERE region = ? AND location_type = ? AND fetched_at >= ?"
+                    f" AND instance_type IN ({placeholders})",
+                    (region, location_type, cutoff, *wanted),
+                ).fetchall()
+            found = {itype: json.loads(locs) for itype, locs in rows}
+        with self._lock:
+            self.stats.hits += len(found)
+            self.stats.misses += len(wanted) - len(found)
+        return found
+
+    def put_offerings(
+        self, region: str, location_type: str, entries: dict[str, list[str]]
+    ) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO offerings VALUES (?, ?, ?, ?, ?)",
+                [
+                    (region, location_type, itype, json.dumps(sorted(locs)), now)
+                    for itype, locs in entries.items()
+                ],
+            )
+
+    def mark_refreshed(self, region: str) -> None:
+        with self._lock:
+            self.stats.refreshed_regions.add(region)
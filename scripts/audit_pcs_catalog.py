@@ -0,0 +1,298 @@
+"""Full-catalog availability for the PCS audit (--all-types).
+
+The manifest audit keeps a set of AZ names per (region, type), which is
+fine for a few dozen types but not for every EC2 instance type in every
+PCS region and AZ. AvailabilityCatalog stores the same information as
+packed bitsets instead:
+
+  - every AZ name and instance type name is stored once, in sorted lists;
+    cells refer to them by index,
+  - AZs are numbered region by region, so a region is a contiguous run of
+    bits,
+  - each type's availability is one Python int with a bit per AZ (rows),
+    and each AZ's is one int with a bit per type (cols).
+
+Questions such as "how many AZs of region R offer type T", "which types
+does AZ Z offer" or "which regions offer any size of family F" become a
+handful of bitwise operations and popcounts (int.bit_count) on these ints,
+done in C, rather than Python loops over sets. A full catalog of ~1000
+types x ~30 regions x ~100 AZs takes well under a megabyte.
+"""
+from __future__ import annotations
+
+import csv
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+def _bits(mask: int) -> Iterator[int]:
+    """Yield the indices of the set bits of mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _family(instance_type: str) -> str:
+    return instance_type.split(".", 1)[0]
+
+
+class CatalogBuilder:
+    """Collects per-region offerings, then lays them out as bitsets."""
+
+    def __init__(self) -> None:
+        self._zones: dict[str, set[str]] = {}
+        self._offerings: dict[str, list[tuple[str, str]]] = {}
+
+    def add_region(
+        self,
+        region: str,
+        zone_names: Iterable[str],
+        offerings: Iterable[tuple[str, str]],
+    ) -> None:
+        """Record one region's AZs and its (instance_type, az) offerings."""
+        pairs = list(offerings)
+        # An AZ can offer types without being listed as "available"
+        # (e.g. impaired); keep it rather than dropping its offerings.
+        self._zones[region] = set(zone_names) | {az for _, az in pairs}
+        self._offerings[region] = pairs
+
+    def build(self, regions: Iterable[str]) -> "AvailabilityCatalog":
+        """Return the catalog over regions; ones never added have no data."""
+        regions = list(regions)
+        types = sorted({t for pairs in self._offerings.values() for t, _ in pairs})
+        type_of = {t: i for i, t in enumerate(types)}
+
+        azs: list[str] = []
+        region_first = array("H")
+        region_azs = array("H")
+        has_data = 0
+        for col, region in enumerate(regions):
+            zones = sorted(self._zones.get(region, ()))
+            region_first.append(len(azs))
+            region_azs.append(len(zones))
+            azs.extend(zones)
+            if region in self._offerings:
+                has_data |= 1 << col
+        az_of = {az: i for i, az in enumerate(azs)}
+
+        rows = [0] * len(types)
+        cols = [0] * len(azs)
+        for region in regions:
+            for itype, az in self._offerings.get(region, ()):
+                t, a = type_of[itype], az_of[az]
+                rows[t] |= 1 << a
+                cols[a] |= 1 << t
+        return AvailabilityCatalog(
+            types, regions, azs, region_first, region_azs, has_data, rows, cols
+        )
+
+
+class AvailabilityCatalog:
+    """Every instance type x region x AZ, as packed bitsets."""
+
+    def __init__(
+        self,
+        types: list[str],
+        regions: list[str],
+        azs: list[str],
+        region_first: array,
+        region_azs: array,
+        has_data: int,
+        rows: list[int],
+        cols: list[int],
+    ) -> None:
+        self.types = types
+        self.regions = regions
+        self.azs = azs
+        self.region_first = region_first
+        self.region_azs = region_azs
+        self.has_data = has_data
+        self.rows = rows
+        self.cols = cols
+        self.type_of = {t: i for i, t in enumerate(types)}
+        self.region_of = {r: i for i, r in enumerate(regions)}
+        self.az_of = {az: i for i, az in enumerate(azs)}
+        self.families = sorted({_family(t) for t in types})
+        # family -> bitset over type indices
+        self.family_types: dict[str, int] = {}
+        for i, t in enumerate(types):
+            f = _family(t)
+            self.family_types[f] = self.family_types.get(f, 0) | (1 << i)
+
+    # -- masks ---------------------------------------------------------------
+
+    def region_mask(self, region: str) -> int:
+        col = self.region_of[region]
+        return ((1 << self.region_azs[col]) - 1) << self.region_first[col]
+
+    def has_region_data(self, region: str) -> bool:
+        return bool(self.has_data >> self.region_of[region] & 1)
+
+    def region_types(self, region: str) -> int:
+        """Type bitset offered in at least one AZ of region."""
+        col = self.region_of[region]
+        first = self.region_first[col]
+        out = 0
+        for a in range(first, first + self.region_azs[col]):
+            out |= self.cols[a]
+        return out
+
+    def family_row(self, family: str) -> int:
+        """AZ bitset offering at least one size of family."""
+        out = 0
+        for t in _bits(self.family_types.get(family, 0)):
+            out |= self.rows[t]
+        return out
+
+    # -- queries -------------------------------------------------------------
+
+    def az_count(self, instance_type: str, region: str) -> int:
+        col = self.region_of[region]
+        row = self.rows[self.type_of[instance_type]] >> self.region_first[col]
+        return (row & ((1 << self.region_azs[col]) - 1)).bit_count()
+
+    def azs_for(self, instance_type: str, region: str | None = None) -> list[str]:
+        row = self.rows[self.type_of[instance_type]]
+        if region is not None:
+            row &= self.region_mask(region)
+        return [self.azs[a] for a in _bits(row)]
+
+    def regions_for(self, instance_type: str, min_azs: int = 1) -> list[str]:
+        row = self.rows[self.type_of[instance_type]]
+        return [
+            r for r in self.regions if (row & self.region_mask(r)).bit_count() >= min_azs
+        ]
+
+    def family_regions(self, family: str, min_azs: int = 1) -> list[str]:
+        """Regions where at least min_azs AZs offer some size of family."""
+        row = self.family_row(family)
+        return [
+            r for r in self.regions if (row & self.region_mask(r)).bit_count() >= min_azs
+        ]
+
+    def types_in_az(self, az: str) -> list[str]:
+        return [self.types[t] for t in _bits(self.cols[self.az_of[az]])]
+
+    def types_in_region(self, region: str) -> list[str]:
+        return [self.types[t] for t in _bits(self.region_types(region))]
+
+    def count_matrix(self) -> array:
+        """AZ counts, row-major over (types x regions), as an "H" array."""
+        spans = [
+            (self.region_first[c], (1 << self.region_azs[c]) - 1)
+            for c in range(len(self.regions))
+        ]
+        out = array("H")
+        for row in self.rows:
+            out.extend((row >> first & mask).bit_count() for first, mask in spans)
+        return out
+
+    def nbytes(self) -> int:
+        """Approximate size of the bitsets and index arrays, in bytes."""
+        return (
+            sum(sys.getsizeof(x) for x in self.rows)
+            + sum(sys.getsizeof(x) for x in self.cols)
+            + self.region_first.itemsize * len(self.region_first) * 2
+        )
+
+
+# -----------------------------------------------------------------------------
+# Reports
+# -----------------------------------------------------------------------------
+
+
+def write_catalog_csv(path: Path, catalog: AvailabilityCatalog) -> None:
+    """One row per offered (type, region), with the offering AZs."""
+    counts = catalog.count_matrix()
+    ncols = len(catalog.regions)
+    with path.open("w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(
+            ["instance_type", "family", "region", "azs_offered", "total_azs", "azs"]
+        )
+        for t, itype in enumerate(catalog.types):
+            row = catalog.rows[t]
+            for col, region in enumerate(catalog.regions):
+                n = counts[t * ncols + col]
+                if not n:
+                    continue
+                first = catalog.region_first[col]
+                mask = (1 << catalog.region_azs[col]) - 1
+                azs = [catalog.azs[first + a] for a in _bits(row >> first & mask)]
+                w.writerow(
+                    [
+                        itype,
+                        _family(itype),
+                        region,
+                        n,
+                        catalog.region_azs[col],
+                        ";".join(azs),
+                    ]
+                )
+
+
+def write_catalog_markdown(
+    path: Path, catalog: AvailabilityCatalog, inaccessible: Iterable[str] = ()
+) -> None:
+    """Per-region totals and a family x region table of sizes offered."""
+    regions = catalog.regions
+    ncols = len(regions)
+    region_types = [catalog.region_types(r) for r in regions]
+    lines = [
+        "# PCS Full Instance Catalog",
+        "",
+        f"{len(catalog.types)} instance types in {len(catalog.families)} "
+        f"families across {len(regions)} regions and {len(catalog.azs)} AZs "
+        "(from EC2 DescribeInstanceTypeOfferings).",
+        "",
+    ]
+    inaccessible = sorted(inaccessible)
+    if inaccessible:
+        lines += [
+            f"Regions without data (credentials cannot reach): "
+            f"{', '.join(inaccessible)}",
+            "",
+        ]
+
+    lines += [
+        "## Regions",
+        "",
+        "| Region | AZs | Types offered | Families offered |",
+        "|---|---:|---:|---:|",
+    ]
+    for col, region in enumerate(regions):
+        if not catalog.has_region_data(region):
+            lines.append(f"| {region} | — | — | — |")
+            continue
+        offered = region_types[col]
+        families = sum(1 for m in catalog.family_types.values() if m & offered)
+        lines.append(
+            f"| {region} | {catalog.region_azs[col]} | {offered.bit_count()} "
+            f"| {families} |"
+        )
+    lines.append("")
+
+    lines += [
+        "## Families",
+        "",
+        "Each cell is the number of sizes of the family offered in the region "
+        "(in at least one AZ). `—` means none; blank means no data.",
+        "",
+        "| Family | " + " | ".join(regions) + " |",
+        "|---|" + "---:|" * ncols,
+    ]
+    for family in catalog.families:
+        members = catalog.family_types[family]
+        cells = []
+        for col, region in enumerate(regions):
+            if not catalog.has_region_data(region):
+                cells.append("")
+                continue
+            n = (members & region_types[col]).bit_count()
+            cells.append(str(n) if n else "—")
+        lines.append(f"| {family} | " + " | ".join(cells) + " |")
+    lines.append("")
+    path.write_text("\n".join(lines))
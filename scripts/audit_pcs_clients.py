@@ -0,0 +1,269 @@
+"""Shared AWS client pool for the PCS instance availability audit.
+
+The audit fans out to 30+ regions from worker threads. Every
+session.client() call builds a new client class and endpoint, and the
+first one per service also loads and parses the service model and the
+endpoint rules (about a quarter of a second for EC2). boto3.Session is
+not safe to call from several threads at once, so client construction is
+serialized, and a slow first client holds up every region behind it.
+
+ClientPool owns that construction:
+
+  - one client per (service, region), built once under the pool's lock
+    and then shared by every lookup for that region (clients themselves
+    are thread-safe); its HTTP connection pool, sized to the per-region
+    concurrency limit, is reused by all of the region's calls;
+  - prewarm() builds the first client of a service in the background, so
+    the model and endpoint data load while the docs page is fetched
+    rather than on the first region's critical path;
+  - optional tracing hooks are installed once, when a client is built;
+  - creation times are recorded, and summary() reports them.
+
+RoutedClientPool extends this to several AWS profiles at once: a
+ProfileMap picks the profile for each region (by partition or region
+glob), and each profile gets its own session and ClientPool, so the
+commercial, GovCloud and China partitions are audited in one run.
+"""
+from __future__ import annotations
+
+import fnmatch
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Iterable
+
+from .audit_pcs_concurrency import REGION_MAX_LIMIT
+from .audit_pcs_trace import Tracer
+
+if TYPE_CHECKING:
+    from botocore.config import Config
+
+
+@lru_cache(maxsize=None)
+def boto_config() -> Config:
+    """The audit's client config; botocore is imported on first use."""
+    from botocore.config import Config
+
+    return Config(
+        retries={"max_attempts": 6, "mode": "adaptive"},
+        connect_timeout=5,
+        read_timeout=30,
+        # One connection per in-flight call the controller allows a region.
+        max_pool_connections=REGION_MAX_LIMIT,
+    )
+
+
+@dataclass
+class ClientPoolStats:
+    created: int = 0
+    seconds: float = 0.0
+    first_seconds: float = 0.0
+    slowest: float = 0.0
+    slowest_region: str = ""
+    wait_seconds: float = 0.0
+
+    def summary(self) -> str:
+        if not self.created:
+            return "Clients: none created"
+        rest = self.created - 1
+        mean = (self.seconds - self.first_seconds) / rest if rest else 0.0
+        return (
+            f"Clients: {self.created} created in {self.seconds:.2f}s "
+            f"(first {self.first_seconds:.2f}s incl. model load, then "
+            f"{mean * 1000:.0f} ms each; slowest {self.slowest_region} "
+            f"{self.slowest:.2f}s); {self.wait_seconds:.2f}s waiting for "
+            "the pool lock"
+        )
+
+
+class ClientPool:
+    """Thread-safe, per-(service, region) cache of boto3 clients."""
+
+    def __init__(
+        self,
+        session,
+        config: Config | None = None,
+        tracer: Tracer | None = None,
+    ) -> None:
+        self.session = session
+        self.config = config
+        self.tracer = tracer
+        self.stats = ClientPoolStats()
+        self._clients: dict[tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+
+    def client(self, service: str, region: str):
+        key = (service, region)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        t0 = time.perf_counter()
+        with self._lock:
+            waited = time.perf_counter() - t0
+            client = self._clients.get(key)
+            if client is not None:
+                self.stats.wait_seconds += waited
+                return client
+            t1 = time.perf_counter()
+            client = self.session.client(
+                service, region_name=region, config=self.config or boto_config()
+            )
+            if self.tracer is not None:
+                self.tracer.install(client, region)
+            self._record(region, time.perf_counter() - t1, waited)
+            self._clients[key] = client
+        return client
+
+    def _record(self, region: str, seconds: float, waited: float) -> None:
+        s = self.stats
+        if not s.created:
+            s.first_seconds = seconds
+        s.created += 1
+        s.seconds += seconds
+        s.wait_seconds += waited
+        if seconds > s.slowest:
+            s.slowest, s.slowest_region = seconds, region
+
+    def prewarm(self, service: str, region: str) -> threading.Thread:
+        """Build the (service, region) client in a background thread.
+
+        The first client of a service pays for loading its model and
+        endpoint rules; later clients reuse them from the session.
+        """
+
+        def _build() -> None:
+            try:
+                self.client(service, region)
+            except Exception:
+                pass  # the region's first real lookup will raise it again
+
+        thread = threading.Thread(
+            target=_build,
+            name=f"prewarm-{service}",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def summary(self) -> str:
+        return self.stats.summary()
+
+
+# -----------------------------------------------------------------------------
+# Several profiles at once (--profile-map)
+# -----------------------------------------------------------------------------
+
+# Each partition's home region, where its SSM global-infrastructure
+# parameters are read from.
+PARTITION_HOME_REGIONS = {
+    "aws": "us-east-1",
+    "aws-us-gov": "us-gov-west-1",
+    "aws-cn": "cn-north-1",
+}
+
+
+def partition_of(region: str) -> str:
+    """The AWS partition of a region code (aws, aws-us-gov or aws-cn)."""
+    if region.startswith("us-gov-"):
+        return "aws-us-gov"
+    if region.startswith("cn-"):
+        return "aws-cn"
+    return "aws"
+
+
+class ProfileMap:
+    """Which AWS profile to use for which region.
+
+    Entries are "KEY=PROFILE". KEY is a partition name (aws, aws-us-gov,
+    aws-cn) or a glob over region codes (e.g. "me-*", "ap-east-1").
+    Region globs are tried first, in the order given, then the region's
+    partition, then the default profile (None: the default credential
+    chain).
+    """
+
+    def __init__(self, entries: Iterable[str] = (), default: str | None = None):
+        self.default = default
+        self.partitions: dict[str, str] = {}
+        self.globs: list[tuple[str, str]] = []
+        for entry in entries:
+            key, sep, profile = entry.partition("=")
+            key, profile = key.strip(), profile.strip()
+            if not sep or not key or not profile:
+                raise ValueError(
+                    f"invalid profile mapping {entry!r}: expected KEY=PROFILE, "
+                    "e.g. aws-us-gov=govcloud"
+                )
+            if key in PARTITION_HOME_REGIONS:
+                self.partitions[key] = profile
+            else:
+                self.globs.append((key, profile))
+
+    def profile_for(self, region: str) -> str | None:
+        for pattern, profile in self.globs:
+            if fnmatch.fnmatchcase(region, pattern):
+                return profile
+        return self.partitions.get(partition_of(region), self.default)
+
+    def discovery_regions(self) -> list[str]:
+        """Home regions of every partition to discover PCS regions in."""
+        return [PARTITION_HOME_REGIONS["aws"]] + [
+            PARTITION_HOME_REGIONS[p] for p in sorted(self.partitions) if p != "aws"
+        ]
+
+
+class RoutedClientPool:
+    """A ClientPool per profile; clients are routed by region.
+
+    Presents the same client()/prewarm()/summary() interface as ClientPool,
+    so one AZ-detail fan-out covers every partition concurrently, each
+    region talking to AWS through its own profile's session.
+    """
+
+    def __init__(
+        self,
+        profiles: ProfileMap,
+        session_factory: Callable[[str | None], object],
+        config: Config | None = None,
+        tracer: Tracer | None = None,
+    ) -> None:
+        self.profiles = profiles
+        self._session_factory = session_factory
+        self._config = config
+        self._tracer = tracer
+        self.pools: dict[str | None, ClientPool] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        return self.pool_for(self.profiles.default).session
+
+    def pool_for(self, profile: str | None) -> ClientPool:
+        with self._lock:
+            pool = self.pools.get(profile)
+            if pool is None:
+                pool = ClientPool(
+                    self._session_factory(profile), self._config, self._tracer
+                )
+                self.pools[profile] = pool
+            return pool
+
+    def client(self, service: str, region: str):
+        return self.pool_for(self.profiles.profile_for(region)).client(
+            service, region
+        )
+
+    def prewarm(self, service: str, region: str) -> threading.Thread:
+        return self.pool_for(self.profiles.profile_for(region)).prewarm(
+            service, region
+        )
+
+    def summary(self) -> str:
+        if len(self.pools) == 1:
+            return next(iter(self.pools.values())).summary()
+        return "; ".join(
+            f"[{profile or 'default'}] {pool.summary()}"
+            for profile, pool in sorted(
+                self.pools.items(), key=lambda kv: kv[0] or ""
+            )
+        )
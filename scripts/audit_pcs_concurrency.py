@@ -0,0 +1,243 @@
+"""Throttle-aware concurrency control for the PCS instance availability audit.
+
+EC2 Describe* rate limits apply per account and per region. A fixed-size
+worker pool either under-uses that budget (wall time grows with the number
+of regions) or, in a busy shared CI account, trips throttling and then
+relies entirely on botocore's retry sleeps.
+
+ConcurrencyController instead gives every region and the account as a whole
+an AIMD (additive-increase, multiplicative-decrease) limit on in-flight
+calls. Limits start wide, grow by roughly one slot per window of successful
+calls, and are halved when a Throttling / RequestLimitExceeded error is seen,
+either inside botocore's retry loop (via a needs-retry event hook) or after
+botocore gives up (in which case the controller backs off and retries the
+call itself).
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+THROTTLE_CODES = frozenset(
+    {
+        "Throttling",
+        "ThrottlingException",
+        "RequestLimitExceeded",
+        "TooManyRequestsException",
+        "RequestThrottled",
+        "RequestThrottledException",
+    }
+)
+
+# Account-wide budget: start wide, never exceed the pool size.
+ACCOUNT_INITIAL_LIMIT = 32
+ACCOUNT_MAX_LIMIT = 64
+
+# Per-region budget. A region's tasks are its AZ count lookup plus one
+# offerings query per chunk of at most 200 filter values, each fetching its
+# pages one at a time. The manifest plans to a single query today, so the
+# initial 4 slots run a region's whole plan at once with room to spare. The
+# cap of 8 only bites on a long --types list that plans to many chunks,
+# keeping one such region from taking most of the account-wide budget.
+REGION_INITIAL_LIMIT = 4
+REGION_MAX_LIMIT = 8
+
+# Do not halve a limit more than once per this many seconds; a burst of
+# throttles from calls that were already in flight is one congestion event.
+DECREASE_COOLDOWN = 1.0
+
+# Controller-level retries after botocore has exhausted its own attempts.
+MAX_THROTTLE_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    # Imported here so that loading this module does not load botocore.
+    from botocore.exceptions import ClientError
+
+    if not isinstance(exc, ClientError):
+        return False
+    return exc.response.get("Error", {}).get("Code", "") in THROTTLE_CODES
+
+
+class AimdLimit:
+    """A counting semaphore whose capacity follows an AIMD schedule."""
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1) -> None:
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.peak = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            before = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if int(self.limit) > before:
+                self._cond.notify()
+
+    def on_throttle(self) -> bool:
+        """Halve the limit unless it was halved very recently.
+
+        Returns True if the limit was reduced.
+        """
+        now = time.monotonic()
+        with self._cond:
+            if now - self._last_decrease < DECREASE_COOLDOWN:
+                return False
+            self._last_decrease = now
+            self.limit = max(float(self.minimum), self.limit / 2.0)
+            return True
+
+
+@dataclass
+class ControllerStats:
+    calls: int = 0
+    throttles: int = 0
+    retries: int = 0
+    throttles_by_region: dict[str, int] = field(default_factory=dict)
+
+
+class ConcurrencyController:
+    """Per-account and per-region AIMD limits on in-flight AWS calls.
+
+    Use call(region, fn, ...) from worker threads; it blocks until both the
+    region and the account have a free slot, runs fn, and feeds the outcome
+    back into both limits.
+    """
+
+    def __init__(
+        self,
+        account_initial: int = ACCOUNT_INITIAL_LIMIT,
+        account_max: int = ACCOUNT_MAX_LIMIT,
+        region_initial: int = REGION_INITIAL_LIMIT,
+        region_max: int = REGION_MAX_LIMIT,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.account = AimdLimit(account_initial, account_max)
+        self.region_initial = region_initial
+        self.region_max = region_max
+        self.stats = ControllerStats()
+        self._regions: dict[str, AimdLimit] = {}
+        self._lock = threading.Lock()
+        self._sleep = sleep
+
+    @property
+    def max_workers(self) -> int:
+        """Thread pool size large enough that the limits, not the pool, bind."""
+        return self.account.maximum
+
+    def region(self, region: str) -> AimdLimit:
+        with self._lock:
+            lim = self._regions.get(region)
+            if lim is None:
+                lim = AimdLimit(self.region_initial, self.region_max)
+                self._regions[region] = lim
+            return lim
+
+    @contextmanager
+    def slot(self, region: str) -> Iterator[None]:
+        # Region first: a thread parked on a busy region must not hold one
+        # of the scarcer account-wide slots while it waits.
+        reg = self.region(region)
+        reg.acquire()
+        try:
+            self.account.acquire()
+            try:
+                yield
+            finally:
+                self.account.release()
+        finally:
+            reg.release()
+
+    def record_throttle(self, region: str) -> None:
+        with self._lock:
+            self.stats.throttles += 1
+            self.stats.throttles_by_region[region] = (
+                self.stats.throttles_by_region.get(region, 0) + 1
+            )
+        self.region(region).on_throttle()
+        self.account.on_throttle()
+
+    def record_success(self, region: str) -> None:
+        self.region(region).on_success()
+        self.account.on_success()
+
+    def retry_hook(self, region: str) -> Callable[..., None]:
+        """Return a botocore needs-retry handler that reports throttles.
+
+        Register it with client.meta.events.register_first("needs-retry.ec2", ...)
+        so throttles absorbed by botocore's own retries still shrink the
+        limits. The handler never alters botocore's retry decision.
+        """
+
+        def _hook(response=None, **kwargs) -> None:
+            if not response:
+                return None
+            parsed = response[1] if len(response) > 1 else {}
+            code = (parsed or {}).get("Error", {}).get("Code", "")
+            if code in THROTTLE_CODES:
+                self.record_throttle(region)
+            return None
+
+        return _hook
+
+    def call(self, region: str, fn: Callable[..., T], *args, **kwargs) -> T:
+        attempt = 0
+        while True:
+            with self.slot(region):
+                with self._lock:
+                    self.stats.calls += 1
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    if not is_throttle_error(e) or attempt >= MAX_THROTTLE_RETRIES:
+                        raise
+                    throttled = True
+                else:
+                    throttled = False
+            if not throttled:
+                self.record_success(region)
+                return result
+            self.record_throttle(region)
+            with self._lock:
+                self.stats.retries += 1
+            # Full jitter, outside the slot so other regions can proceed.
+            self._sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)))
+            attempt += 1
+
+    def summary(self) -> str:
+        limits = {r: int(lim.limit) for r, lim in sorted(self._regions.items())}
+        throttled = ", ".join(
+            f"{r}={n}" for r, n in sorted(self.stats.throttles_by_region.items())
+        )
+        return (
+            f"Concurrency: {self.stats.calls} call(s), peak {self.account.peak} "
+            f"in flight, account limit {int(self.account.limit)}, "
+            f"{self.stats.throttles} throttle(s)"
+            + (f" [{throttled}]" if throttled else "")
+            + f", {self.stats.retries} controller retry(ies); "
+            f"lowest region limit {min(limits.values()) if limits else 0}"
+        )
@@ -0,0 +1,127 @@
+"""Changed-recipe gate for PR checks (--gate).
+
+A PR check only needs to know whether a recipe the PR touches now lacks a
+required instance type in a GA PCS region. The full audit answers that
+and much more; the gate answers only that, as early as it can:
+
+  - the changed recipes come from --changed-recipes, or from the files
+    changed since a git ref, mapped to recipes by their manifest `path`
+    (a change to the manifest itself gates every recipe);
+  - only the changed recipes' instance types are checked;
+  - a cell can only be `missing-region` where the docs page rules its
+    family out, so only those (type, region) pairs need EC2 calls, and
+    the regions with the most such pairs are looked up first;
+  - the first confirmed gap fails the gate and the remaining lookups are
+    cancelled.
+
+This module holds the AWS-free parts (changed-recipe detection and the
+lookup plan). The lookups themselves run in the audit module.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+from .audit_pcs_query import InstanceSpec, family_of
+
+DEFAULT_GATE_BASE = "origin/main"
+MANIFEST_RELPATH = "scripts/pcs_instance_manifest.yml"
+
+
+def git_changed_files(base: str, repo_root: Path) -> list[str]:
+    """Repo-relative paths changed between base's merge base and HEAD."""
+    import subprocess
+
+    proc = subprocess.run(
+        ["git", "diff", "--name-only", f"{base}...HEAD"],
+        cwd=repo_root,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise ValueError(
+            f"cannot list files changed since {base}: {proc.stderr.strip()}"
+        )
+    return [line for line in proc.stdout.splitlines() if line]
+
+
+def load_recipe_paths(manifest_path: Path) -> dict[str, str]:
+    """Recipe name -> repo-relative recipe directory, from the manifest."""
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with manifest_path.open() as f:
+        data = yaml.load(f, Loader=loader)  # noqa: S506 (a safe loader)
+    return {r["name"]: r.get("path", "") for r in data.get("recipes", [])}
+
+
+def recipes_for_files(recipe_paths: dict[str, str], files: Iterable[str]) -> set[str]:
+    """The recipes whose directory contains any of files.
+
+    A change to the manifest itself may change any recipe's instance
+    types, so it selects every recipe.
+    """
+    files = list(files)
+    if MANIFEST_RELPATH in files:
+        return set(recipe_paths)
+    out = set()
+    for name, path in recipe_paths.items():
+        prefix = path.rstrip("/") + "/"
+        if path and any(f.startswith(prefix) for f in files):
+            out.add(name)
+    return out
+
+
+def plan_gate(
+    specs: Iterable[InstanceSpec],
+    regions: Iterable[str],
+    doc_families: dict[str, set[str]],
+) -> list[tuple[str, list[InstanceSpec]]]:
+    """Return (region, specs the docs page rules out there), most first.
+
+    Regions missing from the docs page are unknown, not gaps, and regions
+    where the docs list every needed family cannot fail; neither is
+    returned.
+    """
+    specs = list(specs)
+    plan = []
+    for region in regions:
+        docs = doc_families.get(region)
+        if docs is None:
+            continue
+        ruled_out = [s for s in specs if family_of(s.type) not in docs]
+        if ruled_out:
+            plan.append((region, ruled_out))
+    return sorted(plan, key=lambda item: (-len({s.type for s in item[1]}), item[0]))
+
+
+@dataclass(frozen=True)
+class GateFailure:
+    """A changed recipe's instance type that is missing in a GA region."""
+
+    recipe: str
+    type: str
+    role: str
+    region: str
+    reason: str
+
+    def __str__(self) -> str:
+        return (
+            f"{self.recipe}: {self.type} ({self.role}) is not offered in "
+            f"{self.region} ({self.reason})"
+        )
+
+
+def gate_failures(
+    region: str, specs: Iterable[InstanceSpec], reason: str
+) -> list[GateFailure]:
+    """One GateFailure per (recipe, type), sorted, for specs missing in region."""
+    roles: dict[tuple[str, str], set[str]] = defaultdict(set)
+    for s in specs:
+        roles[(s.recipe, s.type)].add(s.role)
+    return [
+        GateFailure(recipe, itype, ", ".join(sorted(r)), region, reason)
+        for (recipe, itype), r in sorted(roles.items())
+    ]
@@ -0,0 +1,165 @@
+"""Conditional-GET cache for the AWS docs page used by the PCS audit.
+
+The docs page (ec2-instance-regions.html) changes a few times a month, but
+the audit used to download it in full on every run. DocsPageCache keeps the
+last body on disk together with its ETag, Last-Modified and SHA-256, plus
+the region -> families mapping parsed from it:
+
+  - Repeat fetches send If-None-Match / If-Modified-Since. A 304 reuses the
+    stored body.
+  - A 200 whose body hashes to the stored SHA-256 (servers that ignore
+    validators, or a CDN re-serving the same content) is treated the same.
+  - When the body is unchanged the stored mapping is returned without
+    re-parsing the page, as long as it was parsed by the same parser
+    version; a parser fix takes effect on the next run.
+
+Cache files live under the given directory, keyed by a hash of the URL.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+USER_AGENT = "aws-hpc-recipes-audit/1.0"
+CHUNK_SIZE = 64 * 1024
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "aws-hpc-recipes" / "pcs-audit"
+
+
+@dataclass
+class FetchResult:
+    families: dict[str, set[str]]
+    status: str  # "downloaded", "not-modified", "unchanged-hash"
+    parsed: bool
+    sha256: str
+
+
+class DocsPageCache:
+    """On-disk cache of one or more docs pages, keyed by URL."""
+
+    def __init__(self, cache_dir: Path, timeout: int = 30) -> None:
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+
+    def _paths(self, url: str) -> tuple[Path, Path, Path]:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        base = self.cache_dir / f"docs-{key}"
+        return (
+            base.with_suffix(".meta.json"),
+            base.with_suffix(".html.gz"),
+            base.with_suffix(".families.json"),
+        )
+
+    def _load_json(self, path: Path) -> dict:
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write_json(self, path: Path, data: dict) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data, sort_keys=True))
+        tmp.replace(path)
+
+    def _iter_body(self, body_path: Path) -> Iterator[bytes]:
+        with gzip.open(body_path, "rb") as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+    def fetch_families(
+        self,
+        url: str,
+        parse: Callable[[Iterable[bytes]], dict[str, set[str]]],
+        parser_version: int = 0,
+    ) -> FetchResult:
+        """Return the page's families, downloading and parsing only if needed.
+
+        parse receives the page body as an iterable of byte chunks. Stored
+        families are reused only for the same body and parser_version.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        meta_path, body_path, families_path = self._paths(url)
+        meta = self._load_json(meta_path) if body_path.exists() else {}
+
+        headers = {"User-Agent": USER_AGENT}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        # Imported here: urllib.request (http.client, ssl, email) is slow to
+        # import and a fresh cached page may never need it.
+        import urllib.error
+        import urllib.request
+
+        req = urllib.request.Request(url, headers=headers)
+
+        status = "downloaded"
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:  # noqa: S310
+                sha = self._download(resp, body_path)
+                meta = {
+                    "url": url,
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                    "sha256": sha,
+                    "previous_sha256": meta.get("sha256"),
+                    "fetched_at": time.time(),
+                }
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or not meta:
+                raise
+            status = "not-modified"
+            meta["fetched_at"] = time.time()
+            meta["previous_sha256"] = meta.get("sha256")
+        self._write_json(meta_path, meta)
+
+        sha = meta["sha256"]
+        if status == "downloaded" and sha == meta.get("previous_sha256"):
+            status = "unchanged-hash"
+        stored = self._load_json(families_path)
+        if (
+            stored.get("sha256") == sha
+            and stored.get("parser_version") == parser_version
+        ):
+            families = {r: set(f) for r, f in stored["families"].items()}
+            return FetchResult(families, status, parsed=False, sha256=sha)
+
+        families = parse(self._iter_body(body_path))
+        self._write_json(
+            families_path,
+            {
+                "sha256": sha,
+                "parser_version": parser_version,
+                "families": {r: sorted(f) for r, f in families.items()},
+            },
+        )
+        return FetchResult(families, status, parsed=True, sha256=sha)
+
+    def _download(self, resp, body_path: Path) -> str:
+        """Stream resp into body_path (gzip) and return the body's SHA-256.
+
+        Writes to a temporary file first so a failed download never
+        replaces a good cached body.
+        """
+        digest = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+                for chunk in iter(lambda: resp.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    gz.write(chunk)
+            shutil.move(tmp_name, body_path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return digest.hexdigest()
@@ -17,6 +17,7 @@ Region-level availability comes from two sources, combined:
 
   2. EC2 DescribeInstanceTypeOfferings (LocationType=availability-zone) in
      regions the current credentials can reach, for AZ-level granularity.
+     One AZ-level pass per region also yields region-level API presence.
      AZ data is useful for PCS because clusters pin to specific subnets and
      capacity-constrained families (hpc7a, hpc7g, P5) are often single-AZ.
 
@@ -36,25 +37,83 @@ Usage:
   python -m scripts.audit_pcs_instance_availability --output-dir reports/
   python -m scripts.audit_pcs_instance_availability --no-az  # docs only, skip EC2 calls
   python -m scripts.audit_pcs_instance_availability --extra-regions-file ~/mylist.yaml
+  python -m scripts.audit_pcs_instance_availability --cache-dir ~/.cache/pcs-audit
+  python -m scripts.audit_pcs_instance_availability --snapshot-dir ~/pcs-audit-history \
+      --diff-against latest
+  python -m scripts.audit_pcs_instance_availability --all-types  # every type, every AZ
+  python -m scripts.audit_pcs_instance_availability --shard 1/4 --output-dir part1/
+  python -m scripts.audit_pcs_instance_availability merge part*/audit-pcs-partial-*.json
+  python -m scripts.audit_pcs_instance_availability query --recipe try_amd --min-azs 2
+  python -m scripts.audit_pcs_instance_availability serve --port 8787 --refresh-interval 60
+  python -m scripts.audit_pcs_instance_availability --trace trace.json --trace-format chrome
+  python -m scripts.audit_pcs_instance_availability --gate --changed-since origin/main
 """
 from __future__ import annotations
 
 import argparse
+import codecs
 import csv
 import re
 import sys
+import threading
 import time
-import urllib.request
+from array import array
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from dataclasses import dataclass
+from contextlib import nullcontext
+from dataclasses import dataclass, field, replace
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+from .audit_pcs_cache import LOCATION_AZ, OfferingsCache
+from .audit_pcs_catalog import (
+    AvailabilityCatalog,
+    CatalogBuilder,
+    write_catalog_csv,
+    write_catalog_markdown,
+)
+from .audit_pcs_clients import ClientPool, ProfileMap, RoutedClientPool
+from .audit_pcs_concurrency import ConcurrencyController
+from .audit_pcs_gate import (
+    DEFAULT_GATE_BASE,
+    GateFailure,
+    gate_failures,
+    git_changed_files,
+    load_recipe_paths,
+    plan_gate,
+    recipes_for_files,
+)
+from .audit_pcs_query import (
+    RESULTS_FILENAME,
+    AuditResults,
+    AzResults,
+    InstanceSpec,
+    add_query_arguments,
+    family_of,
+    run_query,
+)
+from .audit_pcs_shards import (
+    PartialResult,
+    merge_partials,
+    parse_shard,
+    shard_regions,
+)
+from .audit_pcs_snapshots import (
+    Snapshot,
+    SnapshotStore,
+    carry_since,
+    changed_cells,
+    new_run_id,
+)
+from .audit_pcs_trace import TRACE_FORMATS, Tracer
 
-import boto3
-import yaml
-from botocore.config import Config
-from botocore.exceptions import ClientError
+# boto3/botocore, yaml, urllib.request, concurrent.futures and the docs HTTP
+# cache are imported where they are used. Together they are most of this
+# module's import time, and offline runs (--no-az --docs-cache), the query
+# subcommand and the unit tests of the pure functions need few or none of
+# them.
+if TYPE_CHECKING:
+    import boto3
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
 MANIFEST_PATH = REPO_ROOT / "scripts" / "pcs_instance_manifest.yml"
@@ -65,15 +124,16 @@ AWS_DOCS_URL = (
     "https://docs.aws.amazon.com/ec2/latest/instancetypes/ec2-instance-regions.html"
 )
 
-# Concurrency cap for per-region EC2 calls. EC2 Describe throttling is generous
-# but conservative is safer when running inside a shared CI account.
-MAX_REGION_WORKERS = 8
+# Default freshness window for --cache-dir entries. Offerings change on the
+# scale of days (launches, new AZs), so a few hours keeps re-runs and PR
+# checks warm without hiding a launch from the nightly job for long.
+DEFAULT_CACHE_MAX_AGE_HOURS = 6.0
 
-BOTO_CONFIG = Config(
-    retries={"max_attempts": 6, "mode": "adaptive"},
-    connect_timeout=5,
-    read_timeout=30,
-)
+# serve: listen on loopback only by default; the answers are not secret,
+# but nothing is authenticated either.
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8787
+DEFAULT_REFRESH_MINUTES = 60.0
 
 
 class RegionNotAccessible(RuntimeError):
@@ -84,19 +144,22 @@ class RegionNotAccessible(RuntimeError):
     """
 
 
-@dataclass(frozen=True)
-class InstanceSpec:
-    """One instance type referenced by a recipe, with context for the report."""
+class AzDetailFailed(RuntimeError):
+    """Raised when a reachable region's AZ-level lookups fail.
 
-    recipe: str
-    type: str
-    role: str
-    arch: str
+    The region then has no usable AZ data, as opposed to data saying that
+    nothing is offered.
+    """
 
 
 def load_manifest(path: Path) -> list[InstanceSpec]:
+    import yaml
+
+    # libyaml's loader, where PyYAML was built with it, parses the manifest
+    # several times faster than the pure-Python one.
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with path.open() as f:
-        data = yaml.safe_load(f)
+        data = yaml.load(f, Loader=loader)  # noqa: S506 (a safe loader)
     specs: list[InstanceSpec] = []
     for recipe in data.get("recipes", []):
         name = recipe["name"]
@@ -112,14 +175,27 @@ def load_manifest(path: Path) -> list[InstanceSpec]:
     return specs
 
 
-def resolve_pcs_regions(session: boto3.Session) -> list[str]:
-    """Fetch the list of regions where AWS PCS is GA via SSM public parameter."""
-    ssm = session.client("ssm", region_name="us-east-1", config=BOTO_CONFIG)
+def resolve_pcs_regions(
+    clients: ClientPool, home_regions: Iterable[str] = ("us-east-1",)
+) -> list[str]:
+    """Fetch the list of regions where AWS PCS is GA via SSM public parameter.
+
+    The parameter is read in each partition's home region. Only the first
+    (commercial) lookup is required; a failure in another partition is
+    reported and that partition's regions are skipped.
+    """
     regions: list[str] = []
-    paginator = ssm.get_paginator("get_parameters_by_path")
-    for page in paginator.paginate(Path=PCS_REGIONS_SSM_PARAM):
-        for p in page.get("Parameters", []):
-            regions.append(p["Name"].rsplit("/", 1)[-1])
+    for i, home in enumerate(home_regions):
+        ssm = clients.client("ssm", home)
+        try:
+            paginator = ssm.get_paginator("get_parameters_by_path")
+            for page in paginator.paginate(Path=PCS_REGIONS_SSM_PARAM):
+                for p in page.get("Parameters", []):
+                    regions.append(p["Name"].rsplit("/", 1)[-1])
+        except Exception as e:
+            if i == 0:
+                raise
+            print(f"  [{home}] PCS region discovery failed: {e}", file=sys.stderr)
     return sorted(set(regions))
 
 
@@ -139,6 +215,8 @@ def load_extra_regions(path: Path) -> list[str]:
     """
     if not path.exists():
         return []
+    import yaml
+
     with path.open() as f:
         data = yaml.safe_load(f) or {}
     out: list[str] = []
@@ -170,193 +248,691 @@ REGION_HEADING_RE = re.compile(
     r"[—\-]\s*((?:[a-z]+-){2,}\d+[a-z]?)\s*$"
 )
 
-CATEGORY_RE = re.compile(
+# Category labels that introduce a "|"-separated family list. A list runs
+# until the next label or the end of the line.
+CATEGORY_LABEL_RE = re.compile(
     r"(?:General Purpose|Compute Optimized|Memory Optimized|Storage Optimized|"
-    r"Accelerated Computing|High Performance Computing|Previous Generation):\s*"
-    r"([A-Za-z0-9|\-\s]+?)(?=(?:General Purpose|Compute Optimized|Memory Optimized|"
-    r"Storage Optimized|Accelerated Computing|High Performance Computing|"
-    r"Previous Generation):|$)"
+    r"Accelerated Computing|High Performance Computing|Previous Generation):"
+)
+FAMILY_LIST_RE = re.compile(r"[A-Za-z0-9|\-\s]+")
+
+# Region codes are short; a heading's code must end its line, so only the
+# tail of a line needs to be searched. Keeps heading detection O(1) per line
+# however long the line is.
+REGION_HEADING_WINDOW = 128
+
+# Tags whose end (or, for <br>, whose occurrence) terminates a text line.
+_BLOCK_END_TAGS = frozenset(
+    {"p", "li", "div", "tr", "table", "h1", "h2", "h3", "h4", "h5", "h6"}
 )
 
+DOCS_CHUNK_SIZE = 64 * 1024
+
 
 def _fetch_url(url: str, timeout: int = 30) -> str:
+    return "".join(_iter_url(url, timeout=timeout))
+
+
+def _iter_url(url: str, timeout: int = 30) -> Iterator[str]:
+    """Yield the decoded body of url in chunks as it arrives."""
+    import urllib.request
+
     req = urllib.request.Request(
         url,
         headers={"User-Agent": "aws-hpc-recipes-audit/1.0"},
     )
     with urllib.request.urlopen(req, timeout=timeout) as resp:  # noqa: S310
-        return resp.read().decode("utf-8", errors="replace")
+        yield from _decode_chunks(iter(lambda: resp.read(DOCS_CHUNK_SIZE), b""))
 
 
-def _extract_text(html: str) -> str:
-    # Very basic HTML -> text: strip scripts/styles and tags, decode a few
-    # common entities. The docs page is well-formed and uses minimal markup
-    # inside the family lists, so this is sufficient.
-    html = re.sub(r"<script[\s\S]*?</script>", " ", html, flags=re.IGNORECASE)
-    html = re.sub(r"<style[\s\S]*?</style>", " ", html, flags=re.IGNORECASE)
-    # Keep block boundaries by turning tags into newlines.
-    text = re.sub(r"<(br|/p|/li|/h\d|/div|/tr|/table)\b[^>]*>", "\n", html, flags=re.IGNORECASE)
-    text = re.sub(r"<[^>]+>", " ", text)
-    text = (
-        text.replace("&mdash;", "—")
-        .replace("&amp;", "&")
-        .replace("&nbsp;", " ")
-        .replace("&#x2014;", "—")
-    )
-    return text
+def _iter_file(path: Path) -> Iterator[str]:
+    """Yield the decoded contents of a local docs-page cache in chunks."""
+    with path.open("rb") as f:
+        yield from _decode_chunks(iter(lambda: f.read(DOCS_CHUNK_SIZE), b""))
+
+
+def _decode_chunks(chunks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+# Bump when the docs-page parsing changes, so families cached from an
+# unchanged page are parsed again.
+DOCS_PARSER_VERSION = 1
+
+
+class _DocsTextParser(HTMLParser):
+    """Incremental HTML -> text lines, matching the docs page's layout.
+
+    Scripts and styles are dropped, block-closing tags and <br> end a line,
+    and every other tag becomes a space. Completed lines are queued on
+    self.lines for the caller to drain after each feed(); only the current
+    partial line is buffered.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self._buf: list[str] = []
+        self._skip_depth = 0
+
+    def _end_line(self) -> None:
+        if self._buf:
+            self.lines.append("".join(self._buf))
+            self._buf = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+        elif tag == "br":
+            self._end_line()
+        else:
+            self._buf.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "br":
+            self._end_line()
+        else:
+            self._buf.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_END_TAGS:
+            self._end_line()
+        else:
+            self._buf.append(" ")
+
+    def handle_comment(self, data):
+        self._buf.append(" ")
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        # Text nodes may themselves contain line breaks; those end lines too.
+        for piece in data.splitlines(keepends=True):
+            text = piece.splitlines()[0]
+            self._buf.append(text)
+            if len(text) != len(piece):
+                self._end_line()
+
+    def close(self):
+        super().close()
+        self._end_line()
+
+
+def _families_in_line(line: str) -> Iterator[str]:
+    """Yield lowercase family tokens from every category list on a line.
+
+    Linear in the line length: labels are located with a plain alternation
+    and each list is validated with a single character-class match, so long
+    family lines cannot trigger regex backtracking.
+    """
+    labels = list(CATEGORY_LABEL_RE.finditer(line))
+    for i, label in enumerate(labels):
+        end = labels[i + 1].start() if i + 1 < len(labels) else len(line)
+        families_str = line[label.end() : end]
+        if not families_str.strip() or not FAMILY_LIST_RE.fullmatch(families_str):
+            continue
+        for token in families_str.split("|"):
+            token = token.strip()
+            if token:
+                yield token.lower()
+
+
+def iter_doc_families(chunks: Iterable[str]) -> Iterator[tuple[str, str | None]]:
+    """Stream (region, family) pairs from docs-page HTML chunks.
+
+    A (region, None) pair is emitted for every region heading, so regions
+    that list no families are still reported. Memory use is bounded by the
+    longest text line, and time is linear in the page size.
+    """
+    parser = _DocsTextParser()
+    current_region: str | None = None
+
+    def drain() -> Iterator[tuple[str, str | None]]:
+        nonlocal current_region
+        lines, parser.lines = parser.lines, []
+        for raw_line in lines:
+            line = raw_line.strip()
+            if not line:
+                continue
+            m = REGION_HEADING_RE.search(line[-REGION_HEADING_WINDOW:])
+            if m:
+                current_region = m.group(1)
+                yield current_region, None
+                continue
+            if current_region is None:
+                continue
+            for family in _families_in_line(line):
+                yield current_region, family
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
 
 
 def scrape_doc_families(
-    url: str = AWS_DOCS_URL, html: str | None = None
+    url: str = AWS_DOCS_URL,
+    html: str | None = None,
+    chunks: Iterable[str] | None = None,
 ) -> dict[str, set[str]]:
     """Return mapping: region -> set of instance families (lowercase).
 
     Families come from the AWS docs page. Size suffixes like ".48xlarge" are
     not present on that page; a manifest entry is considered region-available
     if the family appears in the region's list.
-    """
-    if html is None:
-        html = _fetch_url(url)
-    text = _extract_text(html)
 
-    # Iterate line-by-line, associating family lists with the last region
-    # heading seen.
+    The page is parsed as it streams in: from html if given, else from
+    chunks (e.g. _iter_file), else straight off the network.
+    """
+    if html is not None:
+        chunks = [html]
+    elif chunks is None:
+        chunks = _iter_url(url)
     by_region: dict[str, set[str]] = {}
-    current_region: str | None = None
-
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        m = REGION_HEADING_RE.search(line)
-        if m:
-            current_region = m.group(1)
-            by_region.setdefault(current_region, set())
-            continue
-        if current_region is None:
-            continue
-        # Collect families from every category match on the line.
-        for cat_match in CATEGORY_RE.finditer(line):
-            families_str = cat_match.group(1)
-            for token in families_str.split("|"):
-                token = token.strip()
-                if not token:
-                    continue
-                by_region[current_region].add(token.lower())
+    for region, family in iter_doc_families(chunks):
+        families = by_region.setdefault(region, set())
+        if family is not None:
+            families.add(family)
     return by_region
 
 
-def family_of(instance_type: str) -> str:
-    """Extract the family token used by the docs page from a full type name.
+# -----------------------------------------------------------------------------
+# EC2 AZ-level lookup (best-effort, for reachable regions)
+# -----------------------------------------------------------------------------
+
+
+_ACCESS_ERROR_CODES = ("AuthFailure", "UnauthorizedOperation", "OptInRequired")
+
+
+def _raise_if_inaccessible(e: Exception, region: str) -> None:
+    """Re-raise e as RegionNotAccessible if it means the region is unreachable."""
+    from botocore.exceptions import ClientError
+
+    if isinstance(e, ClientError):
+        code = e.response.get("Error", {}).get("Code", "")
+        if code in _ACCESS_ERROR_CODES:
+            raise RegionNotAccessible(region) from e
+        return
+    # Endpoint connection errors commonly mean GovCloud from commercial.
+    msg = str(e)
+    if "Could not connect" in msg or "EndpointConnectionError" in type(e).__name__:
+        raise RegionNotAccessible(region) from e
+
+
+# -----------------------------------------------------------------------------
+# Offerings query planner
+# -----------------------------------------------------------------------------
+
+# EC2 accepts at most 200 values in a single filter.
+MAX_FILTER_VALUES = 200
+
+# Query a whole family with one "family.*" value once the manifest references
+# at least this many sizes of it. The extra sizes returned are discarded.
+WILDCARD_MIN_SIZES = 3
+
+
+@dataclass(frozen=True)
+class OfferingsQuery:
+    """One planned DescribeInstanceTypeOfferings call (possibly paginated).
+
+    filter_values is what goes into the instance-type filter; wanted is the
+    set of concrete types the results are trimmed to.
+    """
+
+    filter_values: tuple[str, ...]
+    wanted: frozenset[str]
+
+
+@dataclass
+class PlannerStats:
+    """Planned vs issued EC2 requests across an audit run."""
+
+    planned: int = 0
+    made: int = 0
+    wildcard_families: set[str] = field(default_factory=set)
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
 
-    Examples:
-      c7g.xlarge      -> c7g
-      hpc7a.48xlarge  -> hpc7a
-      p5en.48xlarge   -> p5en
-      t2.medium       -> t2
-      c7i-flex.xlarge -> c7i-flex
-      mac2-m2.metal   -> mac2-m2
+    def add(self, planned: int = 0, made: int = 0) -> None:
+        with self._lock:
+            self.planned += planned
+            self.made += made
+
+    def summary(self) -> str:
+        wild = (
+            f", wildcard families: {', '.join(sorted(self.wildcard_families))}"
+            if self.wildcard_families
+            else ""
+        )
+        return (
+            f"Query planner: {self.planned} EC2 call(s) planned, "
+            f"{self.made} made (including extra pages){wild}"
+        )
+
+
+def plan_offerings_queries(
+    instance_types: Iterable[str],
+    max_values: int = MAX_FILTER_VALUES,
+    wildcard_min_sizes: int = WILDCARD_MIN_SIZES,
+    stats: PlannerStats | None = None,
+) -> list[OfferingsQuery]:
+    """Plan the AZ-level offerings queries needed to cover instance_types.
+
+    Only LocationType=availability-zone is queried: a type is offered in a
+    region exactly when it is offered in at least one of its AZs, so the
+    region-level pass is derived instead of issued. Families referenced with
+    many sizes collapse to a single wildcard value, and the resulting filter
+    values are chunked to the API's per-filter limit so cost stays flat as
+    the manifest grows.
     """
-    return instance_type.split(".", 1)[0]
+    by_family: dict[str, set[str]] = defaultdict(set)
+    for t in instance_types:
+        by_family[family_of(t)].add(t)
+
+    # (filter value, concrete types it covers)
+    values: list[tuple[str, set[str]]] = []
+    for fam in sorted(by_family):
+        types = by_family[fam]
+        if len(types) >= wildcard_min_sizes:
+            values.append((f"{fam}.*", types))
+            if stats is not None:
+                stats.wildcard_families.add(fam)
+        else:
+            values.extend((t, {t}) for t in sorted(types))
+
+    queries: list[OfferingsQuery] = []
+    for i in range(0, len(values), max_values):
+        chunk = values[i : i + max_values]
+        queries.append(
+            OfferingsQuery(
+                filter_values=tuple(v for v, _ in chunk),
+                wanted=frozenset(t for _, ts in chunk for t in ts),
+            )
+        )
+    return queries
 
 
 # -----------------------------------------------------------------------------
-# EC2 AZ-level lookup (best-effort, for reachable regions)
+# EC2 lookups for one region
 # -----------------------------------------------------------------------------
 
 
-def offerings_for_region(
-    session: boto3.Session, region: str, instance_types: list[str]
-) -> tuple[set[str], dict[str, set[str]], int]:
-    """Return (region_available_types, az_map, total_azs_in_region).
+class _RegionContext:
+    """Shared state for the EC2 lookups of one region.
 
-    Raises RegionNotAccessible when credentials cannot reach the region
-    (opt-in not enabled, or GovCloud from commercial).
+    Takes the region's EC2 client from the pool on first use (a fully
+    cached region never builds one) and routes calls through the
+    concurrency controller when one is supplied.
     """
-    ec2 = session.client("ec2", region_name=region, config=BOTO_CONFIG)
 
-    total_azs = 0
-    try:
-        az_resp = ec2.describe_availability_zones(
+    def __init__(
+        self,
+        clients: ClientPool,
+        region: str,
+        cache: OfferingsCache | None = None,
+        controller: ConcurrencyController | None = None,
+        planner_stats: PlannerStats | None = None,
+        tracer: Tracer | None = None,
+    ) -> None:
+        self.clients = clients
+        self.region = region
+        self.cache = cache
+        self.controller = controller
+        self.planner_stats = planner_stats
+        self.tracer = tracer
+        self._ec2 = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._ec2 is None:
+                self._ec2 = self.clients.client("ec2", self.region)
+                if self.controller is not None:
+                    # The pooled client may outlive this audit; one hook
+                    # per controller.
+                    self._ec2.meta.events.register_first(
+                        "needs-retry.ec2",
+                        self.controller.retry_hook(self.region),
+                        unique_id=f"audit-pcs-aimd-{id(self.controller)}",
+                    )
+                if self.cache is not None:
+                    self.cache.mark_refreshed(self.region)
+            return self._ec2
+
+    def call(self, fn, *args, **kwargs):
+        if self.controller is None:
+            return fn(*args, **kwargs)
+        return self.controller.call(self.region, fn, *args, **kwargs)
+
+    def span(self, name: str, **args):
+        if self.tracer is None:
+            return nullcontext({})
+        return self.tracer.span(name, region=self.region, **args)
+
+    def count_made(self, n: int = 1) -> None:
+        if self.planner_stats is not None:
+            self.planner_stats.add(made=n)
+
+    def paginate_offerings(
+        self, location_type: str, filter_values: Iterable[str] | None
+    ) -> list[tuple[str, str]]:
+        """Return (instance_type, location) pairs for one offerings query.
+
+        filter_values=None returns every type offered in the region. Pages
+        are requested one at a time through call(), so a controller retry
+        after a throttle repeats only the throttled page.
+        """
+        kwargs = {"LocationType": location_type}
+        if filter_values is not None:
+            kwargs["Filters"] = [
+                {"Name": "instance-type", "Values": list(filter_values)}
+            ]
+        out: list[tuple[str, str]] = []
+        while True:
+            self.count_made()
+            page = self.call(self.client().describe_instance_type_offerings, **kwargs)
+            for off in page.get("InstanceTypeOfferings", []):
+                out.append((off["InstanceType"], off["Location"]))
+            token = page.get("NextToken")
+            if not token:
+                return out
+            kwargs["NextToken"] = token
+
+
+def _lookup_total_azs(ctx: _RegionContext) -> int:
+    """Count available AZs in the region; raise RegionNotAccessible if unreachable."""
+    region, cache = ctx.region, ctx.cache
+    if cache is not None:
+        cached = cache.get_total_azs(region)
+        if cached is not None:
+            return cached
+    if ctx.planner_stats is not None:
+        ctx.planner_stats.add(planned=1)
+
+    def _run():
+        ctx.count_made()
+        return ctx.client().describe_availability_zones(
             Filters=[{"Name": "state", "Values": ["available"]}]
         )
-        total_azs = len(az_resp.get("AvailabilityZones", []))
-    except ClientError as e:
-        code = e.response.get("Error", {}).get("Code", "")
-        if code in ("AuthFailure", "UnauthorizedOperation", "OptInRequired"):
-            raise RegionNotAccessible(region) from e
-        print(f"  [{region}] describe_availability_zones error: {e}", file=sys.stderr)
+
+    try:
+        az_resp = ctx.call(_run)
     except Exception as e:
-        # Endpoint connection errors commonly mean GovCloud from commercial.
-        msg = str(e)
-        if "Could not connect" in msg or "EndpointConnectionError" in type(e).__name__:
-            raise RegionNotAccessible(region) from e
+        _raise_if_inaccessible(e, region)
         print(f"  [{region}] describe_availability_zones error: {e}", file=sys.stderr)
-
-    region_avail: set[str] = set()
-    paginator = ec2.get_paginator("describe_instance_type_offerings")
+        return 0
+    total_azs = len(az_resp.get("AvailabilityZones", []))
+    if cache is not None and total_azs:
+        cache.put_total_azs(region, total_azs)
+    return total_azs
+
+
+def _cached_az_offerings(
+    ctx: _RegionContext, instance_types: list[str]
+) -> tuple[dict[str, set[str]], list[str]]:
+    """Split instance_types into (fresh cached az_map, types still to fetch)."""
+    if ctx.cache is None:
+        return {}, sorted(set(instance_types))
+    cached = ctx.cache.get_offerings(ctx.region, LOCATION_AZ, instance_types)
+    az_map = {t: set(locs) for t, locs in cached.items() if locs}
+    return az_map, sorted(set(instance_types) - set(cached))
+
+
+def _run_offerings_query(
+    ctx: _RegionContext, query: OfferingsQuery
+) -> dict[str, set[str]] | None:
+    """Execute one planned query; return {type: AZs} for query.wanted.
+
+    Returns None if the query failed, so the caller can report the region
+    without API data (the same outcome as a failed region-level lookup).
+    """
+    region = ctx.region
+    fetched: dict[str, set[str]] = defaultdict(set)
     try:
-        for page in paginator.paginate(
-            LocationType="region",
-            Filters=[{"Name": "instance-type", "Values": instance_types}],
-        ):
-            for off in page.get("InstanceTypeOfferings", []):
-                region_avail.add(off["InstanceType"])
-    except ClientError as e:
-        print(f"  [{region}] region offerings error: {e}", file=sys.stderr)
-        return set(), {}, total_azs
+        with ctx.span("offerings-query", values=len(query.filter_values)):
+            pairs = ctx.paginate_offerings("availability-zone", query.filter_values)
+        for itype, az in pairs:
+            if itype in query.wanted:
+                fetched[itype].add(az)
+    except Exception as e:
+        _raise_if_inaccessible(e, region)
+        print(f"  [{region}] az offerings error: {e}", file=sys.stderr)
+        return None
+    if ctx.cache is not None:
+        ctx.cache.put_offerings(
+            region,
+            LOCATION_AZ,
+            {t: sorted(fetched.get(t, ())) for t in query.wanted},
+        )
+    return dict(fetched)
 
-    az_map: dict[str, set[str]] = defaultdict(set)
-    if region_avail:
-        try:
-            for page in paginator.paginate(
-                LocationType="availability-zone",
-                Filters=[
-                    {"Name": "instance-type", "Values": sorted(region_avail)},
-                ],
-            ):
-                for off in page.get("InstanceTypeOfferings", []):
-                    az_map[off["InstanceType"]].add(off["Location"])
-        except ClientError as e:
-            print(f"  [{region}] az offerings error: {e}", file=sys.stderr)
 
-    return region_avail, dict(az_map), total_azs
+def _combine_region_result(
+    total_azs: int,
+    cached: dict[str, set[str]],
+    fetched: Iterable[dict[str, set[str]] | None],
+) -> tuple[set[str], dict[str, set[str]], int]:
+    """Merge cached and fetched AZ maps; AzDetailFailed if a query failed."""
+    az_map: dict[str, set[str]] = {t: set(azs) for t, azs in cached.items()}
+    for part in fetched:
+        if part is None:
+            raise AzDetailFailed("an offerings query failed")
+        for itype, azs in part.items():
+            az_map.setdefault(itype, set()).update(azs)
+    az_map = {t: azs for t, azs in az_map.items() if azs}
+    return set(az_map), az_map, total_azs
+
+
+def offerings_for_region(
+    session: boto3.Session,
+    region: str,
+    instance_types: list[str],
+    cache: OfferingsCache | None = None,
+    planner_stats: PlannerStats | None = None,
+    clients: ClientPool | None = None,
+) -> tuple[set[str], dict[str, set[str]], int]:
+    """Return (region_available_types, az_map, total_azs_in_region).
+
+    Raises RegionNotAccessible when credentials cannot reach the region
+    (opt-in not enabled, or GovCloud from commercial).
+
+    Region-level availability is derived from a single AZ-level pass (see
+    plan_offerings_queries). With a cache, only entries that are missing or
+    stale are fetched from EC2; a fully warm region makes no API calls at
+    all. Failed lookups are never written to the cache.
+
+    This is the serial form of one region's lookups; audit_az_detail runs
+    the same steps as independent tasks.
+    """
+    ctx = _RegionContext(
+        clients or ClientPool(session), region, cache, planner_stats=planner_stats
+    )
+    total_azs = _lookup_total_azs(ctx)
+    cached, to_fetch = _cached_az_offerings(ctx, instance_types)
+    queries = plan_offerings_queries(to_fetch, stats=planner_stats)
+    if planner_stats is not None:
+        planner_stats.add(planned=len(queries))
+    fetched = [_run_offerings_query(ctx, q) for q in queries]
+    try:
+        return _combine_region_result(total_azs, cached, fetched)
+    except AzDetailFailed:
+        return set(), {}, total_azs  # _run_offerings_query logged the error
 
 
 def audit_az_detail(
     session: boto3.Session,
     regions: list[str],
     instance_types: list[str],
+    cache: OfferingsCache | None = None,
+    controller: ConcurrencyController | None = None,
+    planner_stats: PlannerStats | None = None,
+    tracer: Tracer | None = None,
+    clients: ClientPool | None = None,
+    failures: dict[str, Exception] | None = None,
 ) -> tuple[dict[str, tuple[set[str], dict[str, set[str]], int]], list[str]]:
     """Run AZ-level offerings lookups in parallel across regions.
 
     Returns (results, inaccessible_regions). Inaccessible regions are ones
     the current credentials cannot reach (opt-in not enabled, GovCloud
-    without GovCloud creds).
+    without GovCloud creds). A region whose lookups failed is reported
+    without AZ data; pass failures to also learn which regions those are
+    and why.
+
+    Each region's AZ count lookup and each of its planned offerings queries
+    are submitted as independent tasks, so total latency tracks the slowest
+    single call rather than the sum of each region's chain. In-flight calls
+    are bounded by the controller's AIMD limits, not a fixed pool.
     """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    controller = controller or ConcurrencyController()
+    planner_stats = planner_stats or PlannerStats()
+    clients = clients or ClientPool(session, tracer=tracer)
     results: dict[str, tuple[set[str], dict[str, set[str]], int]] = {}
     inaccessible: list[str] = []
     t0 = time.monotonic()
-    with ThreadPoolExecutor(max_workers=MAX_REGION_WORKERS) as pool:
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as pool:
+        futures = {}
+        cached: dict[str, dict[str, set[str]]] = {}
+        expected: dict[str, int] = {}
+        parts: dict[str, dict[object, object]] = {}
+        for r in regions:
+            ctx = _RegionContext(clients, r, cache, controller, planner_stats, tracer)
+            cached[r], to_fetch = _cached_az_offerings(ctx, instance_types)
+            queries = plan_offerings_queries(to_fetch, stats=planner_stats)
+            planner_stats.add(planned=len(queries))
+            expected[r] = 1 + len(queries)
+            parts[r] = {}
+            futures[pool.submit(_lookup_total_azs, ctx)] = (r, "azs")
+            for i, q in enumerate(queries):
+                futures[pool.submit(_run_offerings_query, ctx, q)] = (r, i)
+        done = 0
+        for fut in as_completed(futures):
+            region, step = futures[fut]
+            try:
+                parts[region][step] = fut.result()
+            except Exception as e:
+                parts[region][step] = e
+            got = parts[region]
+            if len(got) < expected[region]:
+                continue
+            done += 1
+            errors = [v for v in got.values() if isinstance(v, Exception)]
+            if not errors:
+                try:
+                    results[region] = _combine_region_result(
+                        got.pop("azs"), cached[region], got.values()
+                    )
+                except AzDetailFailed as e:
+                    errors = [e]
+            if any(isinstance(e, RegionNotAccessible) for e in errors):
+                inaccessible.append(region)
+            elif errors:
+                print(f"  [{region}] AZ detail failed: {errors[0]}", file=sys.stderr)
+                results[region] = (set(), {}, 0)
+                if failures is not None:
+                    failures[region] = errors[0]
+            print(
+                f"  [{done}/{len(regions)}] {region} AZ detail done",
+                file=sys.stderr,
+            )
+    print(f"  AZ detail took {time.monotonic() - t0:.1f}s", file=sys.stderr)
+    print(f"  {planner_stats.summary()}", file=sys.stderr)
+    print(f"  {controller.summary()}", file=sys.stderr)
+    print(f"  {clients.summary()}", file=sys.stderr)
+    if cache is not None:
+        print(f"  {cache.stats.summary()}", file=sys.stderr)
+    return results, inaccessible
+
+
+def _region_catalog(ctx: _RegionContext) -> tuple[list[str], list[tuple[str, str]]]:
+    """Return (available AZ names, every (instance_type, az) offering)."""
+
+    def _zones():
+        ctx.count_made()
+        return ctx.client().describe_availability_zones(
+            Filters=[{"Name": "state", "Values": ["available"]}]
+        )
+
+    try:
+        zones = [z["ZoneName"] for z in ctx.call(_zones).get("AvailabilityZones", [])]
+        offerings = ctx.paginate_offerings("availability-zone", None)
+    except Exception as e:
+        _raise_if_inaccessible(e, ctx.region)
+        raise
+    return zones, offerings
+
+
+def audit_all_types(
+    session: boto3.Session,
+    regions: list[str],
+    controller: ConcurrencyController | None = None,
+    tracer: Tracer | None = None,
+    clients: ClientPool | None = None,
+) -> tuple[AvailabilityCatalog, list[str]]:
+    """Fetch every instance type offered in every AZ of regions.
+
+    Returns (catalog, inaccessible_regions). One unfiltered, paginated
+    DescribeInstanceTypeOfferings pass per region; regions that fail for
+    other reasons are reported and left without data. The offerings cache
+    is not used: it is keyed by the manifest's types.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    controller = controller or ConcurrencyController()
+    clients = clients or ClientPool(session, tracer=tracer)
+    planner_stats = PlannerStats()
+    builder = CatalogBuilder()
+    inaccessible: list[str] = []
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as pool:
         futures = {
-            pool.submit(offerings_for_region, session, r, instance_types): r
+            pool.submit(
+                _region_catalog,
+                _RegionContext(
+                    clients,
+                    r,
+                    controller=controller,
+                    planner_stats=planner_stats,
+                    tracer=tracer,
+                ),
+            ): r
             for r in regions
         }
-        for i, fut in enumerate(as_completed(futures), 1):
+        for done, fut in enumerate(as_completed(futures), 1):
             region = futures[fut]
             try:
-                results[region] = fut.result()
+                zones, offerings = fut.result()
             except RegionNotAccessible:
                 inaccessible.append(region)
+                continue
             except Exception as e:
-                print(f"  [{region}] AZ detail failed: {e}", file=sys.stderr)
-                results[region] = (set(), {}, 0)
+                print(f"  [{region}] catalog lookup failed: {e}", file=sys.stderr)
+                continue
+            builder.add_region(region, zones, offerings)
             print(
-                f"  [{i}/{len(regions)}] {region} AZ detail done",
+                f"  [{done}/{len(regions)}] {region}: {len(offerings)} offerings",
                 file=sys.stderr,
             )
-    print(f"  AZ detail took {time.monotonic() - t0:.1f}s", file=sys.stderr)
-    return results, inaccessible
+    print(
+        f"  Catalog lookups took {time.monotonic() - t0:.1f}s "
+        f"({planner_stats.made} request(s))",
+        file=sys.stderr,
+    )
+    print(f"  {controller.summary()}", file=sys.stderr)
+    print(f"  {clients.summary()}", file=sys.stderr)
+    return builder.build(regions), sorted(inaccessible)
 
 
 # -----------------------------------------------------------------------------
@@ -364,54 +940,191 @@ def audit_az_detail(
 # -----------------------------------------------------------------------------
 
 
-def _region_cell(
-    itype: str,
-    region: str,
-    doc_families: dict[str, set[str]],
-    az_results: dict[str, tuple[set[str], dict[str, set[str]], int]],
-) -> tuple[str, str]:
-    """Return (cell_text, status) for the matrix.
-
-    status is one of: "ok", "partial-az", "missing-region", "unknown-region".
-    """
-    fam = family_of(itype)
-    doc_set = doc_families.get(region)
-    if doc_set is None:
-        return "??", "unknown-region"
+# Cell kinds. Each maps to a fixed status and a text template; see
+# _classify_cell for when each one applies.
+CELL_UNKNOWN = 0  # "??"
+CELL_OK = 1  # "OK"
+CELL_MISSING = 2  # "--"
+CELL_PARTIAL = 3  # "N/M"
+CELL_OK_API_ONLY = 4  # "OK*"
+CELL_PARTIAL_API_ONLY = 5  # "N/M*"
+CELL_OK_DOCS_ONLY = 6  # "OK(?)"
+
+CELL_STATUS = {
+    CELL_UNKNOWN: "unknown-region",
+    CELL_OK: "ok",
+    CELL_MISSING: "missing-region",
+    CELL_PARTIAL: "partial-az",
+    CELL_OK_API_ONLY: "ok",
+    CELL_PARTIAL_API_ONLY: "partial-az",
+    CELL_OK_DOCS_ONLY: "ok",
+}
+
+
+def _classify_cell(
+    doc_known: bool,
+    region_has_family: bool,
+    has_az_data: bool,
+    az_have: int,
+    total_azs: int,
+) -> int:
+    """Return the CELL_* kind for one (instance type, region) pair."""
+    if not doc_known:
+        return CELL_UNKNOWN
 
     # Docs-family availability is the ground truth for "does the region offer
     # this family at all". We ALWAYS use docs for region-level presence.
-    region_has_family = fam in doc_set
-
-    # AZ data, if we got it.
-    az_info = az_results.get(region)
-    if az_info is None:
+    if not has_az_data:
         # No AZ data (inaccessible region). Report region-level only.
-        return ("OK" if region_has_family else "--"), (
-            "ok" if region_has_family else "missing-region"
-        )
-
-    _az_api_types, az_map, total_azs = az_info
-    az_have = len(az_map.get(itype, set()))
+        return CELL_OK if region_has_family else CELL_MISSING
 
     if not region_has_family and az_have == 0:
-        return "--", "missing-region"
+        return CELL_MISSING
     if not region_has_family and az_have > 0:
         # Docs say no, EC2 says yes. Very rare; prefer the EC2 signal because
         # the docs page can lag a few days behind a launch.
         if total_azs and az_have < total_azs:
-            return f"{az_have}/{total_azs}*", "partial-az"
-        return "OK*", "ok"
+            return CELL_PARTIAL_API_ONLY
+        return CELL_OK_API_ONLY
     # region_has_family is True.
     if az_have == 0:
         # Docs say yes, EC2 says no. Likely a family-vs-size mismatch (e.g.
         # docs list "Hpc7a" but we asked for hpc7a.48xlarge which is the
         # only current size; both cases should converge). Fall back to
         # docs-level OK and annotate.
-        return "OK(?)", "ok"
+        return CELL_OK_DOCS_ONLY
     if total_azs and az_have < total_azs:
-        return f"{az_have}/{total_azs}", "partial-az"
-    return "OK", "ok"
+        return CELL_PARTIAL
+    return CELL_OK
+
+
+def _cell_text(kind: int, az_have: int, total_azs: int) -> str:
+    if kind == CELL_UNKNOWN:
+        return "??"
+    if kind == CELL_MISSING:
+        return "--"
+    if kind == CELL_PARTIAL:
+        return f"{az_have}/{total_azs}"
+    if kind == CELL_PARTIAL_API_ONLY:
+        return f"{az_have}/{total_azs}*"
+    if kind == CELL_OK_API_ONLY:
+        return "OK*"
+    if kind == CELL_OK_DOCS_ONLY:
+        return "OK(?)"
+    return "OK"
+
+
+def _region_cell(
+    itype: str,
+    region: str,
+    doc_families: dict[str, set[str]],
+    az_results: dict[str, tuple[set[str], dict[str, set[str]], int]],
+) -> tuple[str, str]:
+    """Return (cell_text, status) for the matrix.
+
+    status is one of: "ok", "partial-az", "missing-region", "unknown-region".
+    Report writers read precomputed cells from AvailabilityMatrix; this is
+    the single-cell form of the same classification.
+    """
+    doc_set = doc_families.get(region)
+    az_info = az_results.get(region)
+    az_have = len(az_info[1].get(itype, ())) if az_info is not None else 0
+    total_azs = az_info[2] if az_info is not None else 0
+    kind = _classify_cell(
+        doc_set is not None,
+        doc_set is not None and family_of(itype) in doc_set,
+        az_info is not None,
+        az_have,
+        total_azs,
+    )
+    return _cell_text(kind, az_have, total_azs), CELL_STATUS[kind]
+
+
+class AvailabilityMatrix:
+    """Type x region availability, computed once and shared by all writers.
+
+    Rows are the unique (instance_type, arch) pairs of the manifest, sorted;
+    columns are the audited regions in report order. Per-cell data lives in
+    flat row-major arrays (kind, docs-family flag, AZ count); per-region data
+    (total AZs, whether AZ data exists) is stored once per column.
+    """
+
+    def __init__(
+        self,
+        specs: list[InstanceSpec],
+        regions: list[str],
+        doc_families: dict[str, set[str]],
+        az_results: dict[str, tuple[set[str], dict[str, set[str]], int]],
+    ) -> None:
+        self.regions = list(regions)
+        self.types = sorted({(s.type, s.arch) for s in specs})
+        self.row_of = {itype: i for i, (itype, _) in enumerate(self.types)}
+        self.families = [family_of(itype) for itype, _ in self.types]
+
+        type_to_recipes: dict[str, set[str]] = defaultdict(set)
+        type_to_roles: dict[str, set[str]] = defaultdict(set)
+        for s in specs:
+            type_to_recipes[s.type].add(s.recipe)
+            type_to_roles[s.type].add(s.role)
+        self.recipes = [sorted(type_to_recipes[t]) for t, _ in self.types]
+        self.roles = [sorted(type_to_roles[t]) for t, _ in self.types]
+
+        ncols = len(self.regions)
+        self.has_az_data = array("B", (r in az_results for r in self.regions))
+        self.total_azs = array(
+            "H", (az_results[r][2] if r in az_results else 0 for r in self.regions)
+        )
+        # AZ names per cell, kept for the CSV; None where there is no AZ data.
+        self._az_maps = [
+            az_results[r][1] if r in az_results else None for r in self.regions
+        ]
+
+        n = len(self.types) * ncols
+        self.kind = array("B", bytes(n))
+        self.doc_has = array("B", bytes(n))
+        self.az_count = array("H", bytes(2 * n))
+        doc_sets = [doc_families.get(r) for r in self.regions]
+        for row, (itype, _) in enumerate(self.types):
+            fam = self.families[row]
+            base = row * ncols
+            for col in range(ncols):
+                doc_set = doc_sets[col]
+                doc_has = doc_set is not None and fam in doc_set
+                az_map = self._az_maps[col]
+                az_have = len(az_map.get(itype, ())) if az_map is not None else 0
+                self.doc_has[base + col] = doc_has
+                self.az_count[base + col] = az_have
+                self.kind[base + col] = _classify_cell(
+                    doc_set is not None,
+                    doc_has,
+                    az_map is not None,
+                    az_have,
+                    self.total_azs[col],
+                )
+
+    def index(self, row: int, col: int) -> int:
+        return row * len(self.regions) + col
+
+    def status(self, row: int, col: int) -> str:
+        return CELL_STATUS[self.kind[self.index(row, col)]]
+
+    def cell(self, row: int, col: int) -> str:
+        i = self.index(row, col)
+        return _cell_text(self.kind[i], self.az_count[i], self.total_azs[col])
+
+    def azs(self, row: int, col: int) -> list[str]:
+        az_map = self._az_maps[col]
+        if az_map is None:
+            return []
+        return sorted(az_map.get(self.types[row][0], ()))
+
+    def cols_with_status(self, row: int, status: str) -> list[int]:
+        base = row * len(self.regions)
+        return [
+            col
+            for col in range(len(self.regions))
+            if CELL_STATUS[self.kind[base + col]] == status
+        ]
 
 
 def write_csv(
@@ -421,14 +1134,11 @@ def write_csv(
     doc_families: dict[str, set[str]],
     az_results: dict[str, tuple[set[str], dict[str, set[str]], int]],
     extra_regions: set[str] | None = None,
+    matrix: AvailabilityMatrix | None = None,
 ) -> None:
     extra_regions = extra_regions or set()
-    unique_types = sorted({(s.type, s.arch) for s in specs})
-    type_to_recipes: dict[str, set[str]] = defaultdict(set)
-    type_to_roles: dict[str, set[str]] = defaultdict(set)
-    for s in specs:
-        type_to_recipes[s.type].add(s.recipe)
-        type_to_roles[s.type].add(s.role)
+    if matrix is None:
+        matrix = AvailabilityMatrix(specs, regions, doc_families, az_results)
 
     with path.open("w", newline="") as f:
         w = csv.writer(f)
@@ -448,40 +1158,57 @@ def write_csv(
                 "roles",
             ]
         )
-        for itype, arch in unique_types:
-            fam = family_of(itype)
-            for region in regions:
-                doc_set = doc_families.get(region, set())
-                doc_has = fam in doc_set
-                az_info = az_results.get(region)
-                if az_info is None:
-                    az_source = "none"
-                    az_count = 0
-                    total_azs = 0
-                    azs: list[str] = []
-                else:
-                    az_source = "ec2-api"
-                    _api_types, az_map, total_azs = az_info
-                    azs = sorted(az_map.get(itype, set()))
-                    az_count = len(azs)
+        region_status = [
+            "extra" if r in extra_regions else "ga" for r in matrix.regions
+        ]
+        az_source = [
+            "ec2-api" if has else "none" for has in matrix.has_az_data
+        ]
+        for row, (itype, arch) in enumerate(matrix.types):
+            fam = matrix.families[row]
+            recipes_col = ";".join(matrix.recipes[row])
+            roles_col = ";".join(matrix.roles[row])
+            for col, region in enumerate(matrix.regions):
+                i = matrix.index(row, col)
                 w.writerow(
                     [
                         itype,
                         fam,
                         arch,
                         region,
-                        "extra" if region in extra_regions else "ga",
-                        "yes" if doc_has else "no",
-                        az_source,
-                        az_count,
-                        total_azs,
-                        ";".join(azs),
-                        ";".join(sorted(type_to_recipes[itype])),
-                        ";".join(sorted(type_to_roles[itype])),
+                        region_status[col],
+                        "yes" if matrix.doc_has[i] else "no",
+                        az_source[col],
+                        matrix.az_count[i],
+                        matrix.total_azs[col],
+                        ";".join(matrix.azs(row, col)),
+                        recipes_col,
+                        roles_col,
                     ]
                 )
 
 
+def recipe_blockers(
+    specs: list[InstanceSpec], matrix: AvailabilityMatrix
+) -> dict[str, dict[str, list[str]]]:
+    """Recipe -> {region: sorted "type (role)" entries missing there}.
+
+    Every recipe of specs is present, with an empty dict if nothing it
+    needs is missing (region-level) in any audited region.
+    """
+    by_recipe: dict[str, list[InstanceSpec]] = defaultdict(list)
+    for s in specs:
+        by_recipe[s.recipe].append(s)
+    out: dict[str, dict[str, list[str]]] = {}
+    for recipe in sorted(by_recipe):
+        blockers: dict[str, set[str]] = defaultdict(set)
+        for s in by_recipe[recipe]:
+            for col in matrix.cols_with_status(matrix.row_of[s.type], "missing-region"):
+                blockers[matrix.regions[col]].add(f"{s.type} ({s.role})")
+        out[recipe] = {r: sorted(blockers[r]) for r in sorted(blockers)}
+    return out
+
+
 def write_markdown(
     path: Path,
     specs: list[InstanceSpec],
@@ -491,14 +1218,12 @@ def write_markdown(
     inaccessible_az: list[str],
     unknown_doc_regions: list[str],
     extra_regions: set[str] | None = None,
+    matrix: AvailabilityMatrix | None = None,
 ) -> None:
     extra_regions = extra_regions or set()
-    unique_types = sorted({(s.type, s.arch) for s in specs})
-    type_to_recipes: dict[str, set[str]] = defaultdict(set)
-    type_to_roles: dict[str, set[str]] = defaultdict(set)
-    for s in specs:
-        type_to_recipes[s.type].add(s.recipe)
-        type_to_roles[s.type].add(s.role)
+    if matrix is None:
+        matrix = AvailabilityMatrix(specs, regions, doc_families, az_results)
+    unique_types = matrix.types
 
     def region_label(r: str) -> str:
         return f"{r} (extra)" if r in extra_regions else r
@@ -576,22 +1301,16 @@ def write_markdown(
         "| Instance type | Family | Arch | Recipes | Roles | Missing regions | Partial-AZ regions |"
     )
     lines.append("| --- | --- | --- | --- | --- | --- | --- |")
-    for itype, arch in unique_types:
-        fam = family_of(itype)
-        missing: list[str] = []
-        partial: list[str] = []
-        for region in regions:
-            _, status = _region_cell(itype, region, doc_families, az_results)
-            label = region_label(region)
-            if status == "missing-region":
-                missing.append(label)
-            elif status == "partial-az":
-                az_map = az_results[region][1]
-                total_azs = az_results[region][2]
-                az_have = len(az_map.get(itype, set()))
-                partial.append(f"{label} ({az_have}/{total_azs})")
-        recipes_col = ", ".join(sorted(type_to_recipes[itype]))
-        roles_col = ", ".join(sorted(type_to_roles[itype]))
+    labels = [region_label(r) for r in matrix.regions]
+    for row, (itype, arch) in enumerate(unique_types):
+        fam = matrix.families[row]
+        missing = [labels[c] for c in matrix.cols_with_status(row, "missing-region")]
+        partial = [
+            f"{labels[c]} ({matrix.az_count[matrix.index(row, c)]}/{matrix.total_azs[c]})"
+            for c in matrix.cols_with_status(row, "partial-az")
+        ]
+        recipes_col = ", ".join(matrix.recipes[row])
+        roles_col = ", ".join(matrix.roles[row])
         lines.append(
             f"| `{itype}` | `{fam}` | {arch} | {recipes_col} | {roles_col} | "
             f"{', '.join(missing) if missing else '_none_'} | "
@@ -600,15 +1319,14 @@ def write_markdown(
 
     # Full matrix.
     lines.append("\n## Full matrix\n")
-    header = ["Instance type", "Arch"] + [region_label(r) for r in regions]
+    header = ["Instance type", "Arch"] + labels
     lines.append("| " + " | ".join(header) + " |")
     lines.append("| " + " | ".join(["---"] * len(header)) + " |")
-    for itype, arch in unique_types:
-        row = [f"`{itype}`", arch]
-        for region in regions:
-            cell, _ = _region_cell(itype, region, doc_families, az_results)
-            row.append(cell)
-        lines.append("| " + " | ".join(row) + " |")
+    ncols = len(matrix.regions)
+    for row, (itype, arch) in enumerate(unique_types):
+        cells = [f"`{itype}`", arch]
+        cells.extend(matrix.cell(row, col) for col in range(ncols))
+        lines.append("| " + " | ".join(cells) + " |")
 
     # Per-recipe impact.
     lines.append("\n## Impact by recipe\n")
@@ -617,17 +1335,8 @@ def write_markdown(
         "type is missing (region-level). These are the regions where the "
         "recipe will fail without a fallback.\n"
     )
-    by_recipe: dict[str, list[InstanceSpec]] = defaultdict(list)
-    for s in specs:
-        by_recipe[s.recipe].append(s)
-    for recipe in sorted(by_recipe):
+    for recipe, blockers in recipe_blockers(specs, matrix).items():
         lines.append(f"### {recipe}\n")
-        blockers: dict[str, list[str]] = defaultdict(list)
-        for s in by_recipe[recipe]:
-            for region in regions:
-                _, status = _region_cell(s.type, region, doc_families, az_results)
-                if status == "missing-region":
-                    blockers[region].append(f"{s.type} ({s.role})")
         if not blockers:
             lines.append(
                 "_All required instance types available in every PCS region._\n"
@@ -637,18 +1346,610 @@ def write_markdown(
         lines.append("| --- | --- |")
         for region in sorted(blockers):
             lines.append(
-                f"| {region_label(region)} | {', '.join(sorted(set(blockers[region])))} |"
+                f"| {region_label(region)} | {', '.join(blockers[region])} |"
             )
         lines.append("")
 
     path.write_text("\n".join(lines))
 
 
+# -----------------------------------------------------------------------------
+# Snapshot history and diff
+# -----------------------------------------------------------------------------
+
+_STATUS_RANK = {"missing-region": 0, "partial-az": 1, "ok": 2}
+
+
+def snapshot_from_matrix(
+    matrix: AvailabilityMatrix, created: float | None = None
+) -> Snapshot:
+    created = time.time() if created is None else created
+    return Snapshot(
+        run_id=new_run_id(created),
+        created=created,
+        types=[t for t, _ in matrix.types],
+        archs=[a for _, a in matrix.types],
+        regions=list(matrix.regions),
+        total_azs=array("H", matrix.total_azs),
+        kind=array("B", matrix.kind),
+        az_count=array("H", matrix.az_count),
+        since=array("I"),
+    )
+
+
+def classify_change(old_kind: int, old_az: int, new_kind: int, new_az: int) -> str:
+    """Name a cell change: new-launch, az-addition, regression or docs-change."""
+    old_rank = _STATUS_RANK.get(CELL_STATUS[old_kind])
+    new_rank = _STATUS_RANK.get(CELL_STATUS[new_kind])
+    if old_rank is None or new_rank is None:
+        # The region appeared on or dropped off the docs page.
+        return "docs-change"
+    if (new_rank, new_az) > (old_rank, old_az):
+        return "new-launch" if old_rank == 0 else "az-addition"
+    if (new_rank, new_az) < (old_rank, old_az):
+        return "regression"
+    # Same status and AZ count, different annotation (e.g. OK -> OK*).
+    return "docs-change"
+
+
+def _format_age(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    days, rem = divmod(seconds, 86400)
+    hours = rem // 3600
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h"
+    return f"{rem // 60}m"
+
+
+def write_diff_markdown(
+    path: Path,
+    base: Snapshot,
+    current: Snapshot,
+    changed: list[int],
+    extra_regions: set[str] | None = None,
+) -> None:
+    """Write only the cells that changed between base and current."""
+    extra_regions = extra_regions or set()
+    aligned = base.reindexed(current.types, current.regions)
+    ncols = len(current.regions)
+
+    def stamp(t: float) -> str:
+        return time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(t))
+
+    lines: list[str] = []
+    lines.append("# PCS recipe instance availability diff\n")
+    lines.append(
+        f"- Baseline snapshot: `{base.run_id}` ({stamp(base.created)})  \n"
+        f"- Current run: `{current.run_id}` ({stamp(current.created)})  \n"
+        f"- Changed cells: **{len(changed)}**\n"
+    )
+    added_types = sorted(set(current.types) - set(base.types))
+    removed_types = sorted(set(base.types) - set(current.types))
+    added_regions = sorted(set(current.regions) - set(base.regions))
+    removed_regions = sorted(set(base.regions) - set(current.regions))
+    for label, items in (
+        ("Instance types added to the audit", added_types),
+        ("Instance types removed from the audit", removed_types),
+        ("Regions added to the audit", added_regions),
+        ("Regions removed from the audit", removed_regions),
+    ):
+        if items:
+            lines.append(f"\n**{label}:** `{', '.join(items)}`\n")
+
+    if not changed:
+        lines.append("\n_No availability changes since the baseline snapshot._\n")
+        path.write_text("\n".join(lines))
+        return
+
+    lines.append("\n## Changed cells\n")
+    lines.append(
+        "`Previous since` is when the baseline value was first recorded; "
+        "`Current since` is when the current value was first recorded "
+        "(this run if it is new).\n"
+    )
+    lines.append(
+        "| Change | Instance type | Region | Was | Now | Previous since | Current since |"
+    )
+    lines.append("| --- | --- | --- | --- | --- | --- | --- |")
+    for i in changed:
+        row, col = divmod(i, ncols)
+        itype, region = current.types[row], current.regions[col]
+        old_kind, old_az = aligned.kind[i], aligned.az_count[i]
+        new_kind, new_az = current.kind[i], current.az_count[i]
+        label = f"{region} (extra)" if region in extra_regions else region
+        was = _cell_text(old_kind, old_az, aligned.total_azs[col])
+        now = _cell_text(new_kind, new_az, current.total_azs[col])
+        lines.append(
+            f"| {classify_change(old_kind, old_az, new_kind, new_az)} | `{itype}` | "
+            f"{label} | {was} | {now} | "
+            f"{stamp(aligned.since[i])} ({_format_age(current.created - aligned.since[i])}) | "
+            f"{stamp(current.since[i])} ({_format_age(current.created - current.since[i])}) |"
+        )
+    lines.append("")
+    path.write_text("\n".join(lines))
+
+
 # -----------------------------------------------------------------------------
 # CLI
 # -----------------------------------------------------------------------------
 
 
+def write_reports(
+    out_dir: Path,
+    results: AuditResults,
+    snapshot_dir: str | None = None,
+    diff_against: str | None = None,
+) -> None:
+    """Write the markdown and CSV reports and the saved results file, plus
+    the snapshot/diff if asked."""
+    specs, regions = results.specs, results.regions
+    doc_families, az_results = results.doc_families, results.az_results
+    extra_regions = results.extra_regions
+    unknown_doc_regions = [r for r in regions if r not in doc_families]
+    out_dir.mkdir(parents=True, exist_ok=True)
+    md_path = out_dir / "audit-pcs-instances.md"
+    csv_path = out_dir / "audit-pcs-instances.csv"
+    matrix = AvailabilityMatrix(specs, regions, doc_families, az_results)
+    write_markdown(
+        md_path,
+        specs,
+        regions,
+        doc_families,
+        az_results,
+        results.inaccessible,
+        unknown_doc_regions,
+        extra_regions=extra_regions,
+        matrix=matrix,
+    )
+    write_csv(
+        csv_path,
+        specs,
+        regions,
+        doc_families,
+        az_results,
+        extra_regions=extra_regions,
+        matrix=matrix,
+    )
+    results_path = out_dir / RESULTS_FILENAME
+    results.save(results_path)
+    print(f"Wrote {md_path}", file=sys.stderr)
+    print(f"Wrote {csv_path}", file=sys.stderr)
+    print(f"Wrote {results_path}", file=sys.stderr)
+
+    if snapshot_dir or diff_against:
+        store = SnapshotStore(
+            Path(snapshot_dir).expanduser()
+            if snapshot_dir
+            else Path(diff_against).expanduser().parent
+        )
+        current = snapshot_from_matrix(matrix)
+        carry_since(store.latest(), current)
+        base = None
+        if diff_against:
+            try:
+                base = store.resolve(diff_against)
+            except FileNotFoundError as e:
+                print(f"WARNING: {e}; no baseline to diff against", file=sys.stderr)
+        if base is not None:
+            changed = changed_cells(base, current)
+            diff_path = out_dir / "audit-pcs-instances-diff.md"
+            write_diff_markdown(diff_path, base, current, changed, extra_regions)
+            print(
+                f"Wrote {diff_path} ({len(changed)} changed cell(s) since "
+                f"{base.run_id})",
+                file=sys.stderr,
+            )
+        if snapshot_dir:
+            print(f"Saved snapshot {store.append(current)}", file=sys.stderr)
+
+
+# -----------------------------------------------------------------------------
+# Sharded runs
+# -----------------------------------------------------------------------------
+
+
+def run_merge(args: argparse.Namespace) -> int:
+    """The `merge` subcommand: combine shard results into the reports."""
+    try:
+        merged = merge_partials([PartialResult.read(Path(p)) for p in args.partials])
+    except (OSError, ValueError) as e:
+        print(f"merge failed: {e}", file=sys.stderr)
+        return 1
+    results = AuditResults.from_partial(merged)
+    print(
+        f"Merged {len(args.partials)} partial result(s): {len(results.regions)} "
+        f"regions, {len(results.az_results)} with AZ detail",
+        file=sys.stderr,
+    )
+    write_reports(
+        Path(args.output_dir),
+        results,
+        snapshot_dir=args.snapshot_dir,
+        diff_against=args.diff_against,
+    )
+    return 0
+
+
+def run_all_types(
+    clients: ClientPool,
+    regions: list[str],
+    out_dir: Path,
+    tracer: Tracer | None = None,
+) -> int:
+    """The --all-types audit: build the full catalog and write its reports."""
+    with _phase(tracer, "catalog"):
+        catalog, inaccessible = audit_all_types(
+            clients.session, regions, tracer=tracer, clients=clients
+        )
+    if inaccessible:
+        print(
+            f"  {len(inaccessible)} region(s) without data "
+            f"(credentials cannot reach): {inaccessible}",
+            file=sys.stderr,
+        )
+    print(
+        f"Catalog: {len(catalog.types)} types x {len(catalog.regions)} regions x "
+        f"{len(catalog.azs)} AZs in {catalog.nbytes() / 1024:.0f} KiB",
+        file=sys.stderr,
+    )
+    out_dir.mkdir(parents=True, exist_ok=True)
+    md_path = out_dir / "audit-pcs-catalog.md"
+    csv_path = out_dir / "audit-pcs-catalog.csv"
+    t0 = time.monotonic()
+    with _phase(tracer, "reports"):
+        write_catalog_markdown(md_path, catalog, inaccessible)
+        write_catalog_csv(csv_path, catalog)
+    print(f"Wrote {md_path}", file=sys.stderr)
+    print(
+        f"Wrote {csv_path} (reports took {time.monotonic() - t0:.2f}s)",
+        file=sys.stderr,
+    )
+    return 0
+
+
+# -----------------------------------------------------------------------------
+# PR gate
+# -----------------------------------------------------------------------------
+
+
+def _gate_region(
+    clients: ClientPool,
+    region: str,
+    specs: list[InstanceSpec],
+    controller: ConcurrencyController,
+    tracer: Tracer | None = None,
+) -> list[GateFailure]:
+    """Confirm with EC2 which of specs (ruled out by the docs) are missing.
+
+    A type the API shows in any AZ is offered (`OK*`); one it shows in none,
+    or in a region the credentials cannot reach, stays `missing-region`.
+    """
+    ctx = _RegionContext(clients, region, controller=controller, tracer=tracer)
+    types = sorted({s.type for s in specs})
+    try:
+        fetched = [_run_offerings_query(ctx, q) for q in plan_offerings_queries(types)]
+    except RegionNotAccessible:
+        return gate_failures(
+            region, specs, "not on the docs page; region not reachable to confirm"
+        )
+    if None in fetched:
+        return gate_failures(
+            region, specs, "not on the docs page; EC2 lookup failed to confirm"
+        )
+    offered = {t for part in fetched for t, azs in part.items() if azs}
+    return gate_failures(
+        region,
+        [s for s in specs if s.type not in offered],
+        "not on the docs page and in no AZ per EC2",
+    )
+
+
+def run_gate(args: argparse.Namespace, tracer: Tracer | None = None) -> int:
+    """--gate: exit 1 on the first changed recipe type missing in a GA region.
+
+    Writes no reports. Exit 0 when every needed type is offered (or
+    unverifiable) in every GA region, 2 on usage errors.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    manifest = Path(args.manifest)
+    try:
+        if args.changed_recipes:
+            changed = {
+                r.strip() for arg in args.changed_recipes for r in arg.split(",")
+            } - {""}
+            source = "--changed-recipes"
+        else:
+            base = args.changed_since or DEFAULT_GATE_BASE
+            files = git_changed_files(base, REPO_ROOT)
+            changed = recipes_for_files(load_recipe_paths(manifest), files)
+            source = f"{len(files)} file(s) changed since {base}"
+        profiles = ProfileMap(args.profile_map, default=args.profile)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    specs = [s for s in load_manifest(manifest) if s.recipe in changed]
+    unknown = changed - {s.recipe for s in specs}
+    if unknown:
+        print(f"Not in the manifest (not gated): {sorted(unknown)}", file=sys.stderr)
+    if not specs:
+        print(f"Gate passed: no manifest recipe changed ({source}).")
+        return 0
+    print(
+        f"Gating {len(changed - unknown)} recipe(s) from {source}: "
+        f"{sorted(changed - unknown)} ({len({s.type for s in specs})} types)",
+        file=sys.stderr,
+    )
+    clients = RoutedClientPool(profiles, _new_session, tracer=tracer)
+    regions, extra_regions = _resolve_regions(args, clients, profiles, tracer)
+    regions = [r for r in regions if r not in extra_regions]  # GA regions only
+    plan = plan_gate(specs, regions, _load_doc_families(args, tracer))
+    if not plan:
+        print(
+            f"Gate passed: the docs page lists every needed family in all "
+            f"{len(regions)} region(s)."
+        )
+        return 0
+    print(
+        f"Docs page rules out needed families in {len(plan)} region(s): "
+        f"{[region for region, _ in plan]}",
+        file=sys.stderr,
+    )
+    failures: list[GateFailure] = []
+    if args.no_az:
+        region, ruled_out = plan[0]
+        failures = gate_failures(region, ruled_out, "not on the docs page (--no-az)")
+    else:
+        controller = ConcurrencyController()
+        pool = ThreadPoolExecutor(max_workers=controller.max_workers)
+        with _phase(tracer, "gate"):
+            # Submitted most-suspect region first; the first confirmed gap
+            # cancels everything still queued.
+            futures = {
+                pool.submit(
+                    _gate_region, clients, region, ruled_out, controller, tracer
+                ): region
+                for region, ruled_out in plan
+            }
+            try:
+                for fut in as_completed(futures):
+                    failures = fut.result()
+                    if failures:
+                        break
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+        cancelled = sum(f.cancelled() for f in futures)
+        if cancelled:
+            print(f"  cancelled {cancelled} outstanding lookup(s)", file=sys.stderr)
+    if failures:
+        print("Gate FAILED: " + str(failures[0]))
+        for failure in failures[1:]:
+            print(f"  also: {failure}")
+        return 1
+    print(
+        f"Gate passed: EC2 offers every type the docs page rules out in "
+        f"{len(plan)} region(s)."
+    )
+    return 0
+
+
+# -----------------------------------------------------------------------------
+# Serve mode
+# -----------------------------------------------------------------------------
+
+
+def _matrix_changes(
+    previous: AvailabilityMatrix, current: AvailabilityMatrix
+) -> list[dict]:
+    """The cells that differ between two matrices, as JSON-ready dicts."""
+    base, now = snapshot_from_matrix(previous, 0), snapshot_from_matrix(current, 0)
+    aligned = base.reindexed(now.types, now.regions)
+    ncols = len(now.regions)
+    changes = []
+    for i in changed_cells(base, now):
+        row, col = divmod(i, ncols)
+        old_kind, old_az = aligned.kind[i], aligned.az_count[i]
+        new_kind, new_az = now.kind[i], now.az_count[i]
+        changes.append(
+            {
+                "type": now.types[row],
+                "region": now.regions[col],
+                "change": classify_change(old_kind, old_az, new_kind, new_az),
+                "was": _cell_text(old_kind, old_az, aligned.total_azs[col]),
+                "now": _cell_text(new_kind, new_az, now.total_azs[col]),
+            }
+        )
+    return changes
+
+
+def serve_answers(
+    results: AuditResults, previous: AuditResults | None, task: str | None
+) -> dict[str, object]:
+    """The serve mode's JSON answers for results, by path.
+
+    /matrix holds every type x region cell and its status; /impact (and
+    /impact/<recipe>) the regions where each recipe is blocked; /diff the
+    cells that changed in the refresh (task) that produced results.
+    """
+    matrix = AvailabilityMatrix(
+        results.specs, results.regions, results.doc_families, results.az_results
+    )
+    ncols = len(matrix.regions)
+    rows = [
+        {
+            "type": itype,
+            "arch": arch,
+            "family": matrix.families[row],
+            "recipes": matrix.recipes[row],
+            "roles": matrix.roles[row],
+            "cells": [matrix.cell(row, col) for col in range(ncols)],
+            "status": [matrix.status(row, col) for col in range(ncols)],
+        }
+        for row, (itype, arch) in enumerate(matrix.types)
+    ]
+    impact = recipe_blockers(results.specs, matrix)
+    answers: dict[str, object] = {
+        "/matrix": {
+            "regions": matrix.regions,
+            "extra_regions": sorted(results.extra_regions),
+            "total_azs": list(matrix.total_azs),
+            "inaccessible": sorted(results.inaccessible),
+            "unknown_doc_regions": [
+                r for r in results.regions if r not in results.doc_families
+            ],
+            "no_az": results.no_az,
+            "types": rows,
+        },
+        "/impact": impact,
+    }
+    for recipe, blockers in impact.items():
+        answers[f"/impact/{recipe}"] = blockers
+    diff: dict[str, object] = {"task": task, "changes": []}
+    if previous is not None:
+        old = AvailabilityMatrix(
+            previous.specs,
+            previous.regions,
+            previous.doc_families,
+            previous.az_results,
+        )
+        diff["changes"] = _matrix_changes(old, matrix)
+        diff["regions_added"] = sorted(set(results.regions) - set(previous.regions))
+        diff["regions_removed"] = sorted(
+            set(previous.regions) - set(results.regions)
+        )
+    answers["/diff"] = diff
+    return answers
+
+
+def refresh_region(
+    results: AuditResults,
+    region: str,
+    az_detail: Callable[
+        [list[str], dict[str, Exception]], tuple[AzResults, list[str]]
+    ],
+) -> AuditResults:
+    """results with region's AZ detail redone by az_detail(regions, failures).
+
+    Raises AzDetailFailed if the lookups failed, so the service keeps the
+    region's last good data instead of publishing an empty AZ map.
+    """
+    failures: dict[str, Exception] = {}
+    found, inaccessible = az_detail([region], failures)
+    if region in failures:
+        # audit_az_detail logged the error.
+        raise AzDetailFailed(f"AZ detail failed for {region}: {failures[region]}")
+    if region in found and not found[region][2]:
+        # The AZ count lookup failed (and was logged).
+        raise AzDetailFailed(f"AZ detail failed for {region}: no AZ count")
+    az_results = {r: v for r, v in results.az_results.items() if r != region}
+    az_results.update(found)
+    return replace(
+        results,
+        az_results=az_results,
+        inaccessible=[r for r in results.inaccessible if r != region] + inaccessible,
+    )
+
+
+def run_serve(args: argparse.Namespace) -> int:
+    """The `serve` subcommand: audit once, then keep the answers fresh."""
+    from .audit_pcs_serve import DOCS_TASK, AuditService, PayloadStore, make_server
+
+    if args.shard or args.all_types:
+        print("serve cannot be combined with --shard or --all-types.", file=sys.stderr)
+        return 2
+    try:
+        profiles = ProfileMap(args.profile_map, default=args.profile)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    # Bind first, so a busy port fails before the initial audit, not after.
+    store = PayloadStore()
+    try:
+        server = make_server(store, args.host, args.port)
+    except OSError as e:
+        print(f"cannot listen on {args.host}:{args.port}: {e}", file=sys.stderr)
+        return 2
+    clients = RoutedClientPool(profiles, _new_session)
+    # One controller for the life of the service, so each region's learned
+    # concurrency limit carries over from one refresh to the next.
+    controller = ConcurrencyController()
+    specs = load_manifest(Path(args.manifest))
+    types = sorted({s.type for s in specs})
+
+    def az_detail(
+        regions: list[str], failures: dict[str, Exception] | None = None
+    ) -> tuple[AzResults, list[str]]:
+        if args.no_az or not regions:
+            return {}, []
+        return audit_az_detail(
+            clients.session,
+            regions,
+            types,
+            controller=controller,
+            clients=clients,
+            failures=failures,
+        )
+
+    def refresh(results: AuditResults, task: str) -> AuditResults:
+        if task == DOCS_TASK:
+            regions, extra_regions = _resolve_regions(args, clients, profiles)
+            keep = set(regions)
+            return replace(
+                results,
+                regions=regions,
+                extra_regions=extra_regions,
+                doc_families=_load_doc_families(args),
+                az_results={r: v for r, v in results.az_results.items() if r in keep},
+                inaccessible=[r for r in results.inaccessible if r in keep],
+            )
+        if task not in results.regions:
+            return results  # dropped by a docs refresh earlier in the cycle
+        return refresh_region(results, task, az_detail)
+
+    def tasks(results: AuditResults) -> list[str]:
+        return [DOCS_TASK] if args.no_az else [DOCS_TASK, *results.regions]
+
+    try:
+        regions, extra_regions = _resolve_regions(args, clients, profiles)
+        if not regions:
+            print("No regions to audit.", file=sys.stderr)
+            return 1
+        az_results, inaccessible = az_detail(regions)
+        results = AuditResults(
+            specs=specs,
+            regions=regions,
+            doc_families=_load_doc_families(args),
+            az_results=az_results,
+            inaccessible=inaccessible,
+            extra_regions=extra_regions,
+            no_az=args.no_az,
+        )
+        service = AuditService(
+            results, refresh, tasks, serve_answers, args.refresh_interval * 60, store
+        )
+        host, port = server.server_address[:2]
+        print(
+            f"Serving /matrix, /impact, /diff, /changes and /status on "
+            f"http://{host}:{port}/ (each of {len(tasks(results))} refresh "
+            f"tasks runs once every {args.refresh_interval:g} min)",
+            file=sys.stderr,
+        )
+        threading.Thread(
+            target=server.serve_forever, name="serve-http", daemon=True
+        ).start()
+        stop = threading.Event()
+        try:
+            service.run(stop)
+        except KeyboardInterrupt:
+            stop.set()
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
 def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
     p = argparse.ArgumentParser(description=__doc__)
     p.add_argument(
@@ -667,6 +1968,17 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         help="Directory to write report files into.",
     )
     p.add_argument("--profile", help="AWS profile to use.")
+    p.add_argument(
+        "--profile-map",
+        action="append",
+        default=[],
+        metavar="KEY=PROFILE",
+        help="Use PROFILE for the regions matching KEY: a partition (aws, "
+        "aws-us-gov, aws-cn) or a region glob (e.g. 'me-*'). May be "
+        "repeated. Partitions run concurrently in one audit, each with its "
+        "own session, and PCS regions are also discovered in every mapped "
+        "partition. Regions matching no KEY use --profile.",
+    )
     p.add_argument(
         "--no-az",
         action="store_true",
@@ -681,6 +1993,13 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         "--docs-cache",
         help="Path to a local HTML cache of the docs page (for offline runs).",
     )
+    p.add_argument(
+        "--no-docs-http-cache",
+        action="store_true",
+        help="Always download the docs page in full. By default the page is "
+        "cached (in --cache-dir, or the user cache directory) and re-fetched "
+        "with If-None-Match/If-Modified-Since.",
+    )
     p.add_argument(
         "--extra-regions-file",
         help="Path to a YAML file listing extra AWS regions to include in the "
@@ -689,14 +2008,276 @@ def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
         "`regions: [{code: <region>}, ...]`. The file is not shipped with "
         "this repo; point at a path on your local system.",
     )
-    return p.parse_args(list(argv) if argv is not None else None)
+    p.add_argument(
+        "--cache-dir",
+        help="Directory for an on-disk cache of EC2 AZ and offerings lookups "
+        "(and of the docs page). Re-runs only query AWS for regions/types "
+        "whose entries are missing or older than --max-age. AZ names are "
+        "account-specific; use one cache directory per AWS account.",
+    )
+    p.add_argument(
+        "--max-age",
+        type=float,
+        default=DEFAULT_CACHE_MAX_AGE_HOURS,
+        help="Maximum age in hours of a cached entry before it is re-fetched "
+        f"(default: {DEFAULT_CACHE_MAX_AGE_HOURS:g}). Only used with --cache-dir.",
+    )
+    p.add_argument(
+        "--refresh-region",
+        action="append",
+        default=[],
+        help="Ignore cached entries for this region and re-fetch them. May be "
+        "repeated or given as a comma-separated list.",
+    )
+    p.add_argument(
+        "--shard",
+        type=_shard_arg,
+        metavar="I/N",
+        help="Run the AZ-detail phase for shard I of N (1-based) of the "
+        "regions only, and write audit-pcs-partial-I-of-N.json instead of "
+        "the reports. Combine the N partial results with the merge "
+        "subcommand.",
+    )
+    p.add_argument(
+        "--all-types",
+        action="store_true",
+        help="Audit every instance type offered in every AZ of the audited "
+        "regions instead of the manifest's types. Writes "
+        "audit-pcs-catalog.md and audit-pcs-catalog.csv; the docs page, "
+        "offerings cache and snapshots are not used.",
+    )
+    p.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Record per-phase wall times and every AWS API call (latency, "
+        "attempts, throttles, bytes) plus docs fetch/parse, write them to "
+        "PATH and print a summary of the slowest regions and operations.",
+    )
+    p.add_argument(
+        "--trace-format",
+        choices=TRACE_FORMATS,
+        default="json",
+        help="Trace file format: plain JSON, or Chrome trace events for "
+        "chrome://tracing / Perfetto (default: json).",
+    )
+    p.add_argument(
+        "--gate",
+        action="store_true",
+        help="PR check: audit only the instance types of the changed recipes "
+        "in the GA regions, write no reports, and exit 1 on the first type "
+        "missing in a region (cancelling the remaining lookups).",
+    )
+    p.add_argument(
+        "--changed-recipes",
+        action="append",
+        default=[],
+        metavar="RECIPES",
+        help="With --gate: the changed manifest recipes. May be repeated or "
+        "comma-separated. Default: derived from the files changed since "
+        "--changed-since.",
+    )
+    p.add_argument(
+        "--changed-since",
+        metavar="REF",
+        help="With --gate: map the files changed between REF's merge base "
+        f"and HEAD to manifest recipes (default: {DEFAULT_GATE_BASE}).",
+    )
+    p.add_argument(
+        "--snapshot-dir",
+        help="Directory of the append-only snapshot history. Each run adds "
+        "one compressed snapshot of the availability matrix.",
+    )
+    p.add_argument(
+        "--diff-against",
+        metavar="SNAPSHOT",
+        help="Also write audit-pcs-instances-diff.md listing only the cells "
+        "that changed since SNAPSHOT: 'latest', a run id from --snapshot-dir, "
+        "or a snapshot file path.",
+    )
+
+    sub = p.add_subparsers(dest="command", metavar="{merge,query,serve}")
+    merge = sub.add_parser(
+        "merge",
+        help="Combine --shard partial results into the reports (no AWS calls).",
+    )
+    merge.add_argument("partials", nargs="+", help="Partial result JSON files.")
+    merge.add_argument(
+        "--output-dir",
+        default=str(DEFAULT_OUTPUT_DIR),
+        help="Directory to write report files into.",
+    )
+    merge.add_argument("--snapshot-dir", help="As for a single-process run.")
+    merge.add_argument("--diff-against", metavar="SNAPSHOT", help="As above.")
+    query = sub.add_parser(
+        "query",
+        help="Answer an availability question from the last saved results "
+        "(no AWS calls).",
+    )
+    add_query_arguments(query)
+    serve = sub.add_parser(
+        "serve",
+        help="Audit, then keep the results fresh and serve them as JSON over "
+        "local HTTP (matrix, per-recipe impact, diff since the last refresh).",
+    )
+    serve.add_argument("--host", default=DEFAULT_SERVE_HOST, help="Listen address.")
+    serve.add_argument(
+        "--port", type=int, default=DEFAULT_SERVE_PORT, help="Listen port."
+    )
+    serve.add_argument(
+        "--refresh-interval",
+        type=float,
+        default=DEFAULT_REFRESH_MINUTES,
+        metavar="MINUTES",
+        help="How often each refresh task (the docs page, then each region's "
+        "AZ detail) runs. Tasks are spread evenly over the interval "
+        f"(default: {DEFAULT_REFRESH_MINUTES:g}).",
+    )
+    args = p.parse_args(list(argv) if argv is not None else None)
+    if args.diff_against == "latest" and not args.snapshot_dir:
+        p.error("--diff-against latest needs --snapshot-dir to find the latest in")
+    return args
+
+
+def _shard_arg(value: str) -> tuple[int, int]:
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
 
 
 def main(argv: Iterable[str] | None = None) -> int:
     args = parse_args(argv)
-    session = (
-        boto3.Session(profile_name=args.profile) if args.profile else boto3.Session()
+    if args.command == "merge":
+        return run_merge(args)
+    if args.command == "query":
+        return run_query(args)
+    if args.command == "serve":
+        return run_serve(args)
+    if args.shard and args.all_types:
+        print("--shard cannot be combined with --all-types.", file=sys.stderr)
+        return 2
+    if args.gate and (args.shard or args.all_types):
+        print("--gate cannot be combined with --shard or --all-types.", file=sys.stderr)
+        return 2
+    if args.all_types and args.no_az:
+        print(
+            "--all-types needs EC2 lookups; it cannot be used with --no-az.",
+            file=sys.stderr,
+        )
+        return 2
+    tracer = Tracer() if args.trace else None
+    try:
+        if args.gate:
+            return run_gate(args, tracer)
+        return _run_audit(args, tracer)
+    finally:
+        if tracer is not None:
+            tracer.write(Path(args.trace), args.trace_format)
+            print(tracer.summary(), file=sys.stderr)
+            print(f"Wrote {args.trace_format} trace {args.trace}", file=sys.stderr)
+
+
+def _new_session(profile: str | None) -> boto3.Session:
+    import boto3
+
+    return boto3.Session(profile_name=profile) if profile else boto3.Session()
+
+
+def _phase(tracer: Tracer | None, name: str):
+    return nullcontext({}) if tracer is None else tracer.phase(name)
+
+
+def _resolve_regions(
+    args: argparse.Namespace,
+    clients: RoutedClientPool,
+    profiles: ProfileMap,
+    tracer: Tracer | None = None,
+) -> tuple[list[str], set[str]]:
+    """Return (regions to audit, extra regions): --regions, or the GA PCS
+    regions of every mapped partition plus --extra-regions-file."""
+    if args.regions:
+        regions = [r.strip() for r in args.regions.split(",") if r.strip()]
+        print(f"Using region override: {regions}", file=sys.stderr)
+        return regions, set()
+    with _phase(tracer, "discover-regions"):
+        ga_regions = resolve_pcs_regions(clients, profiles.discovery_regions())
+    print(
+        f"Discovered {len(ga_regions)} GA PCS regions: {ga_regions}",
+        file=sys.stderr,
     )
+    extra_regions: set[str] = set()
+    if args.extra_regions_file:
+        extra_path = Path(args.extra_regions_file).expanduser()
+        loaded = load_extra_regions(extra_path)
+        for code in loaded:
+            if code not in ga_regions:
+                extra_regions.add(code)
+        if extra_regions:
+            print(
+                f"Adding {len(extra_regions)} extra regions from "
+                f"{extra_path}: {sorted(extra_regions)}",
+                file=sys.stderr,
+            )
+        else:
+            print(
+                f"Loaded {extra_path}; no regions to add (all already in GA list)",
+                file=sys.stderr,
+            )
+    return sorted(set(ga_regions) | extra_regions), extra_regions
+
+
+def _load_doc_families(
+    args: argparse.Namespace, tracer: Tracer | None = None
+) -> dict[str, set[str]]:
+    """Region -> families from the docs page (all partitions, no creds)."""
+    print(f"Fetching AWS docs page: {args.docs_url}", file=sys.stderr)
+    with _phase(tracer, "docs") as docs_trace:
+
+        def counted(chunks):
+            return chunks if tracer is None else tracer.count(chunks, docs_trace)
+
+        if args.docs_cache:
+            doc_families = scrape_doc_families(
+                chunks=counted(_iter_file(Path(args.docs_cache)))
+            )
+        elif args.no_docs_http_cache:
+            doc_families = scrape_doc_families(chunks=counted(_iter_url(args.docs_url)))
+        else:
+            from .audit_pcs_http_cache import DocsPageCache, default_cache_dir
+
+            docs_cache = DocsPageCache(
+                Path(args.cache_dir).expanduser()
+                if args.cache_dir
+                else default_cache_dir()
+            )
+            fetched = docs_cache.fetch_families(
+                args.docs_url,
+                parse=lambda chunks: scrape_doc_families(
+                    chunks=_decode_chunks(counted(chunks))
+                ),
+                parser_version=DOCS_PARSER_VERSION,
+            )
+            doc_families = fetched.families
+            docs_trace["status"] = fetched.status
+            print(
+                f"Docs page {fetched.status} (sha256 {fetched.sha256[:12]}); "
+                + ("parsed" if fetched.parsed else "reused cached families"),
+                file=sys.stderr,
+            )
+    print(
+        f"Parsed families for {len(doc_families)} regions from docs page.",
+        file=sys.stderr,
+    )
+    return doc_families
+
+
+def _run_audit(args: argparse.Namespace, tracer: Tracer | None) -> int:
+    try:
+        profiles = ProfileMap(args.profile_map, default=args.profile)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    clients = RoutedClientPool(profiles, _new_session, tracer=tracer)
 
     specs = load_manifest(Path(args.manifest))
     unique_instance_types = sorted({s.type for s in specs})
@@ -706,50 +2287,36 @@ def main(argv: Iterable[str] | None = None) -> int:
         file=sys.stderr,
     )
 
-    if args.regions:
-        regions = [r.strip() for r in args.regions.split(",") if r.strip()]
-        print(f"Using region override: {regions}", file=sys.stderr)
-        extra_regions: set[str] = set()
-    else:
-        ga_regions = resolve_pcs_regions(session)
-        print(
-            f"Discovered {len(ga_regions)} GA PCS regions: {ga_regions}",
-            file=sys.stderr,
-        )
-        extra_regions = set()
-        if args.extra_regions_file:
-            extra_path = Path(args.extra_regions_file).expanduser()
-            loaded = load_extra_regions(extra_path)
-            for code in loaded:
-                if code not in ga_regions:
-                    extra_regions.add(code)
-            if extra_regions:
-                print(
-                    f"Adding {len(extra_regions)} extra regions from "
-                    f"{extra_path}: {sorted(extra_regions)}",
-                    file=sys.stderr,
-                )
-            else:
-                print(
-                    f"Loaded {extra_path}; no regions to add (all already in GA list)",
-                    file=sys.stderr,
-                )
-        regions = sorted(set(ga_regions) | extra_regions)
+    regions, extra_regions = _resolve_regions(args, clients, profiles, tracer)
     if not regions:
         print("No regions to audit.", file=sys.stderr)
         return 1
+    if args.profile_map:
+        by_profile: dict[str, list[str]] = defaultdict(list)
+        for r in regions:
+            by_profile[profiles.profile_for(r) or "(default)"].append(r)
+        for profile, routed in sorted(by_profile.items()):
+            print(
+                f"Profile {profile}: {len(routed)} region(s): {routed}",
+                file=sys.stderr,
+            )
 
-    # Docs-page region-level scrape (all partitions in one shot, no creds).
-    print(f"Fetching AWS docs page: {args.docs_url}", file=sys.stderr)
-    if args.docs_cache:
-        html = Path(args.docs_cache).read_text()
-        doc_families = scrape_doc_families(html=html)
-    else:
-        doc_families = scrape_doc_families(url=args.docs_url)
-    print(
-        f"Parsed families for {len(doc_families)} regions from docs page.",
-        file=sys.stderr,
-    )
+    if args.all_types:
+        return run_all_types(clients, regions, Path(args.output_dir), tracer)
+
+    az_regions = regions
+    if args.shard:
+        az_regions = shard_regions(regions, *args.shard)
+        print(
+            f"Shard {args.shard[0]}/{args.shard[1]}: AZ detail for "
+            f"{len(az_regions)} of {len(regions)} regions: {az_regions}",
+            file=sys.stderr,
+        )
+    if not args.no_az and az_regions:
+        # Load the EC2 model and endpoint rules while the docs page is read.
+        clients.prewarm("ec2", az_regions[0])
+
+    doc_families = _load_doc_families(args, tracer)
     unknown_doc_regions = [r for r in regions if r not in doc_families]
     if unknown_doc_regions:
         print(
@@ -763,9 +2330,33 @@ def main(argv: Iterable[str] | None = None) -> int:
     if args.no_az:
         print("Skipping EC2 AZ lookups (--no-az).", file=sys.stderr)
     else:
-        az_results, inaccessible = audit_az_detail(
-            session, regions, unique_instance_types
-        )
+        cache = None
+        if args.cache_dir:
+            refresh = [
+                r.strip()
+                for arg in args.refresh_region
+                for r in arg.split(",")
+                if r.strip()
+            ]
+            cache = OfferingsCache(
+                Path(args.cache_dir).expanduser(),
+                max_age=args.max_age * 3600,
+                refresh_regions=refresh,
+            )
+            print(f"Using offerings cache: {cache.path}", file=sys.stderr)
+        try:
+            with _phase(tracer, "az-detail"):
+                az_results, inaccessible = audit_az_detail(
+                    clients.session,
+                    az_regions,
+                    unique_instance_types,
+                    cache=cache,
+                    tracer=tracer,
+                    clients=clients,
+                )
+        finally:
+            if cache is not None:
+                cache.close()
         if inaccessible:
             print(
                 f"  {len(inaccessible)} region(s) without AZ data "
@@ -773,30 +2364,27 @@ def main(argv: Iterable[str] | None = None) -> int:
                 file=sys.stderr,
             )
 
-    out_dir = Path(args.output_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-    md_path = out_dir / "audit-pcs-instances.md"
-    csv_path = out_dir / "audit-pcs-instances.csv"
-    write_markdown(
-        md_path,
-        specs,
-        regions,
-        doc_families,
-        az_results,
-        inaccessible,
-        unknown_doc_regions,
+    results = AuditResults(
+        specs=specs,
+        regions=regions,
+        doc_families=doc_families,
+        az_results=az_results,
+        inaccessible=inaccessible,
         extra_regions=extra_regions,
+        no_az=args.no_az,
     )
-    write_csv(
-        csv_path,
-        specs,
-        regions,
-        doc_families,
-        az_results,
-        extra_regions=extra_regions,
-    )
-    print(f"Wrote {md_path}", file=sys.stderr)
-    print(f"Wrote {csv_path}", file=sys.stderr)
+    if args.shard:
+        path = results.to_partial(args.shard).write(Path(args.output_dir))
+        print(f"Wrote partial result {path}", file=sys.stderr)
+        return 0
+
+    with _phase(tracer, "reports"):
+        write_reports(
+            Path(args.output_dir),
+            results,
+            snapshot_dir=args.snapshot_dir,
+            diff_against=args.diff_against,
+        )
     return 0
 
 
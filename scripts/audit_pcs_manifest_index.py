@@ -0,0 +1,565 @@
+"""Derive the PCS instance manifest from the recipes' CloudFormation templates.
+
+scripts/pcs_instance_manifest.yml is maintained by hand and drifts when a
+recipe template changes its instance types. This tool indexes the template
+files each manifest recipe lists under `files:` and collects the instance
+types the templates can actually launch:
+
+  - literal `InstanceType` / `InstanceTypes` property values,
+  - `!FindInMap` lookups, following every key a `!Ref` to a parameter or
+    pseudo parameter could select (and the DefaultValue fallback),
+  - parameter `Default` and `AllowedValues` reached through `!Ref`.
+
+Templates are parsed once, in parallel worker processes, with a YAML loader
+that understands the CloudFormation short-form tags (!Ref, !Sub, ...). The
+result for each file is cached by the SHA-256 of its content, so a repeat
+run only re-parses templates that changed.
+
+Recipes whose files are not CloudFormation YAML (e.g. Terraform), or whose
+templates name no instance types (e.g. a launch template that leaves the
+type to the node group), cannot be derived and are reported as skipped;
+their manifest entries are left alone.
+
+Usage:
+  python -m scripts.audit_pcs_manifest_index            # print drift report
+  python -m scripts.audit_pcs_manifest_index --check    # exit 1 on drift
+  python -m scripts.audit_pcs_manifest_index --write    # update the manifest
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+import yaml
+
+from .audit_pcs_http_cache import default_cache_dir
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+MANIFEST_PATH = REPO_ROOT / "scripts" / "pcs_instance_manifest.yml"
+INDEX_CACHE_FILENAME = "template-index.json"
+
+# Bump when extraction logic changes; cached entries from other versions
+# are ignored.
+INDEX_VERSION = 1
+
+TEMPLATE_SUFFIXES = {".yaml", ".yml"}
+INSTANCE_TYPE_KEYS = {"InstanceType", "InstanceTypes"}
+
+INSTANCE_TYPE_RE = re.compile(
+    r"^[a-z][a-z0-9-]*\.(?:nano|micro|small|medium|large|\d*xlarge|metal(?:-\d+xl)?)$"
+)
+
+# Families whose PCS node groups require EFA (see the manifest header).
+EFA_FAMILY_PREFIXES = ("hpc", "p5", "trn")
+
+
+# ---------------------------------------------------------------------------
+# CloudFormation-aware YAML loading
+# ---------------------------------------------------------------------------
+
+
+class CfnLoader(yaml.SafeLoader):
+    """SafeLoader that turns CFN short-form tags into their long form.
+
+    `!Ref X` becomes {"Ref": "X"}, `!GetAtt A.B` becomes
+    {"Fn::GetAtt": ["A", "B"]}, and any other `!Name v` becomes
+    {"Fn::Name": v}. Unknown tags (e.g. inside user-data) load the same way
+    instead of failing the parse.
+    """
+
+
+def _construct_cfn_tag(loader: CfnLoader, tag_suffix: str, node: yaml.Node):
+    if isinstance(node, yaml.ScalarNode):
+        value = loader.construct_scalar(node)
+    elif isinstance(node, yaml.SequenceNode):
+        value = loader.construct_sequence(node, deep=True)
+    else:
+        value = loader.construct_mapping(node, deep=True)
+    if tag_suffix == "Ref":
+        return {"Ref": value}
+    if tag_suffix == "Condition":
+        return {"Condition": value}
+    if tag_suffix == "GetAtt" and isinstance(value, str):
+        value = value.split(".", 1)
+    return {f"Fn::{tag_suffix}": value}
+
+
+CfnLoader.add_multi_constructor("!", _construct_cfn_tag)
+
+
+def load_template(text: str) -> dict:
+    data = yaml.load(text, Loader=CfnLoader)  # noqa: S506 - SafeLoader subclass
+    return data if isinstance(data, dict) else {}
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+
+def instance_family(instance_type: str) -> str:
+    return instance_type.split(".", 1)[0]
+
+
+def guess_arch(instance_type: str) -> str:
+    """Graviton families carry a "g" after the generation digit (c7g, m6gd, c7gn)."""
+    m = re.match(r"[a-z-]+\d+([a-z-]*)", instance_family(instance_type))
+    return "arm64" if m and "g" in m.group(1) else "x86_64"
+
+
+def _role_for(resource_type: str, hint: str, instance_type: str) -> str:
+    if resource_type == "AWS::ImageBuilder::InfrastructureConfiguration":
+        return "imagebuilder"
+    if "login" in hint.lower():
+        return "login"
+    if instance_family(instance_type).startswith(EFA_FAMILY_PREFIXES):
+        return "compute-efa"
+    return "compute"
+
+
+class _Resolver:
+    """Resolves property values in one template to concrete instance types."""
+
+    def __init__(self, template: dict) -> None:
+        self.parameters = template.get("Parameters") or {}
+        self.mappings = template.get("Mappings") or {}
+
+    def _ref_choices(self, name: str) -> list[str] | None:
+        """Values a Ref could take, or None if it could be anything."""
+        param = self.parameters.get(name)
+        if not isinstance(param, dict):
+            return None
+        choices = [
+            v for v in [param.get("Default"), *(param.get("AllowedValues") or [])]
+            if isinstance(v, (str, int, float))
+        ]
+        return [str(v) for v in choices] or None
+
+    def _keys(self, level: dict, key) -> list[str]:
+        if isinstance(key, str):
+            return [key]
+        if isinstance(key, dict) and set(key) == {"Ref"}:
+            choices = self._ref_choices(key["Ref"])
+            if choices is not None:
+                return choices
+        return list(level)
+
+    def _find_in_map(self, args) -> list[str]:
+        if not isinstance(args, list) or len(args) < 3:
+            return []
+        found: list[str] = []
+        if len(args) > 3 and isinstance(args[3], dict):
+            found += self.resolve(args[3].get("DefaultValue"))
+        map_name = args[0]
+        if not isinstance(map_name, str):
+            return found
+        top = self.mappings.get(map_name)
+        if not isinstance(top, dict):
+            return found
+        for k1 in self._keys(top, args[1]):
+            second = top.get(k1)
+            if not isinstance(second, dict):
+                continue
+            for k2 in self._keys(second, args[2]):
+                if k2 in second:
+                    found += self.resolve(second[k2])
+        return found
+
+    def resolve(self, value) -> list[str]:
+        if isinstance(value, str):
+            return [value] if INSTANCE_TYPE_RE.match(value) else []
+        if isinstance(value, list):
+            return [t for v in value for t in self.resolve(v)]
+        if not isinstance(value, dict):
+            return []
+        if set(value) == {"Ref"}:
+            name = value["Ref"]
+            param = self.parameters.get(name)
+            if not isinstance(param, dict):
+                return []
+            return self.resolve([param.get("Default"), *(param.get("AllowedValues") or [])])
+        if set(value) == {"Fn::FindInMap"}:
+            return self._find_in_map(value["Fn::FindInMap"])
+        if set(value) == {"Fn::If"}:
+            args = value["Fn::If"]
+            return self.resolve(args[1:]) if isinstance(args, list) else []
+        return [t for v in value.values() for t in self.resolve(v)]
+
+
+def _walk_properties(value, path: str):
+    """Yield (path, value) for every InstanceType/InstanceTypes key."""
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            sub_path = f"{path}.{key}"
+            if key in INSTANCE_TYPE_KEYS:
+                yield sub_path, sub
+            else:
+                yield from _walk_properties(sub, sub_path)
+    elif isinstance(value, list):
+        for i, sub in enumerate(value):
+            yield from _walk_properties(sub, f"{path}[{i}]")
+
+
+def extract_instance_types(template: dict) -> list[dict]:
+    """Return one {"type", "role", "arch", "source"} dict per reference.
+
+    Roles are a best guess from the resource type and its logical ID or
+    Name; when a manifest already lists the type, its role wins.
+    """
+    resolver = _Resolver(template)
+    found: list[dict] = []
+    seen: set[tuple[str, str]] = set()
+
+    def add(itype: str, role: str, source: str) -> None:
+        if (itype, role) in seen:
+            return
+        seen.add((itype, role))
+        found.append(
+            {"type": itype, "role": role, "arch": guess_arch(itype), "source": source}
+        )
+
+    resources = template.get("Resources") or {}
+    for logical_id, resource in resources.items():
+        if not isinstance(resource, dict):
+            continue
+        rtype = str(resource.get("Type", ""))
+        props = resource.get("Properties") or {}
+        name = props.get("Name") if isinstance(props, dict) else None
+        hint = f"{logical_id} {name if isinstance(name, str) else ''}"
+        for path, value in _walk_properties(props, logical_id):
+            for itype in resolver.resolve(value):
+                add(itype, _role_for(rtype, hint, itype), path)
+
+    for name, param in resolver.parameters.items():
+        if "instancetype" not in name.lower() or not isinstance(param, dict):
+            continue
+        for itype in resolver.resolve({"Ref": name}):
+            add(itype, _role_for("", name, itype), f"Parameters.{name}")
+    return found
+
+
+def index_template_text(text: str) -> dict:
+    """Parse one template and return its cache entry."""
+    try:
+        template = load_template(text)
+    except yaml.YAMLError as e:
+        return {"error": f"YAML parse error: {e}".splitlines()[0], "instances": []}
+    return {"instances": extract_instance_types(template)}
+
+
+# ---------------------------------------------------------------------------
+# Index with per-file content-hash cache
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class IndexStats:
+    files: int = 0
+    parsed: int = 0
+    cached: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"Template index: {self.files} file(s), {self.parsed} parsed, "
+            f"{self.cached} from cache"
+        )
+
+
+class TemplateIndex:
+    """Index of template files keyed by content SHA-256."""
+
+    def __init__(self, cache_dir: Path | None = None, jobs: int | None = None) -> None:
+        self.cache_path = cache_dir / INDEX_CACHE_FILENAME if cache_dir else None
+        self.jobs = jobs or os.cpu_count() or 1
+        self.stats = IndexStats()
+
+    def _load_cache(self) -> dict[str, dict]:
+        if self.cache_path is None:
+            return {}
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION:
+            return {}
+        return data.get("files", {})
+
+    def _save_cache(self, entries: dict[str, dict]) -> None:
+        if self.cache_path is None:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_path.with_suffix(".json.tmp")
+        tmp.write_text(
+            json.dumps({"version": INDEX_VERSION, "files": entries}, sort_keys=True)
+        )
+        tmp.replace(self.cache_path)
+
+    def index(self, paths: Iterable[Path]) -> dict[Path, dict]:
+        """Return {path: entry} for each YAML template path.
+
+        Each distinct file content is parsed at most once per run, and not
+        at all if the cache already holds it.
+        """
+        texts: dict[Path, str] = {}
+        digests: dict[Path, str] = {}
+        for path in paths:
+            if path in texts:
+                continue
+            raw = path.read_bytes()
+            texts[path] = raw.decode("utf-8")
+            digests[path] = hashlib.sha256(raw).hexdigest()
+        self.stats.files += len(texts)
+
+        cache = self._load_cache()
+        todo: dict[str, str] = {}
+        for path, digest in digests.items():
+            if digest not in cache and digest not in todo:
+                todo[digest] = texts[path]
+
+        if len(todo) > 1 and self.jobs > 1:
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(todo))) as pool:
+                results = pool.map(index_template_text, todo.values())
+                fresh = dict(zip(todo, results))
+        else:
+            fresh = {d: index_template_text(t) for d, t in todo.items()}
+        self.stats.parsed += len(fresh)
+        self.stats.cached += len(digests) - sum(
+            1 for d in digests.values() if d in fresh
+        )
+
+        entries = {**cache, **fresh}
+        # Keep only what this run used so the cache does not grow forever.
+        self._save_cache({d: entries[d] for d in set(digests.values())})
+        return {path: entries[digest] for path, digest in digests.items()}
+
+
+# ---------------------------------------------------------------------------
+# Manifest comparison
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class RecipeDrift:
+    """Derived vs. hand-maintained instance types for one manifest recipe."""
+
+    name: str
+    derived: list[dict] = field(default_factory=list)
+    listed: list[dict] = field(default_factory=list)
+    skipped: str = ""
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def missing(self) -> list[str]:
+        """Types the templates use that the manifest does not list."""
+        if self.skipped:
+            return []
+        listed = {i["type"] for i in self.listed}
+        return sorted({i["type"] for i in self.derived} - listed)
+
+    @property
+    def stale(self) -> list[str]:
+        """Types the manifest lists that no template uses."""
+        if self.skipped:
+            return []
+        derived = {i["type"] for i in self.derived}
+        return sorted({i["type"] for i in self.listed} - derived)
+
+    @property
+    def drifted(self) -> bool:
+        return bool(self.missing or self.stale or self.errors)
+
+    def additions(self) -> list[dict]:
+        """Manifest entries for the types in self.missing, with guessed role/arch."""
+        missing = set(self.missing)
+        return [
+            {"type": i["type"], "role": i["role"], "arch": i["arch"]}
+            for i in self.derived
+            if i["type"] in missing
+        ]
+
+
+def load_manifest_recipes(path: Path) -> list[dict]:
+    with path.open() as f:
+        return (yaml.safe_load(f) or {}).get("recipes", [])
+
+
+def compare_manifest(
+    recipes: list[dict], index: TemplateIndex, repo_root: Path = REPO_ROOT
+) -> list[RecipeDrift]:
+    """Index every recipe's template files and compare with its instances."""
+    files_of: dict[str, list[Path]] = {}
+    for recipe in recipes:
+        base = repo_root / recipe["path"]
+        files_of[recipe["name"]] = [base / f for f in recipe.get("files", [])]
+    templates = [
+        p
+        for paths in files_of.values()
+        for p in paths
+        if p.suffix in TEMPLATE_SUFFIXES and p.is_file()
+    ]
+    entries = index.index(templates)
+
+    out: list[RecipeDrift] = []
+    for recipe in recipes:
+        drift = RecipeDrift(
+            name=recipe["name"],
+            listed=[
+                {"type": i["type"], "role": i["role"], "arch": i["arch"]}
+                for i in recipe.get("instances", [])
+            ],
+        )
+        paths = files_of[recipe["name"]]
+        missing = [p for p in paths if not p.is_file()]
+        unsupported = [p for p in paths if p.suffix not in TEMPLATE_SUFFIXES]
+        for p in missing:
+            drift.errors.append(f"{p.relative_to(repo_root)}: file not found")
+        seen: set[tuple[str, str]] = set()
+        for p in paths:
+            entry = entries.get(p)
+            if entry is None:
+                continue
+            if entry.get("error"):
+                drift.errors.append(f"{p.relative_to(repo_root)}: {entry['error']}")
+            for inst in entry["instances"]:
+                if (inst["type"], inst["role"]) not in seen:
+                    seen.add((inst["type"], inst["role"]))
+                    drift.derived.append(inst)
+        if unsupported:
+            drift.skipped = "not CloudFormation YAML: " + ", ".join(
+                p.name for p in unsupported
+            )
+        elif not drift.derived and not drift.errors:
+            drift.skipped = "templates name no instance types"
+        out.append(drift)
+    return out
+
+
+def write_manifest(path: Path, drifts: list[RecipeDrift]) -> None:
+    """Drop stale and append missing instances, keeping comments and layout.
+
+    Entries for types the manifest already lists are left untouched, so
+    hand-assigned roles survive.
+    """
+    from ruamel.yaml import YAML
+    from ruamel.yaml.comments import CommentedMap
+
+    ryaml = YAML()
+    ryaml.preserve_quotes = True
+    ryaml.indent(mapping=2, sequence=4, offset=2)
+    with path.open() as f:
+        data = ryaml.load(f)
+    by_name = {d.name: d for d in drifts}
+    for recipe in data.get("recipes", []):
+        drift = by_name.get(recipe["name"])
+        if drift is None or not (drift.missing or drift.stale):
+            continue
+        instances = recipe["instances"]
+        # The blank line separating recipes hangs off the last entry's last
+        # key; move it to whichever entry ends up last.
+        trailer = instances[-1].ca.items.pop("arch", None) if instances else None
+        stale = set(drift.stale)
+        for i in reversed(range(len(instances))):
+            if instances[i]["type"] in stale:
+                del instances[i]
+        instances.extend(CommentedMap(entry) for entry in drift.additions())
+        if trailer and instances:
+            instances[-1].ca.items["arch"] = trailer
+    with path.open("w") as f:
+        ryaml.dump(data, f)
+
+
+def print_report(drifts: list[RecipeDrift]) -> None:
+    for d in drifts:
+        if d.skipped:
+            print(f"  {d.name}: skipped ({d.skipped})")
+            continue
+        status = "DRIFT" if d.drifted else "ok"
+        print(f"  {d.name}: {status}")
+        for t in d.missing:
+            print(f"    + {t} (in templates, not in manifest)")
+        for t in d.stale:
+            print(f"    - {t} (in manifest, not in templates)")
+        for err in d.errors:
+            print(f"    ! {err}")
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument(
+        "--manifest",
+        type=Path,
+        default=MANIFEST_PATH,
+        help=f"Manifest to verify or update. Default: {MANIFEST_PATH.relative_to(REPO_ROOT)}",
+    )
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit 1 if the manifest has drifted from the templates.",
+    )
+    mode.add_argument(
+        "--write",
+        action="store_true",
+        help="Update the manifest's instances lists to match the templates.",
+    )
+    p.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="Directory for the per-file index cache. Default: the audit's "
+        "cache directory under $XDG_CACHE_HOME.",
+    )
+    p.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every template, ignoring and not writing the index cache.",
+    )
+    p.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Parser processes. Default: number of CPUs.",
+    )
+    return p.parse_args(list(argv) if argv is not None else None)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    cache_dir = None if args.no_cache else (args.cache_dir or default_cache_dir())
+    index = TemplateIndex(cache_dir=cache_dir, jobs=args.jobs)
+    drifts = compare_manifest(load_manifest_recipes(args.manifest), index)
+
+    print(f"Manifest: {args.manifest}")
+    print_report(drifts)
+    print(index.stats.summary())
+
+    drifted = [d for d in drifts if d.drifted]
+    if args.write and drifted:
+        write_manifest(args.manifest, drifts)
+        print(f"Updated {len(drifted)} recipe(s) in {args.manifest}")
+        return 0
+    if args.check and drifted:
+        print(
+            f"ERROR: {len(drifted)} recipe(s) drifted from their templates. "
+            "Run with --write to update the manifest.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
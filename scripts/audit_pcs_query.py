@@ -0,0 +1,303 @@
+"""Data model and query layer for PCS instance availability audit results.
+
+Every full audit run saves its inputs and findings next to the reports as
+audit-pcs-results.json: the manifest's instance specs, the docs-page
+families per region, and the EC2 AZ-level results. This module loads
+that file without AWS access (and without importing boto3) and answers
+questions such as "which PCS regions can run every instance type of
+recipe X in at least 2 AZs?":
+
+  from scripts.audit_pcs_query import AuditResults, AvailabilityIndex
+
+  index = AvailabilityIndex(AuditResults.load(path))
+  types = index.types(recipe="getting_started", arch="arm64")
+  index.regions_for(types, min_azs=2)
+
+or from the command line:
+
+  python -m scripts.audit_pcs_query --recipe getting_started --min-azs 2
+  python -m scripts.audit_pcs_instance_availability query --recipe try_amd
+
+Availability follows the report's rules. With min_azs >= 1 a type counts
+in a region only if the EC2 API showed it in at least that many AZs. With
+min_azs 0 it counts if the docs page lists its family or the API showed
+it at all. A region that cannot be judged either way (no AZ data, or not
+on the docs page) is reported as unverified, not as missing.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+from .audit_pcs_shards import PartialResult
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_FILENAME = "audit-pcs-results.json"
+DEFAULT_RESULTS_PATH = REPO_ROOT / RESULTS_FILENAME
+
+# region -> (region-available types, {type: AZ names}, total AZs in region)
+AzResults = dict[str, tuple[set[str], dict[str, set[str]], int]]
+
+
+@dataclass(frozen=True)
+class InstanceSpec:
+    """One instance type referenced by a recipe, with context for the report."""
+
+    recipe: str
+    type: str
+    role: str
+    arch: str
+
+
+def family_of(instance_type: str) -> str:
+    """Extract the family token used by the docs page from a full type name.
+
+    Examples:
+      c7g.xlarge      -> c7g
+      hpc7a.48xlarge  -> hpc7a
+      p5en.48xlarge   -> p5en
+      t2.medium       -> t2
+      c7i-flex.xlarge -> c7i-flex
+      mac2-m2.metal   -> mac2-m2
+    """
+    return instance_type.split(".", 1)[0]
+
+
+@dataclass
+class AuditResults:
+    """Everything one audit run learned, independent of how it is reported."""
+
+    specs: list[InstanceSpec]
+    regions: list[str]
+    doc_families: dict[str, set[str]]
+    az_results: AzResults = field(default_factory=dict)
+    inaccessible: list[str] = field(default_factory=list)
+    extra_regions: set[str] = field(default_factory=set)
+    no_az: bool = False
+
+    def to_partial(self, shard: tuple[int, int] = (1, 1)) -> PartialResult:
+        return PartialResult(
+            shard=shard,
+            regions=list(self.regions),
+            extra_regions=sorted(self.extra_regions),
+            specs=[
+                {"recipe": s.recipe, "type": s.type, "role": s.role, "arch": s.arch}
+                for s in self.specs
+            ],
+            doc_families={r: sorted(f) for r, f in sorted(self.doc_families.items())},
+            no_az=self.no_az,
+            az_results={
+                r: {
+                    "available": sorted(avail),
+                    "az_map": {t: sorted(azs) for t, azs in sorted(az_map.items())},
+                    "total_azs": total_azs,
+                }
+                for r, (avail, az_map, total_azs) in sorted(self.az_results.items())
+            },
+            inaccessible=sorted(self.inaccessible),
+        )
+
+    @classmethod
+    def from_partial(cls, partial: PartialResult) -> "AuditResults":
+        return cls(
+            specs=[InstanceSpec(**s) for s in partial.specs],
+            regions=list(partial.regions),
+            doc_families={r: set(f) for r, f in partial.doc_families.items()},
+            az_results={
+                r: (
+                    set(res["available"]),
+                    {t: set(azs) for t, azs in res["az_map"].items()},
+                    res["total_azs"],
+                )
+                for r, res in partial.az_results.items()
+            },
+            inaccessible=list(partial.inaccessible),
+            extra_regions=set(partial.extra_regions),
+            no_az=partial.no_az,
+        )
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.to_partial().to_json(), sort_keys=True) + "\n")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "AuditResults":
+        partial = PartialResult.read(path)
+        if partial.shard != (1, 1):
+            raise ValueError(
+                f"{path} is shard {partial.shard[0]}/{partial.shard[1]}; "
+                "merge the shards first"
+            )
+        return cls.from_partial(partial)
+
+
+class AvailabilityIndex:
+    """Indexes over one AuditResults for fast repeated queries."""
+
+    def __init__(self, results: AuditResults) -> None:
+        self.results = results
+        self.regions = list(results.regions)
+        self._by: dict[str, dict[str, set[str]]] = {
+            "recipe": defaultdict(set),
+            "role": defaultdict(set),
+            "arch": defaultdict(set),
+            "family": defaultdict(set),
+        }
+        for s in results.specs:
+            self._by["recipe"][s.recipe].add(s.type)
+            self._by["role"][s.role].add(s.type)
+            self._by["arch"][s.arch].add(s.type)
+            self._by["family"][family_of(s.type)].add(s.type)
+        self._all_types = {s.type for s in results.specs}
+        # region -> {type: AZ count}, only for regions with AZ data
+        self._az_count = {
+            r: {t: len(azs) for t, azs in az_map.items()}
+            for r, (_, az_map, _) in results.az_results.items()
+        }
+        self._api_available = {r: res[0] for r, res in results.az_results.items()}
+
+    def types(
+        self,
+        recipe: str | None = None,
+        role: str | None = None,
+        arch: str | None = None,
+        family: str | None = None,
+    ) -> list[str]:
+        """Sorted instance types matching every given filter."""
+        out = set(self._all_types)
+        filters = {"recipe": recipe, "role": role, "arch": arch, "family": family}
+        for key, value in filters.items():
+            if value is not None:
+                out &= self._by[key].get(value, set())
+        return sorted(out)
+
+    def az_count(self, instance_type: str, region: str) -> int | None:
+        """AZs offering the type, or None if the region has no AZ data."""
+        counts = self._az_count.get(region)
+        return None if counts is None else counts.get(instance_type, 0)
+
+    def available(
+        self, instance_type: str, region: str, min_azs: int = 1
+    ) -> bool | None:
+        """Whether the type meets min_azs in region; None if unknowable."""
+        count = self.az_count(instance_type, region)
+        docs = self.results.doc_families.get(region)
+        in_docs = None if docs is None else family_of(instance_type) in docs
+        if min_azs <= 0:
+            if count is not None and instance_type in self._api_available[region]:
+                return True
+            return in_docs
+        if count is not None:
+            return count >= min_azs
+        # No AZ data: only a definite "not offered" from the docs is known.
+        return False if in_docs is False else None
+
+    def check(
+        self, types: Iterable[str], region: str, min_azs: int = 1
+    ) -> bool | None:
+        """True if every type meets min_azs; False if any cannot; else None."""
+        verdicts = [self.available(t, region, min_azs) for t in types]
+        if False in verdicts:
+            return False
+        return None if None in verdicts else True
+
+    def regions_for(
+        self,
+        types: Iterable[str],
+        min_azs: int = 1,
+        regions: Iterable[str] | None = None,
+    ) -> tuple[list[str], list[str]]:
+        """Return (regions meeting min_azs for all types, unverified regions)."""
+        types = list(types)
+        ok: list[str] = []
+        unverified: list[str] = []
+        for region in regions if regions is not None else self.regions:
+            verdict = self.check(types, region, min_azs)
+            if verdict:
+                ok.append(region)
+            elif verdict is None:
+                unverified.append(region)
+        return ok, unverified
+
+
+# -----------------------------------------------------------------------------
+# CLI
+# -----------------------------------------------------------------------------
+
+
+def add_query_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument(
+        "--results",
+        default=str(DEFAULT_RESULTS_PATH),
+        help=f"Saved audit results. Default: {RESULTS_FILENAME} in the repo root "
+        "(where the audit writes its reports by default).",
+    )
+    p.add_argument("--recipe", help="Only instance types of this manifest recipe.")
+    p.add_argument("--role", help="Only instance types with this role.")
+    p.add_argument("--arch", help="Only instance types of this arch (x86_64, arm64).")
+    p.add_argument("--family", help="Only instance types of this family (e.g. c7g).")
+    p.add_argument(
+        "--region",
+        action="append",
+        default=[],
+        help="Only consider these regions. May be repeated or comma-separated.",
+    )
+    p.add_argument(
+        "--min-azs",
+        type=int,
+        default=1,
+        help="Minimum AZs each type must be offered in (default: 1). "
+        "0 means region-level availability, docs page included.",
+    )
+    p.add_argument("--json", action="store_true", help="Print the answer as JSON.")
+
+
+def run_query(args: argparse.Namespace) -> int:
+    """Answer one query; exit 0 if at least one region qualifies, else 1."""
+    try:
+        index = AvailabilityIndex(AuditResults.load(Path(args.results)))
+    except (OSError, ValueError) as e:
+        print(f"cannot load results: {e}", file=sys.stderr)
+        return 2
+    types = index.types(args.recipe, args.role, args.arch, args.family)
+    if not types:
+        print("No instance types match the filters.", file=sys.stderr)
+        return 2
+    regions = [r.strip() for arg in args.region for r in arg.split(",") if r.strip()]
+    ok, unverified = index.regions_for(
+        types, min_azs=args.min_azs, regions=regions or None
+    )
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "types": types,
+                    "min_azs": args.min_azs,
+                    "regions": ok,
+                    "unverified": unverified,
+                }
+            )
+        )
+    else:
+        print(f"Instance types ({len(types)}): {', '.join(types)}")
+        need = f"{args.min_azs}+ AZs" if args.min_azs > 0 else "region-level"
+        print(f"Regions available ({need}) ({len(ok)}): {', '.join(ok)}")
+        if unverified:
+            print(f"Unverified (no data) ({len(unverified)}): {', '.join(unverified)}")
+    return 0 if ok else 1
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__)
+    add_query_arguments(p)
+    return run_query(p.parse_args(list(argv) if argv is not None else None))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Long-running audit service for the PCS instance availability audit.
+
+`python -m scripts.audit_pcs_instance_availability serve` audits once,
+keeps the results in memory and then refreshes them one task at a time:
+the docs page (and region list), then each region's AZ detail in turn.
+Every task comes round once per --refresh-interval, and the tasks are
+spread evenly over the interval, so the account sees a steady trickle of
+Describe calls instead of one burst per consumer per run.
+
+After every refresh the JSON answers are rebuilt and published to a small
+local HTTP server. Each one is serialized once, with an ETag, so a request
+is a dictionary lookup and a write; clients that send If-None-Match get
+304 Not Modified until something changes.
+
+This module holds the generic parts (the service loop, the published
+payloads and the HTTP handler). What a refresh does and what the answers
+contain are supplied by the audit module.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from .audit_pcs_query import AuditResults
+
+# Task name for the docs-page (and region list) refresh; every other task
+# is a region code.
+DOCS_TASK = "docs"
+
+
+@dataclass(frozen=True)
+class Payload:
+    body: bytes
+    etag: str
+
+
+def make_payload(obj: object) -> Payload:
+    body = (json.dumps(obj, sort_keys=True, separators=(",", ":")) + "\n").encode()
+    return Payload(body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+
+class PayloadStore:
+    """The current JSON answer per path, swapped in whole on publish."""
+
+    def __init__(self) -> None:
+        self._payloads: dict[str, Payload] = {}
+
+    def publish(self, answers: dict[str, object]) -> None:
+        payloads = dict(self._payloads)
+        payloads.update((path, make_payload(obj)) for path, obj in answers.items())
+        self._payloads = payloads  # one reference swap; readers never lock
+
+    def get(self, path: str) -> Payload | None:
+        return self._payloads.get(path)
+
+    def paths(self) -> list[str]:
+        return sorted(self._payloads)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "pcs-audit"
+    store: PayloadStore  # set per server by make_server
+
+    def do_GET(self) -> None:
+        payload = self.store.get(self.path.split("?", 1)[0].rstrip("/") or "/")
+        if payload is None:
+            body = make_payload({"error": "not found", "paths": self.store.paths()})
+            self._send(404, body.body)
+            return
+        if payload.etag in _etags(self.headers.get("If-None-Match", "")):
+            self._send(304, b"", payload.etag)
+            return
+        self._send(200, payload.body, payload.etag)
+
+    def _send(self, code: int, body: bytes, etag: str | None = None) -> None:
+        self.send_response(code)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if code != 304:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if code != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass  # one line per request would drown the refresh log
+
+
+def _etags(header: str) -> set[str]:
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag}
+
+
+def make_server(store: PayloadStore, host: str, port: int) -> ThreadingHTTPServer:
+    handler = type("Handler", (_Handler,), {"store": store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class AuditService:
+    """The latest audit results, refreshed task by task.
+
+    refresh(results, task) returns new results with that task's part
+    redone; tasks(results) lists the tasks of one cycle; answers(results,
+    previous, task) builds the JSON answers to publish, by path.
+    """
+
+    def __init__(
+        self,
+        results: AuditResults,
+        refresh: Callable[[AuditResults, str], AuditResults],
+        tasks: Callable[[AuditResults], list[str]],
+        answers: Callable[
+            [AuditResults, AuditResults | None, str | None], dict[str, object]
+        ],
+        interval: float,
+        store: PayloadStore | None = None,
+        clock: Callable[[], float] = time.time,
+        history: int = 500,
+    ) -> None:
+        self.results = results
+        self.store = store or PayloadStore()
+        self.interval = interval
+        self._refresh = refresh
+        self._tasks = tasks
+        self._answers = answers
+        self._clock = clock
+        self.started = clock()
+        self.refreshes = 0
+        self.task_status: dict[str, dict] = {}
+        self.changes: deque[dict] = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._publish(None, None)
+
+    def refresh_task(self, task: str) -> None:
+        """Redo one task and publish the new answers; errors keep the old ones."""
+        t0 = self._clock()
+        try:
+            results = self._refresh(self.results, task)
+        except Exception as e:
+            print(f"  refresh {task} failed: {e}", file=sys.stderr)
+            with self._lock:
+                self.task_status[task] = {"at": t0, "error": str(e)}
+                self.store.publish({"/status": self._status(task)})
+            return
+        with self._lock:
+            previous, self.results = self.results, results
+            self.refreshes += 1
+            self.task_status[task] = {"at": t0, "seconds": self._clock() - t0}
+            self._publish(previous, task)
+
+    def _status(self, task: str | None) -> dict:
+        return {
+            "started": self.started,
+            "interval": self.interval,
+            "refreshes": self.refreshes,
+            "last_task": task,
+            "tasks": dict(self.task_status),
+        }
+
+    def _publish(self, previous: AuditResults | None, task: str | None) -> None:
+        answers = self._answers(self.results, previous, task)
+        now = self._clock()
+        for change in answers.get("/diff", {}).get("changes", []):
+            self.changes.append({"at": now, "task": task, **change})
+        answers["/changes"] = {"changes": list(self.changes)}
+        answers["/status"] = self._status(task)
+        self.store.publish(answers)
+
+    def run(self, stop: threading.Event) -> None:
+        """Refresh every task once per interval, evenly staggered, until stop."""
+        start = self._clock()
+        while not stop.is_set():
+            tasks = self._tasks(self.results)
+            slot = self.interval / max(len(tasks), 1)
+            for i, task in enumerate(tasks):
+                if stop.wait(max(0.0, start + (i + 1) * slot - self._clock())):
+                    return
+                self.refresh_task(task)
+            start += self.interval
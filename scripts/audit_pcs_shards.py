@@ -0,0 +1,138 @@
+"""Sharded runs of the PCS instance availability audit.
+
+CI can split the audit across parallel jobs: each job runs with
+--shard i/N, does the AZ-detail phase for a deterministic subset of the
+regions, and writes a partial result instead of the reports. The `merge`
+subcommand combines the N partial results into the usual markdown and CSV
+without making any API calls; the output is byte-for-byte what a single
+process auditing every region would have written.
+
+Every shard still resolves the full region list, loads the manifest and
+reads the docs page (cheap, and cached), and records all three in its
+partial result. merge refuses to combine partials that disagree on any of
+them, since the merged report would then describe no real run.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+PARTIAL_FORMAT_VERSION = 1
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parse "i/N" (1-based, as CI job indexes are) into (i, N)."""
+    try:
+        i_text, n_text = spec.split("/", 1)
+        i, n = int(i_text), int(n_text)
+    except ValueError:
+        raise ValueError(f"invalid shard {spec!r}: expected i/N, e.g. 1/4") from None
+    if n < 1 or not 1 <= i <= n:
+        raise ValueError(f"invalid shard {spec!r}: need 1 <= i <= N")
+    return i, n
+
+
+def shard_regions(regions: Iterable[str], index: int, count: int) -> list[str]:
+    """Regions assigned to shard index of count.
+
+    Round-robin over the sorted region list, so every shard gets a similar
+    mix of large and small regions and the split depends only on the list.
+    """
+    return sorted(regions)[index - 1 :: count]
+
+
+def partial_filename(index: int, count: int) -> str:
+    return f"audit-pcs-partial-{index}-of-{count}.json"
+
+
+@dataclass
+class PartialResult:
+    """What one shard learned, plus the inputs every shard must share."""
+
+    shard: tuple[int, int]
+    regions: list[str]
+    extra_regions: list[str]
+    specs: list[dict]
+    doc_families: dict[str, list[str]]
+    no_az: bool
+    # region -> {"available": [...], "az_map": {type: [...]}, "total_azs": n}
+    az_results: dict[str, dict] = field(default_factory=dict)
+    inaccessible: list[str] = field(default_factory=list)
+
+    def to_json(self) -> dict:
+        return {
+            "version": PARTIAL_FORMAT_VERSION,
+            "shard": list(self.shard),
+            "regions": self.regions,
+            "extra_regions": self.extra_regions,
+            "specs": self.specs,
+            "doc_families": self.doc_families,
+            "no_az": self.no_az,
+            "az_results": self.az_results,
+            "inaccessible": self.inaccessible,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "PartialResult":
+        if data.get("version") != PARTIAL_FORMAT_VERSION:
+            raise ValueError(f"unsupported partial result version {data.get('version')}")
+        return cls(
+            shard=(data["shard"][0], data["shard"][1]),
+            regions=data["regions"],
+            extra_regions=data["extra_regions"],
+            specs=data["specs"],
+            doc_families=data["doc_families"],
+            no_az=data["no_az"],
+            az_results=data["az_results"],
+            inaccessible=data["inaccessible"],
+        )
+
+    def write(self, directory: Path) -> Path:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / partial_filename(*self.shard)
+        path.write_text(json.dumps(self.to_json(), sort_keys=True, indent=1) + "\n")
+        return path
+
+    @classmethod
+    def read(cls, path: Path) -> "PartialResult":
+        return cls.from_json(json.loads(path.read_text()))
+
+
+def merge_partials(partials: list[PartialResult]) -> PartialResult:
+    """Combine one partial result per shard into a whole-run result.
+
+    Raises ValueError if shards are missing or duplicated, or if the
+    partials disagree on the regions, manifest, docs data or --no-az.
+    """
+    if not partials:
+        raise ValueError("no partial results to merge")
+    first = partials[0]
+    count = first.shard[1]
+    seen = sorted(p.shard[0] for p in partials)
+    if any(p.shard[1] != count for p in partials) or seen != list(range(1, count + 1)):
+        raise ValueError(
+            f"expected shards 1..{count} exactly once, got "
+            + ", ".join(f"{p.shard[0]}/{p.shard[1]}" for p in partials)
+        )
+    for p in partials[1:]:
+        for name in ("regions", "extra_regions", "specs", "doc_families", "no_az"):
+            if getattr(p, name) != getattr(first, name):
+                raise ValueError(
+                    f"shard {p.shard[0]}/{count} disagrees with shard "
+                    f"{first.shard[0]}/{count} on {name}; were they run "
+                    "against the same manifest, regions and docs page?"
+                )
+    merged = PartialResult(
+        shard=(1, 1),
+        regions=first.regions,
+        extra_regions=first.extra_regions,
+        specs=first.specs,
+        doc_families=first.doc_families,
+        no_az=first.no_az,
+    )
+    for p in partials:
+        merged.az_results.update(p.az_results)
+        merged.inaccessible.extend(p.inaccessible)
+    return merged
@@ -0,0 +1,259 @@
+"""Append-only snapshot history for the PCS instance availability audit.
+
+Each audit run can be stored as one compressed, columnar snapshot of the
+type x region availability matrix: the type and region axes, per-region
+total AZ counts, and three flat per-cell columns (cell kind, AZ count, and
+the time the cell took its current value). Snapshots are written once and
+never modified; the newest file is the "latest" snapshot.
+
+Comparing two snapshots aligns their axes and finds the changed cells by
+comparing the packed columns block by block (memcmp speed), so only blocks
+that contain a change are visited cell by cell in Python. The "since"
+column is carried forward for unchanged cells, which is how a diff reports
+how long a cell has held its value without replaying the history.
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import sys
+import time
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+
+SNAPSHOT_SUFFIX = ".snap.json.gz"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Cells per block when scanning two columns for differences.
+DIFF_BLOCK_CELLS = 4096
+
+
+def _pack(arr: array) -> str:
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return base64.b64encode(arr.tobytes()).decode("ascii")
+
+
+def _unpack(typecode: str, data: str) -> array:
+    arr = array(typecode)
+    arr.frombytes(base64.b64decode(data))
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+@dataclass
+class Snapshot:
+    """One audit run's matrix, row-major over (types x regions)."""
+
+    run_id: str
+    created: float
+    types: list[str]
+    archs: list[str]
+    regions: list[str]
+    total_azs: array  # "H", one per region
+    kind: array  # "B", one per cell
+    az_count: array  # "H", one per cell
+    since: array  # "I", one per cell: epoch seconds the value was first seen
+
+    def index(self, row: int, col: int) -> int:
+        return row * len(self.regions) + col
+
+    def to_json(self) -> dict:
+        return {
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "run_id": self.run_id,
+            "created": self.created,
+            "types": self.types,
+            "archs": self.archs,
+            "regions": self.regions,
+            "total_azs": _pack(self.total_azs),
+            "kind": _pack(self.kind),
+            "az_count": _pack(self.az_count),
+            "since": _pack(self.since),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Snapshot":
+        if data.get("version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"unsupported snapshot version {data.get('version')}")
+        return cls(
+            run_id=data["run_id"],
+            created=data["created"],
+            types=data["types"],
+            archs=data["archs"],
+            regions=data["regions"],
+            total_azs=_unpack("H", data["total_azs"]),
+            kind=_unpack("B", data["kind"]),
+            az_count=_unpack("H", data["az_count"]),
+            since=_unpack("I", data["since"]),
+        )
+
+    def reindexed(self, types: list[str], regions: list[str]) -> "Snapshot":
+        """Return this snapshot laid out on the given axes.
+
+        Cells for types or regions this snapshot does not have are zero;
+        changed_cells and carry_since skip them.
+        """
+        if types == self.types and regions == self.regions:
+            return self
+        row_of = {t: i for i, t in enumerate(self.types)}
+        col_of = {r: i for i, r in enumerate(self.regions)}
+        n = len(types) * len(regions)
+        kind = array("B", bytes(n))
+        az_count = array("H", bytes(2 * n))
+        since = array("I", bytes(4 * n))
+        total_azs = array(
+            "H", (self.total_azs[col_of[r]] if r in col_of else 0 for r in regions)
+        )
+        for new_row, t in enumerate(types):
+            old_row = row_of.get(t)
+            if old_row is None:
+                continue
+            for new_col, r in enumerate(regions):
+                old_col = col_of.get(r)
+                if old_col is None:
+                    continue
+                i = new_row * len(regions) + new_col
+                j = self.index(old_row, old_col)
+                kind[i] = self.kind[j]
+                az_count[i] = self.az_count[j]
+                since[i] = self.since[j]
+        arch_of = dict(zip(self.types, self.archs))
+        return Snapshot(
+            run_id=self.run_id,
+            created=self.created,
+            types=list(types),
+            archs=[arch_of.get(t, "") for t in types],
+            regions=list(regions),
+            total_azs=total_azs,
+            kind=kind,
+            az_count=az_count,
+            since=since,
+        )
+
+
+def _changed_indices(a: array, b: array) -> set[int]:
+    """Return cell indices where two same-typed, same-length columns differ."""
+    raw_a, raw_b = a.tobytes(), b.tobytes()
+    if raw_a == raw_b:
+        return set()
+    step = DIFF_BLOCK_CELLS * a.itemsize
+    out: set[int] = set()
+    for start in range(0, len(raw_a), step):
+        if raw_a[start : start + step] == raw_b[start : start + step]:
+            continue
+        first = start // a.itemsize
+        for i in range(first, min(len(a), first + DIFF_BLOCK_CELLS)):
+            if a[i] != b[i]:
+                out.add(i)
+    return out
+
+
+def changed_cells(old: Snapshot, new: Snapshot) -> list[int]:
+    """Return sorted indices (in new's layout) of cells present in both
+    snapshots whose kind or AZ count differs.
+
+    Types or regions only one side has are not reported as changed cells.
+    """
+    aligned = old.reindexed(new.types, new.regions)
+    common_rows = set(old.types)
+    common_cols = set(old.regions)
+    ncols = len(new.regions)
+    idx = _changed_indices(aligned.kind, new.kind) | _changed_indices(
+        aligned.az_count, new.az_count
+    )
+    return sorted(
+        i
+        for i in idx
+        if new.types[i // ncols] in common_rows and new.regions[i % ncols] in common_cols
+    )
+
+
+def carry_since(old: Snapshot | None, new: Snapshot) -> None:
+    """Fill new.since: unchanged cells keep old's timestamp, others get now."""
+    now = int(new.created)
+    new.since = array("I", [now]) * len(new.kind)
+    if old is None:
+        return
+    aligned = old.reindexed(new.types, new.regions)
+    changed = set(changed_cells(old, new))
+    old_rows = set(old.types)
+    old_cols = set(old.regions)
+    ncols = len(new.regions)
+    for row, t in enumerate(new.types):
+        if t not in old_rows:
+            continue
+        for col, r in enumerate(new.regions):
+            if r not in old_cols:
+                continue
+            i = row * ncols + col
+            if i not in changed:
+                new.since[i] = aligned.since[i]
+
+
+def _run_order(path: Path) -> tuple[str, int]:
+    """Sort key for snapshot files: run_id, then append's collision suffix.
+
+    RUNID.snap.json.gz is the first snapshot of a run id and RUNID.N the
+    Nth, so RUNID.2 follows RUNID and RUNID.10 follows RUNID.9.
+    """
+    run_id = path.name[: -len(SNAPSHOT_SUFFIX)]
+    base, _, n = run_id.partition(".")
+    return (base, int(n) if n.isdigit() else 1)
+
+
+class SnapshotStore:
+    """A directory of immutable snapshot files, newest last by run_id."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def paths(self) -> list[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob(f"*{SNAPSHOT_SUFFIX}"), key=_run_order)
+
+    def latest(self) -> Snapshot | None:
+        paths = self.paths()
+        return self.load(paths[-1]) if paths else None
+
+    def resolve(self, ref: str) -> Snapshot:
+        """Load a snapshot by "latest", run_id, or file path."""
+        if ref == "latest":
+            snap = self.latest()
+            if snap is None:
+                raise FileNotFoundError(f"no snapshots in {self.directory}")
+            return snap
+        as_path = Path(ref).expanduser()
+        if as_path.is_file():
+            return self.load(as_path)
+        candidate = self.directory / f"{ref}{SNAPSHOT_SUFFIX}"
+        if candidate.is_file():
+            return self.load(candidate)
+        raise FileNotFoundError(f"snapshot {ref!r} not found in {self.directory}")
+
+    @staticmethod
+    def load(path: Path) -> Snapshot:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return Snapshot.from_json(json.load(f))
+
+    def append(self, snap: Snapshot) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{snap.run_id}{SNAPSHOT_SUFFIX}"
+        n = 1
+        while path.exists():
+            n += 1
+            snap.run_id = f"{snap.run_id.split('.', 1)[0]}.{n}"
+            path = self.directory / f"{snap.run_id}{SNAPSHOT_SUFFIX}"
+        # "x" mode: never overwrite an existing snapshot.
+        with gzip.open(path, "xt", encoding="utf-8") as f:
+            json.dump(snap.to_json(), f, separators=(",", ":"))
+        return path
+
+
+def new_run_id(created: float | None = None) -> str:
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(created or time.time()))
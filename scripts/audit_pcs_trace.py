@@ -0,0 +1,285 @@
+"""Per-call tracing for the PCS instance availability audit (--trace).
+
+Tracer records three kinds of timed events:
+
+  - phases: the audit's top-level steps (region discovery, docs, AZ detail,
+    reports), timed by main();
+  - spans: units of work inside a phase, such as one planned offerings
+    query or the docs-page parse, with counters (calls, bytes) attached;
+  - API calls: one per botocore operation call, recorded by hooks on the
+    client's event system. Each carries its region, latency, attempts
+    (retries + 1), throttled attempts, response bytes and error code.
+
+API calls made inside a span are also counted on that span, so an
+offerings query's call count is its pagination depth.
+
+The trace is written as plain JSON (phases, spans and calls as lists, plus
+the summary) or in the Chrome trace-event format, which chrome://tracing
+and Perfetto load directly. summary() gives a short text table of the
+phases and the slowest regions and operations.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .audit_pcs_concurrency import THROTTLE_CODES
+
+TRACE_FORMATS = ("json", "chrome")
+
+
+class Tracer:
+    """Thread-safe collector of phase, span and API-call timings."""
+
+    def __init__(self, clock=time.perf_counter) -> None:
+        self._clock = clock
+        self._t0 = clock()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.phases: list[dict] = []
+        self.spans: list[dict] = []
+        self.calls: list[dict] = []
+        self._thread_ids: dict[int, int] = {}
+
+    def _now(self) -> float:
+        return self._clock() - self._t0
+
+    def _tid(self) -> int:
+        ident = threading.get_ident()
+        with self._lock:
+            return self._thread_ids.setdefault(ident, len(self._thread_ids) + 1)
+
+    def _stack(self) -> list[dict]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    # -- phases and spans ----------------------------------------------------
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[dict]:
+        with self._timed(name, "phase", {}, self.phases) as args:
+            yield args
+
+    @contextmanager
+    def span(self, name: str, cat: str = "task", **args) -> Iterator[dict]:
+        """Time a unit of work; the yielded dict collects its counters."""
+        with self._timed(name, cat, dict(args), self.spans) as out:
+            yield out
+
+    @contextmanager
+    def _timed(self, name: str, cat: str, args: dict, into: list) -> Iterator[dict]:
+        event = {"name": name, "cat": cat, "start": self._now(), "tid": self._tid()}
+        event["args"] = args
+        stack = self._stack()
+        stack.append(event)
+        try:
+            yield args
+        finally:
+            stack.pop()
+            event["dur"] = self._now() - event["start"]
+            with self._lock:
+                into.append(event)
+
+    def count(self, chunks: Iterable, args: dict, key: str = "bytes") -> Iterator:
+        """Pass chunks through, adding their total length to args[key]."""
+        args.setdefault(key, 0)
+        for chunk in chunks:
+            args[key] += len(chunk)
+            yield chunk
+
+    # -- botocore hooks -------------------------------------------------------
+
+    def install(self, client, region: str) -> None:
+        """Record every API call made through client."""
+        service = client.meta.service_model.service_id.hyphenize()
+        events = client.meta.events
+        events.register(f"before-call.{service}", self._before_call)
+        events.register(f"response-received.{service}", self._response_received)
+        events.register(f"after-call.{service}", self._make_after_call(region))
+        events.register(f"after-call-error.{service}", self._make_after_error(region))
+
+    def _before_call(self, model, context, **kwargs) -> None:
+        context["trace"] = {
+            "operation": model.name,
+            "start": self._now(),
+            "attempts": 0,
+            "throttles": 0,
+            "bytes": 0,
+        }
+
+    def _response_received(
+        self, context, response_dict=None, parsed_response=None, **kwargs
+    ) -> None:
+        call = context.get("trace")
+        if call is None:
+            return
+        call["attempts"] += 1
+        if response_dict and response_dict.get("body") is not None:
+            call["bytes"] += len(response_dict["body"])
+        code = (parsed_response or {}).get("Error", {}).get("Code")
+        if code in THROTTLE_CODES:
+            call["throttles"] += 1
+
+    def _make_after_call(self, region: str):
+        def _after_call(context, parsed=None, **kwargs) -> None:
+            error = (parsed or {}).get("Error", {}).get("Code", "")
+            self._finish_call(region, context, error)
+
+        return _after_call
+
+    def _make_after_error(self, region: str):
+        def _after_error(context, exception=None, **kwargs) -> None:
+            self._finish_call(region, context, type(exception).__name__)
+
+        return _after_error
+
+    def _finish_call(self, region: str, context: dict, error: str) -> None:
+        call = context.pop("trace", None)
+        if call is None:
+            return
+        call["dur"] = self._now() - call["start"]
+        call["region"] = region
+        call["error"] = error
+        call["tid"] = self._tid()
+        stack = self._stack()
+        if stack:
+            parent = stack[-1]["args"]
+            parent["calls"] = parent.get("calls", 0) + 1
+            retries = max(call["attempts"] - 1, 0)
+            parent["retries"] = parent.get("retries", 0) + retries
+            parent["bytes"] = parent.get("bytes", 0) + call["bytes"]
+        with self._lock:
+            self.calls.append(call)
+
+    # -- reporting -----------------------------------------------------------
+
+    def _region_rows(self) -> list[dict]:
+        by_region: dict[str, list[dict]] = defaultdict(list)
+        for c in self.calls:
+            by_region[c["region"]].append(c)
+        rows = []
+        for region, calls in by_region.items():
+            rows.append(
+                {
+                    "region": region,
+                    "calls": len(calls),
+                    "retries": sum(max(c["attempts"] - 1, 0) for c in calls),
+                    "throttles": sum(c["throttles"] for c in calls),
+                    "bytes": sum(c["bytes"] for c in calls),
+                    "wall": max(c["start"] + c["dur"] for c in calls)
+                    - min(c["start"] for c in calls),
+                    "slowest": max(c["dur"] for c in calls),
+                }
+            )
+        return sorted(rows, key=lambda r: r["wall"], reverse=True)
+
+    def _operation_rows(self) -> list[dict]:
+        by_op: dict[str, list[dict]] = defaultdict(list)
+        for c in self.calls:
+            by_op[c["operation"]].append(c)
+        rows = []
+        for op, calls in by_op.items():
+            total = sum(c["dur"] for c in calls)
+            rows.append(
+                {
+                    "operation": op,
+                    "calls": len(calls),
+                    "total": total,
+                    "mean": total / len(calls),
+                    "slowest": max(c["dur"] for c in calls),
+                    "retries": sum(max(c["attempts"] - 1, 0) for c in calls),
+                    "throttles": sum(c["throttles"] for c in calls),
+                    "errors": sum(1 for c in calls if c["error"]),
+                }
+            )
+        return sorted(rows, key=lambda r: r["total"], reverse=True)
+
+    def summary(self, top: int = 5) -> str:
+        lines = ["Trace summary:"]
+        for p in self.phases:
+            lines.append(f"  phase {p['name']:<18} {p['dur']:8.2f}s")
+        regions = self._region_rows()
+        if regions:
+            lines.append(
+                f"  {'slowest regions':<20} {'wall s':>8} {'calls':>6} "
+                f"{'retries':>7} {'thrtl':>5} {'KiB':>8} {'max call s':>10}"
+            )
+            for r in regions[:top]:
+                lines.append(
+                    f"  {r['region']:<20} {r['wall']:8.2f} {r['calls']:6d} "
+                    f"{r['retries']:7d} {r['throttles']:5d} {r['bytes'] / 1024:8.1f} "
+                    f"{r['slowest']:10.2f}"
+                )
+        ops = self._operation_rows()
+        if ops:
+            lines.append(
+                f"  {'slowest operations':<36} {'total s':>8} {'calls':>6} "
+                f"{'mean s':>7} {'max s':>6} {'retries':>7} {'thrtl':>5}"
+            )
+            for o in ops[:top]:
+                lines.append(
+                    f"  {o['operation']:<36} {o['total']:8.2f} {o['calls']:6d} "
+                    f"{o['mean']:7.3f} {o['slowest']:6.2f} {o['retries']:7d} "
+                    f"{o['throttles']:5d}"
+                )
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        return {
+            "phases": self.phases,
+            "spans": self.spans,
+            "calls": self.calls,
+            "regions": self._region_rows(),
+            "operations": self._operation_rows(),
+        }
+
+    def to_chrome(self) -> dict:
+        """Chrome trace-event format: complete ("X") events in microseconds."""
+        pid = os.getpid()
+        events = []
+
+        def add(name: str, cat: str, start: float, dur: float, tid: int, args: dict):
+            events.append(
+                {
+                    "name": name,
+                    "cat": cat,
+                    "ph": "X",
+                    "ts": round(start * 1e6),
+                    "dur": round(dur * 1e6),
+                    "pid": pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+
+        for p in self.phases:
+            add(p["name"], "phase", p["start"], p["dur"], 0, p["args"])
+        for s in self.spans:
+            add(s["name"], s["cat"], s["start"], s["dur"], s["tid"], s["args"])
+        for c in self.calls:
+            name = f"{c['operation']} {c['region']}"
+            keys = ("region", "attempts", "throttles", "bytes", "error")
+            args = {k: c[k] for k in keys}
+            add(name, "api", c["start"], c["dur"], c["tid"], args)
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": 0,
+                "args": {"name": "phases"},
+            }
+        )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: Path, fmt: str = "json") -> None:
+        data = self.to_chrome() if fmt == "chrome" else self.to_json()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, indent=1) + "\n")
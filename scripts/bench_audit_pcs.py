@@ -0,0 +1,710 @@
+"""Offline benchmarks for scripts/audit_pcs_instance_availability.py.
+
+Everything here runs without network access or AWS credentials, against
+synthetic inputs sized well beyond today's real ones, so a slowdown shows
+up here before it reaches the nightly audit.
+
+Usage:
+  python -m scripts.bench_audit_pcs docs-parser
+  python -m scripts.bench_audit_pcs docs-parser --scales 1,10,50,200
+  python -m scripts.bench_audit_pcs catalog --types 1000 --regions 30
+  python -m scripts.bench_audit_pcs pipeline --regions 30,60,100
+  python -m scripts.bench_audit_pcs pipeline --latency-ms 50 --throttle-rate 0.1
+  python -m scripts.bench_audit_pcs clients --regions 40
+  python -m scripts.bench_audit_pcs startup
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fnmatch
+import io
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Iterable, Iterator
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from . import audit_pcs_instance_availability as audit
+from .audit_pcs_clients import ClientPool
+from .audit_pcs_catalog import (
+    CatalogBuilder,
+    write_catalog_csv,
+    write_catalog_markdown,
+)
+
+CATEGORIES = [
+    "General Purpose",
+    "Compute Optimized",
+    "Memory Optimized",
+    "Storage Optimized",
+    "Accelerated Computing",
+    "High Performance Computing",
+    "Previous Generation",
+]
+
+# Roughly the size of one region's section on the live docs page.
+FAMILIES_PER_CATEGORY = 24
+
+INSTANCE_SIZES = "large xlarge 2xlarge 4xlarge 8xlarge 12xlarge 24xlarge 48xlarge".split()
+
+
+def synthetic_region_codes(n: int) -> list[str]:
+    """Return n distinct, well-formed region codes (e.g. "xx-east-12")."""
+    geos = ["us", "eu", "ap", "sa", "ca", "me", "af", "il", "mx", "us-gov"]
+    dirs = ["east", "west", "north", "south", "central", "southeast", "northeast"]
+    out = []
+    i = 0
+    while len(out) < n:
+        geo = geos[i % len(geos)]
+        d = dirs[(i // len(geos)) % len(dirs)]
+        num = 1 + i // (len(geos) * len(dirs))
+        out.append(f"{geo}-{d}-{num}")
+        i += 1
+    return out
+
+
+def synthetic_docs_page(
+    n_regions: int,
+    families_per_category: int = FAMILIES_PER_CATEGORY,
+    families: Iterable[str] = (),
+) -> str:
+    """Build an HTML page shaped like ec2-instance-regions.html.
+
+    families (e.g. the manifest's) are listed under General Purpose in
+    every region, ahead of the filler families.
+    """
+    real = [f"<code>{f[:1].upper()}{f[1:]}</code>" for f in sorted(set(families))]
+    parts = [
+        "<!DOCTYPE html><html><head><title>Amazon EC2 instance types by Region</title>",
+        "<style>body { font-family: sans-serif; } .x > .y { color: red; }</style>",
+        "<script>var s = '<p>General Purpose: Fake | Nope</p>'; if (a < b) {}</script>",
+        "</head><body><div id='main'><h1>Instance types by Region</h1>",
+    ]
+    for i, code in enumerate(synthetic_region_codes(n_regions)):
+        parts.append(f"<h2 id='{code}'>Synthetic Region {i} &mdash; {code}</h2>")
+        parts.append("<p>The following instance types are offered in this Region.</p>")
+        for c, category in enumerate(CATEGORIES):
+            fams = " | ".join(
+                (real if c == 0 else [])
+                + [
+                    f"<code>F{c}x{j}{'-flex' if j % 5 == 0 else ''}</code>"
+                    for j in range(families_per_category)
+                ]
+            )
+            parts.append(f"<p>{category}: {fams}</p>")
+    parts.append("</div></body></html>")
+    return "\n".join(parts)
+
+
+def long_line_docs_page(n_tokens: int) -> str:
+    """A page whose family line is one very long hyphenated run.
+
+    Regex-based heading detection that is not anchored to the end of the
+    line backtracks quadratically on input like this.
+    """
+    return (
+        "<h2>Europe (Ireland) &mdash; eu-west-1</h2>"
+        f"<p>General Purpose: {'-'.join(['ab'] * n_tokens)} M7g</p>"
+    )
+
+
+def _timed(fn, *args, **kwargs):
+    """Return (result, seconds, tracemalloc peak bytes).
+
+    Time and memory are measured in separate runs; tracemalloc slows
+    allocation-heavy code several-fold.
+    """
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_docs_parser(scales: Iterable[int], base_regions: int = 40) -> list[dict]:
+    """Stream synthetic docs pages of growing size from disk and parse them.
+
+    Reports wall time, throughput and tracemalloc peak. The peak should stay
+    flat as the page grows (streaming), and MB/s should stay roughly
+    constant (linear time), including for the long-line pages.
+    """
+    cases = [
+        (f"x{scale}", synthetic_docs_page(base_regions * scale)) for scale in scales
+    ]
+    cases += [
+        (f"line-{n}", long_line_docs_page(n * 1000)) for n in sorted(set(scales))[-2:]
+    ]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, page in cases:
+            path = Path(tmp) / f"docs-{name}.html"
+            path.write_text(page)
+            size_mb = path.stat().st_size / 1e6
+
+            def consume() -> int:
+                n = 0
+                for _ in audit.iter_doc_families(audit._iter_file(path)):
+                    n += 1
+                return n
+
+            pairs, elapsed, peak = _timed(consume)
+            rows.append(
+                {
+                    "case": name,
+                    "size_mb": size_mb,
+                    "pairs": pairs,
+                    "seconds": elapsed,
+                    "mb_per_s": size_mb / elapsed if elapsed else float("inf"),
+                    "peak_kb": peak / 1024,
+                }
+            )
+    return rows
+
+
+def synthetic_catalog_builder(
+    n_types: int, n_regions: int, azs_per_region: int = 4
+) -> CatalogBuilder:
+    """Builder for a catalog shaped like the real one.
+
+    Types come in families of 8 sizes; each type is offered in roughly
+    two thirds of the regions and, there, in most of their AZs.
+    """
+    builder = CatalogBuilder()
+    sizes = INSTANCE_SIZES
+    types = [f"f{i // len(sizes)}.{sizes[i % len(sizes)]}" for i in range(n_types)]
+    for r, region in enumerate(synthetic_region_codes(n_regions)):
+        zones = [f"{region}{chr(ord('a') + z)}" for z in range(azs_per_region)]
+        offerings = [
+            (itype, zones[z])
+            for t, itype in enumerate(types)
+            if (t + r) % 3
+            for z in range(azs_per_region)
+            if (t * 7 + r + z) % 5
+        ]
+        builder.add_region(region, zones, offerings)
+    return builder
+
+
+def bench_catalog(n_types: int, n_regions: int, azs_per_region: int) -> list[dict]:
+    """Time building the full catalog and writing its reports.
+
+    Reports should take well under a second and the catalog should stay in
+    the low megabytes at real-world scale.
+    """
+    builder = synthetic_catalog_builder(n_types, n_regions, azs_per_region)
+    regions = synthetic_region_codes(n_regions)
+    catalog, build_s, build_peak = _timed(builder.build, regions)
+    rows = [{"step": "build", "seconds": build_s, "peak_kb": build_peak / 1024}]
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp)
+
+        def reports() -> None:
+            write_catalog_markdown(out / "catalog.md", catalog)
+            write_catalog_csv(out / "catalog.csv", catalog)
+
+        _, report_s, report_peak = _timed(reports)
+    rows.append({"step": "reports", "seconds": report_s, "peak_kb": report_peak / 1024})
+
+    def queries() -> int:
+        n = 0
+        for family in catalog.families:
+            n += len(catalog.family_regions(family, min_azs=2))
+        for az in catalog.azs:
+            n += len(catalog.types_in_az(az))
+        return n
+
+    _, query_s, query_peak = _timed(queries)
+    rows.append({"step": "queries", "seconds": query_s, "peak_kb": query_peak / 1024})
+    print(
+        f"{len(catalog.types)} types x {len(catalog.regions)} regions x "
+        f"{len(catalog.azs)} AZs; bitsets {catalog.nbytes() / 1024:.0f} KiB"
+    )
+    return rows
+
+
+# -----------------------------------------------------------------------------
+# Full pipeline against simulated AWS
+# -----------------------------------------------------------------------------
+
+@dataclass
+class FakeAwsProfile:
+    """How the simulated EC2 and SSM endpoints behave.
+
+    Every call sleeps for its region's latency (latency_ms, times
+    slow_factor for every slow_every-th region) plus up to jitter_ms, then
+    fails with RequestLimitExceeded with probability throttle_rate.
+    Paginated operations return page_size items per page. The last
+    opt_in_regions regions answer every EC2 call with OptInRequired.
+    SSM region discovery is never throttled (botocore's own retries would
+    absorb it; the audit does not route it through its controller).
+    """
+
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    slow_every: int = 10
+    slow_factor: float = 5.0
+    throttle_rate: float = 0.02
+    page_size: int = 100
+    azs_per_region: int = 4
+    opt_in_regions: int = 1
+    seed: int = 1
+
+    def latency(self, index: int) -> float:
+        slow = self.slow_every and index % self.slow_every == self.slow_every - 1
+        return self.latency_ms / 1000 * (self.slow_factor if slow else 1.0)
+
+
+class FakeAws:
+    """In-process stand-in for EC2 and SSM in a set of synthetic regions.
+
+    Each manifest family is offered in all of its INSTANCE_SIZES, so
+    family wildcard queries return extra sizes as they do against EC2.
+    A type is offered in most, not all, regions and AZs, deterministically.
+    """
+
+    def __init__(
+        self, regions: list[str], instance_types: Iterable[str], profile: FakeAwsProfile
+    ) -> None:
+        self.regions = regions
+        self.profile = profile
+        families = {t.split(".", 1)[0] for t in instance_types}
+        self.types = sorted(
+            set(instance_types) | {f"{f}.{s}" for f in families for s in INSTANCE_SIZES}
+        )
+        self.region_index = {r: i for i, r in enumerate(regions)}
+        self.zones = {
+            r: [f"{r}{chr(ord('a') + z)}" for z in range(profile.azs_per_region)]
+            for r in regions
+        }
+        self.offerings: dict[str, list[tuple[str, str]]] = {}
+        for r, region in enumerate(regions):
+            self.offerings[region] = [
+                (itype, az)
+                for t, itype in enumerate(self.types)
+                if (t + r) % 7
+                for z, az in enumerate(self.zones[region])
+                if (t * 3 + r + z) % 5
+            ]
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self._random = random.Random(self.profile.seed)
+        self.calls = 0
+        self.throttles = 0
+
+    def request(self, region: str, operation: str, ec2: bool = True) -> None:
+        """Simulate one API round trip; raise ClientError to fail it."""
+        p = self.profile
+        index = self.region_index.get(region, 0)
+        with self._lock:
+            self.calls += 1
+            jitter = self._random.uniform(0, p.jitter_ms / 1000)
+            throttled = ec2 and self._random.random() < p.throttle_rate
+            if throttled:
+                self.throttles += 1
+        time.sleep(p.latency(index) + jitter)
+        if ec2 and index >= len(self.regions) - p.opt_in_regions:
+            code = "OptInRequired"
+        elif throttled:
+            code = "RequestLimitExceeded"
+        else:
+            return
+        raise ClientError({"Error": {"Code": code, "Message": "simulated"}}, operation)
+
+    def page(
+        self, region: str, operation: str, items: list, key: str, token: str | None
+    ) -> dict:
+        """One page of items, with a NextToken if more follow."""
+        self.request(region, operation)
+        start = int(token or 0)
+        end = start + self.profile.page_size
+        page = {key: items[start:end]}
+        if end < len(items):
+            page["NextToken"] = str(end)
+        return page
+
+    def pages(
+        self, region: str, operation: str, items: list, key: str, ec2: bool = True
+    ) -> Iterator[dict]:
+        size = self.profile.page_size
+        for start in range(0, max(len(items), 1), size):
+            self.request(region, operation, ec2)
+            yield {key: items[start : start + size]}
+
+
+class _FakeEvents:
+    def register(self, event_name, handler, unique_id=None):
+        pass
+
+    def register_first(self, event_name, handler, unique_id=None):
+        pass
+
+
+class _FakeClient:
+    def __init__(self, aws: FakeAws, region: str) -> None:
+        self.aws = aws
+        self.region = region
+        self.meta = SimpleNamespace(events=_FakeEvents())
+
+    def get_paginator(self, name: str):
+        return SimpleNamespace(paginate=getattr(self, f"_paginate_{name}"))
+
+    def describe_availability_zones(self, Filters=None):
+        self.aws.request(self.region, "DescribeAvailabilityZones")
+        return {
+            "AvailabilityZones": [
+                {"ZoneName": az, "State": "available"}
+                for az in self.aws.zones.get(self.region, [])
+            ]
+        }
+
+    def describe_instance_type_offerings(
+        self, LocationType, Filters=None, NextToken=None
+    ):
+        items = self._offerings(LocationType, Filters)
+        return self.aws.page(
+            self.region,
+            "DescribeInstanceTypeOfferings",
+            items,
+            "InstanceTypeOfferings",
+            NextToken,
+        )
+
+    def _offerings(self, LocationType, Filters):
+        patterns = Filters[0]["Values"] if Filters else ["*"]
+        exact = {p for p in patterns if "*" not in p}
+        wild = [p for p in patterns if "*" in p]
+        items = [
+            {"InstanceType": itype, "Location": az}
+            for itype, az in self.aws.offerings.get(self.region, [])
+            if itype in exact or any(fnmatch.fnmatchcase(itype, p) for p in wild)
+        ]
+        if LocationType == "region":
+            seen = sorted({o["InstanceType"] for o in items})
+            items = [{"InstanceType": t, "Location": self.region} for t in seen]
+        return items
+
+    def _paginate_get_parameters_by_path(self, Path):
+        items = [{"Name": f"{Path}/{r}"} for r in self.aws.regions]
+        return self.aws.pages(
+            self.region, "GetParametersByPath", items, "Parameters", ec2=False
+        )
+
+
+class FakeSession:
+    """Drop-in for boto3.Session whose clients talk to a FakeAws."""
+
+    def __init__(self, aws: FakeAws) -> None:
+        self.aws = aws
+
+    def client(self, service, region_name=None, config=None):
+        return _FakeClient(self.aws, region_name)
+
+
+def bench_pipeline(
+    region_counts: Iterable[int], profile: FakeAwsProfile, all_types: bool = False
+) -> list[dict]:
+    """Run the whole audit main() against FakeAws at several region counts.
+
+    Covers SSM region discovery, the docs parse (a synthetic page read from
+    disk), the AZ-detail phase and the report writers. Wall time should be
+    set by the slowest regions' latency and the throttle backoff, not grow
+    linearly with the region count.
+    """
+    specs = audit.load_manifest(audit.MANIFEST_PATH)
+    types = sorted({s.type for s in specs})
+    families = {audit.family_of(t) for t in types}
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in region_counts:
+            regions = synthetic_region_codes(n)
+            aws = FakeAws(regions, types, profile)
+            docs = Path(tmp) / f"docs-{n}.html"
+            docs.write_text(synthetic_docs_page(n, families=families))
+            argv = ["--docs-cache", str(docs), "--output-dir", str(Path(tmp) / "out")]
+            if all_types:
+                argv.append("--all-types")
+
+            def run() -> tuple[int, int, int]:
+                aws.reset()
+                with mock.patch(
+                    "boto3.Session", lambda **kw: FakeSession(aws)
+                ), contextlib.redirect_stderr(io.StringIO()):
+                    rc = audit.main(argv)
+                return rc, aws.calls, aws.throttles
+
+            (rc, calls, throttles), elapsed, peak = _timed(run)
+            rows.append(
+                {
+                    "regions": n,
+                    "exit": rc,
+                    "calls": calls,
+                    "throttles": throttles,
+                    "seconds": elapsed,
+                    "peak_kb": peak / 1024,
+                }
+            )
+    return rows
+
+
+def bench_clients(n_regions: int) -> list[dict]:
+    """Time building real EC2 clients for n_regions, as the AZ fan-out does.
+
+    Needs no network: client construction is local, and static dummy
+    credentials keep the credential provider chain out of the timing.
+    "cold" starts from a fresh session, so the first client also loads the
+    EC2 model and endpoint rules; "prewarmed" has ClientPool.prewarm() do
+    that first, as the audit does while the docs page is read.
+    """
+    import boto3
+
+    regions = synthetic_region_codes(n_regions)
+    rows = []
+    for case in ("cold", "prewarmed"):
+        session = boto3.Session(
+            aws_access_key_id="bench",
+            aws_secret_access_key="bench",
+            region_name="us-east-1",
+        )
+        pool = ClientPool(session)
+        if case == "prewarmed":
+            pool.prewarm("ec2", regions[0]).join()
+        t0 = time.perf_counter()
+        first = None
+        for region in regions:
+            pool.client("ec2", region)
+            if first is None:
+                first = time.perf_counter() - t0
+        elapsed = time.perf_counter() - t0
+        rows.append(
+            {
+                "case": case,
+                "clients": len(regions),
+                "seconds": elapsed,
+                "first_ms": first * 1000,
+                "rest_ms": (elapsed - first) / max(len(regions) - 1, 1) * 1000,
+            }
+        )
+    return rows
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """Map module -> (self us, cumulative us) from `python -X importtime`."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            out[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+        except (IndexError, ValueError):
+            continue  # the header line
+    return out
+
+
+def bench_startup(repeat: int = 5) -> list[dict]:
+    """Wall time to start the audit, and what its imports cost.
+
+    Each case runs in a fresh interpreter; the fastest of repeat runs is
+    reported, next to the interpreter's own start-up and to what importing
+    boto3 alone would add.
+    """
+    root = Path(__file__).resolve().parent.parent
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = Path(tmp) / "docs.html"
+        docs.write_text(synthetic_docs_page(30))
+        regions = ",".join(synthetic_region_codes(30))
+        offline = ["-m", "scripts.audit_pcs_instance_availability", "--no-az"]
+        offline += ["--docs-cache", str(docs), "--regions", regions]
+        offline += ["--output-dir", tmp]
+        cases = [
+            ("python", ["-c", "pass"]),
+            ("import boto3", ["-c", "import boto3"]),
+            ("import audit", ["-c", "import scripts.audit_pcs_instance_availability"]),
+            ("offline run", offline),
+        ]
+        rows = []
+        for name, args in cases:
+            # -X importtime itself slows imports down; time runs without it.
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                subprocess.run([sys.executable, *args], cwd=root, capture_output=True)
+                best = min(best, time.perf_counter() - t0)
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", *args],
+                cwd=root,
+                capture_output=True,
+                text=True,
+            )
+            imports = parse_importtime(proc.stderr)
+            rows.append(
+                {
+                    "case": name,
+                    "exit": proc.returncode,
+                    "ms": best * 1000,
+                    "modules": len(imports),
+                    "aws": "yes" if "botocore" in imports else "no",
+                }
+            )
+    return rows
+
+
+def _print_table(rows: list[dict], columns: list[tuple[str, str, str]]) -> None:
+    header = " | ".join(f"{title:>{len(title)}}" for _, title, _ in columns)
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            " | ".join(
+                f"{row[key]:>{len(title)}{fmt}}" for key, title, fmt in columns
+            )
+        )
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__)
+    sub = p.add_subparsers(dest="bench", required=True)
+    docs = sub.add_parser("docs-parser", help="Streaming docs-page parser.")
+    docs.add_argument(
+        "--scales",
+        default="1,10,50",
+        help="Comma-separated page size multipliers (x40 regions each).",
+    )
+    cat = sub.add_parser("catalog", help="Full-catalog (--all-types) bitsets.")
+    cat.add_argument("--types", type=int, default=1000)
+    cat.add_argument("--regions", type=int, default=30)
+    cat.add_argument("--azs-per-region", type=int, default=4)
+    pipe = sub.add_parser(
+        "pipeline", help="Full audit main() against simulated EC2 and SSM."
+    )
+    pipe.add_argument(
+        "--regions",
+        default="30,60,100",
+        help="Comma-separated synthetic region counts to run at.",
+    )
+    pipe.add_argument("--all-types", action="store_true", help="Run --all-types.")
+    defaults = FakeAwsProfile()
+    pipe.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    pipe.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms)
+    pipe.add_argument(
+        "--slow-every",
+        type=int,
+        default=defaults.slow_every,
+        help="Every Nth region is --slow-factor times slower (0: none).",
+    )
+    pipe.add_argument("--slow-factor", type=float, default=defaults.slow_factor)
+    pipe.add_argument(
+        "--throttle-rate",
+        type=float,
+        default=defaults.throttle_rate,
+        help="Probability that any one call is throttled.",
+    )
+    pipe.add_argument("--page-size", type=int, default=defaults.page_size)
+    pipe.add_argument("--azs-per-region", type=int, default=defaults.azs_per_region)
+    pipe.add_argument(
+        "--opt-in-regions",
+        type=int,
+        default=defaults.opt_in_regions,
+        help="How many regions the fake credentials cannot reach.",
+    )
+    clients = sub.add_parser("clients", help="boto3 EC2 client construction.")
+    clients.add_argument("--regions", type=int, default=40)
+    startup = sub.add_parser("startup", help="Interpreter start-up and imports.")
+    startup.add_argument("--repeat", type=int, default=5)
+    return p.parse_args(list(argv) if argv is not None else None)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.bench == "docs-parser":
+        scales = [int(s) for s in args.scales.split(",") if s.strip()]
+        rows = bench_docs_parser(scales)
+        _print_table(
+            rows,
+            [
+                ("case", "      case", ""),
+                ("size_mb", " size MB", ".2f"),
+                ("pairs", "   pairs", "d"),
+                ("seconds", "  seconds", ".2f"),
+                ("mb_per_s", "  MB/s", ".1f"),
+                ("peak_kb", " peak KiB", ".0f"),
+            ],
+        )
+    elif args.bench == "catalog":
+        rows = bench_catalog(args.types, args.regions, args.azs_per_region)
+        _print_table(
+            rows,
+            [
+                ("step", "     step", ""),
+                ("seconds", "  seconds", ".3f"),
+                ("peak_kb", " peak KiB", ".0f"),
+            ],
+        )
+    elif args.bench == "pipeline":
+        profile = FakeAwsProfile(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            slow_every=args.slow_every,
+            slow_factor=args.slow_factor,
+            throttle_rate=args.throttle_rate,
+            page_size=args.page_size,
+            azs_per_region=args.azs_per_region,
+            opt_in_regions=args.opt_in_regions,
+        )
+        counts = [int(n) for n in args.regions.split(",") if n.strip()]
+        rows = bench_pipeline(counts, profile, all_types=args.all_types)
+        _print_table(
+            rows,
+            [
+                ("regions", " regions", "d"),
+                ("exit", " exit", "d"),
+                ("calls", " API calls", "d"),
+                ("throttles", " throttled", "d"),
+                ("seconds", "  seconds", ".2f"),
+                ("peak_kb", " peak KiB", ".0f"),
+            ],
+        )
+    elif args.bench == "clients":
+        rows = bench_clients(args.regions)
+        _print_table(
+            rows,
+            [
+                ("case", "      case", ""),
+                ("clients", " clients", "d"),
+                ("seconds", "  seconds", ".2f"),
+                ("first_ms", " first region ms", ".1f"),
+                ("rest_ms", " then ms each", ".1f"),
+            ],
+        )
+    elif args.bench == "startup":
+        rows = bench_startup(args.repeat)
+        _print_table(
+            rows,
+            [
+                ("case", "          case", ""),
+                ("exit", " exit", "d"),
+                ("ms", "    ms", ".0f"),
+                ("modules", " modules", "d"),
+                ("aws", " botocore", ""),
+            ],
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,486 @@
-import boto3
+"""Check which AWS regions offer given EC2 instance types.
+
+Takes any number of instance types or family wildcards (e.g. 'hpc7*') and
+looks them all up in every region at once: one paginated
+DescribeInstanceTypeOfferings call per region with every type in its
+filter, all regions in parallel, each region's client built once and
+reused. Checking 20 types costs about what checking 1 does.
+
+Regions the credentials cannot reach (opt-in not enabled, or another
+partition) are reported as inaccessible, and failed lookups as errors,
+rather than as "not offered".
+
+Usage:
+  python -m scripts.instance_region hpc7a.96xlarge
+  python -m scripts.instance_region 'hpc7*' c7g.xlarge --regions us-east-1,eu-west-1
+  python -m scripts.instance_region 'p5*' --format json
+  python -m scripts.instance_region c7g.xlarge c7a.xlarge --format csv > out.csv
+
+With --resolve, the question is instead "which is the first region in my
+preference order that offers all of these?". The preference order is
+--regions as given, or a latency-ranked list from --prefer-file. Every
+candidate is queried at once, and the answer is returned as soon as
+every higher-ranked region has answered no; the lookups still queued or
+in flight are then cancelled. Latency is that of the best region's
+response, not the sum over the list:
+
+  python -m scripts.instance_region hpc7a.96xlarge --resolve \
+      --regions us-east-2,us-east-1,eu-north-1
+  python -m scripts.instance_region hpc7a.96xlarge --resolve \
+      --prefer-file ~/.config/pcs/region-preference.yaml
+
+The preference file uses the --extra-regions-file layout of the audit,
+with an optional latency per region (lowest first; regions without one
+keep their file order, after the ranked ones):
+
+  regions:
+    - code: us-east-2
+      latency_ms: 11
+    - code: eu-north-1
+      latency_ms: 95
+
+Exit status is 0 if every type or wildcard is offered in at least one
+region (with --resolve: if a region was found), 1 if not, 2 on errors.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import fnmatch
+import json
 import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
 
-# Function to check instance type availability in a region
-def is_instance_type_available(region_name, instance_type):
-    ec2 = boto3.client('ec2', region_name=region_name)
-    try:
-        # Use DescribeInstanceTypeOfferings API to check availability
-        response = ec2.describe_instance_type_offerings(
-            LocationType='region',
-            Filters=[
-                {'Name': 'instance-type', 'Values': [instance_type]},
-            ]
+from .audit_pcs_clients import ClientPool
+from .audit_pcs_concurrency import ConcurrencyController
+
+if TYPE_CHECKING:
+    import boto3
+
+DEFAULT_HOME_REGION = "us-east-1"
+
+# DescribeInstanceTypeOfferings accepts at most this many filter values.
+MAX_FILTER_VALUES = 200
+
+# Errors meaning "these credentials cannot use this region", as opposed to
+# a failed lookup.
+ACCESS_ERROR_CODES = frozenset(
+    {"AuthFailure", "UnauthorizedOperation", "OptInRequired"}
+)
+
+AVAILABLE = "available"
+NOT_OFFERED = "not-offered"
+INACCESSIBLE = "inaccessible"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+FORMATS = ("text", "json", "csv")
+
+
+@dataclass
+class RegionResult:
+    """Offered types in one region, or why the region could not be checked."""
+
+    region: str
+    status: str = "ok"  # "ok", INACCESSIBLE, ERROR or CANCELLED
+    offered: set[str] = field(default_factory=set)
+    error: str = ""
+
+    def offers_all(self, patterns: Iterable[str]) -> bool:
+        return self.status == "ok" and all(
+            any(fnmatch.fnmatchcase(t, p) for t in self.offered) for p in patterns
         )
-        return bool(response['InstanceTypeOfferings'])
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _error_code(exc: BaseException) -> str:
+    return getattr(exc, "response", {}).get("Error", {}).get("Code", "")
+
+
+def _is_inaccessible(exc: BaseException) -> bool:
+    """Whether exc means the region cannot be used from here: an access
+    error, or no connection to its endpoint (e.g. GovCloud from a
+    commercial account)."""
+    # Imported here so that loading this module does not load botocore.
+    from botocore.exceptions import EndpointConnectionError
+
+    if isinstance(exc, EndpointConnectionError):
+        return True
+    return _error_code(exc) in ACCESS_ERROR_CODES
+
+
+def list_regions(
+    clients: ClientPool, home: str = DEFAULT_HOME_REGION
+) -> tuple[list[str], list[str]]:
+    """Return (enabled regions, regions not opted in), both sorted."""
+    regions = clients.client("ec2", home).describe_regions(AllRegions=True)
+    enabled, disabled = [], []
+    for r in regions.get("Regions", []):
+        opted_out = r.get("OptInStatus") == "not-opted-in"
+        (disabled if opted_out else enabled).append(r["RegionName"])
+    return sorted(enabled), sorted(disabled)
+
+
+def lookup_region(
+    clients: ClientPool,
+    region: str,
+    patterns: list[str],
+    controller: ConcurrencyController | None = None,
+    cancel: threading.Event | None = None,
+) -> RegionResult:
+    """Offered types matching patterns in region, from one paginated query
+    (more only past MAX_FILTER_VALUES patterns). Setting cancel stops the
+    lookup before its next page."""
+
+    def _run(values: list[str]) -> set[str]:
+        if cancel is not None and cancel.is_set():
+            raise _Cancelled
+        paginator = clients.client("ec2", region).get_paginator(
+            "describe_instance_type_offerings"
+        )
+        offered: set[str] = set()
+        for page in paginator.paginate(
+            LocationType="region",
+            Filters=[{"Name": "instance-type", "Values": values}],
+        ):
+            offered.update(o["InstanceType"] for o in page["InstanceTypeOfferings"])
+            if cancel is not None and cancel.is_set():
+                raise _Cancelled
+        return offered
+
+    result = RegionResult(region)
+    try:
+        for i in range(0, len(patterns), MAX_FILTER_VALUES):
+            chunk = patterns[i : i + MAX_FILTER_VALUES]
+            if controller is None:
+                result.offered |= _run(chunk)
+            else:
+                result.offered |= controller.call(region, _run, chunk)
+    except _Cancelled:
+        result.status = CANCELLED
+        result.offered = set()
     except Exception as e:
-        print(f"Error checking region {region_name}: {e}")
-        return False
-
-# Function to get regions and check availability
-def check_instance_availability(instance_type):
-    ec2 = boto3.client('ec2')
-    regions = [region['RegionName'] for region in ec2.describe_regions()['Regions']]
-    
-    availability = {}
-    for region in regions:
-        availability[region] = is_instance_type_available(region, instance_type)
-    
-    return availability
+        result.status = INACCESSIBLE if _is_inaccessible(e) else ERROR
+        result.offered = set()
+        result.error = str(e)
+    return result
+
+
+def check_availability(
+    clients: ClientPool,
+    regions: Iterable[str],
+    patterns: list[str],
+    controller: ConcurrencyController | None = None,
+) -> dict[str, RegionResult]:
+    """Look patterns up in every region concurrently; region -> result."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    controller = controller or ConcurrencyController()
+    regions = list(regions)
+    with ThreadPoolExecutor(max_workers=controller.max_workers) as pool:
+        results = pool.map(
+            lambda r: lookup_region(clients, r, patterns, controller), regions
+        )
+        return {r.region: r for r in results}
+
+
+def resolve_region(
+    clients: ClientPool,
+    preference: list[str],
+    patterns: list[str],
+    controller: ConcurrencyController | None = None,
+) -> tuple[str | None, dict[str, RegionResult]]:
+    """The first region of preference that offers every pattern.
+
+    Every candidate is looked up concurrently. A region is the answer once
+    it offers everything and every region ranked above it has answered
+    without doing so; the remaining lookups are then cancelled. Returns
+    (region or None, the results received by then).
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    controller = controller or ConcurrencyController()
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=min(len(preference), controller.max_workers))
+    futures = {
+        pool.submit(lookup_region, clients, r, patterns, controller, cancel): r
+        for r in preference
+    }
+    answered: dict[str, RegionResult] = {}
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                answered[futures[fut]] = fut.result()
+            for region in preference:
+                result = answered.get(region)
+                if result is None:
+                    break  # a better region has not answered yet
+                if result.offers_all(patterns):
+                    return region, answered
+        return None, answered
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def load_preference(path: Path) -> list[str]:
+    """Region codes from a preference file, lowest latency_ms first."""
+    import yaml
+
+    with path.open() as f:
+        data = yaml.safe_load(f) or {}
+    entries = [
+        e for e in data.get("regions", []) if isinstance(e, dict) and e.get("code")
+    ]
+
+    def rank(item: tuple[int, dict]) -> tuple[bool, float, int]:
+        i, entry = item
+        latency = entry.get("latency_ms")
+        return latency is None, latency or 0, i
+
+    ranked = sorted(enumerate(entries), key=rank)
+    return list(dict.fromkeys(e["code"] for _, e in ranked))
+
+
+def resolve_rows(
+    preference: list[str], answered: dict[str, RegionResult], patterns: list[str]
+) -> list[tuple[int, str, str]]:
+    """(rank, region, status) for every candidate, in preference order."""
+    rows = []
+    for rank, region in enumerate(preference, 1):
+        result = answered.get(region)
+        if result is None:
+            status = CANCELLED
+        elif result.status != "ok":
+            status = result.status
+        else:
+            status = AVAILABLE if result.offers_all(patterns) else NOT_OFFERED
+        rows.append((rank, region, status))
+    return rows
+
+
+def expand_types(patterns: list[str], results: Iterable[RegionResult]) -> list[str]:
+    """The report's rows: every offered type a pattern matched, plus any
+    pattern that matched nothing anywhere, in first-seen order."""
+    offered = set().union(*(r.offered for r in results))
+    rows: list[str] = []
+    for p in patterns:
+        matched = sorted(t for t in offered if fnmatch.fnmatchcase(t, p))
+        for t in matched or [p]:
+            if t not in rows:
+                rows.append(t)
+    return rows
+
+
+def availability_rows(
+    types: list[str], results: dict[str, RegionResult]
+) -> list[tuple[str, str, str]]:
+    """(instance_type, region, status) for every type and region."""
+    rows = []
+    for t in types:
+        for region in sorted(results):
+            r = results[region]
+            if r.status != "ok":
+                status = r.status
+            else:
+                status = AVAILABLE if t in r.offered else NOT_OFFERED
+            rows.append((t, region, status))
+    return rows
+
+
+def write_text(out, types: list[str], results: dict[str, RegionResult]) -> None:
+    checked = sorted(r for r, res in results.items() if res.status == "ok")
+    for t in types:
+        regions = [r for r in checked if t in results[r].offered]
+        print(
+            f"{t}: available in {len(regions)} of {len(checked)} region(s)",
+            file=out,
+        )
+        if regions:
+            print(f"  {', '.join(regions)}", file=out)
+    for status, label in ((INACCESSIBLE, "Inaccessible"), (ERROR, "Lookup failed")):
+        regions = sorted(r for r, res in results.items() if res.status == status)
+        if regions:
+            print(f"{label} ({len(regions)}): {', '.join(regions)}", file=out)
+
+
+def write_json(out, types: list[str], results: dict[str, RegionResult]) -> None:
+    json.dump(
+        {
+            "types": types,
+            "availability": {
+                t: sorted(
+                    r
+                    for r, res in results.items()
+                    if res.status == "ok" and t in res.offered
+                )
+                for t in types
+            },
+            "inaccessible": sorted(
+                r for r, res in results.items() if res.status == INACCESSIBLE
+            ),
+            "errors": {
+                r: res.error
+                for r, res in sorted(results.items())
+                if res.status == ERROR
+            },
+        },
+        out,
+        indent=2,
+    )
+    out.write("\n")
+
+
+def write_csv(out, types: list[str], results: dict[str, RegionResult]) -> None:
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["instance_type", "region", "status"])
+    writer.writerows(availability_rows(types, results))
+
+
+WRITERS = {"text": write_text, "json": write_json, "csv": write_csv}
+
+
+def _new_session(profile: str | None) -> boto3.Session:
+    import boto3
+
+    return boto3.Session(profile_name=profile) if profile else boto3.Session()
+
+
+def parse_args(argv: Iterable[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    p.add_argument(
+        "types",
+        nargs="+",
+        metavar="TYPE",
+        help="Instance types or wildcards (e.g. hpc7a.96xlarge, 'hpc7*'). "
+        "Comma-separated lists are accepted too.",
+    )
+    p.add_argument(
+        "--regions",
+        help="Comma-separated regions to check instead of every region.",
+    )
+    p.add_argument("--profile", help="AWS profile to use.")
+    p.add_argument(
+        "--home-region",
+        default=DEFAULT_HOME_REGION,
+        help="Region to list the account's regions from "
+        f"(default: {DEFAULT_HOME_REGION}).",
+    )
+    p.add_argument("--format", choices=FORMATS, default="text", help="Output format.")
+    p.add_argument(
+        "--resolve",
+        action="store_true",
+        help="Print only the first region, in preference order, that offers "
+        "every TYPE. The order is --regions as given, or --prefer-file.",
+    )
+    p.add_argument(
+        "--prefer-file",
+        metavar="PATH",
+        help="With --resolve: YAML file of candidate regions, ranked by "
+        "latency_ms (see above).",
+    )
+    return p.parse_args(list(argv) if argv is not None else None)
+
+
+def run_resolve(
+    args: argparse.Namespace, clients: ClientPool, patterns: list[str]
+) -> int:
+    if args.prefer_file:
+        try:
+            preference = load_preference(Path(args.prefer_file).expanduser())
+        except OSError as e:
+            print(f"cannot read preference file: {e}", file=sys.stderr)
+            return 2
+    elif args.regions:
+        preference = [r.strip() for r in args.regions.split(",") if r.strip()]
+    else:
+        print(
+            "--resolve needs --regions (in preference order) or --prefer-file.",
+            file=sys.stderr,
+        )
+        return 2
+    if not preference:
+        print("No candidate regions.", file=sys.stderr)
+        return 2
+    t0 = time.monotonic()
+    region, answered = resolve_region(clients, preference, patterns)
+    rows = resolve_rows(preference, answered, patterns)
+    waited = sum(status != CANCELLED for _, _, status in rows)
+    print(
+        f"Resolved {region or 'no region'} in {time.monotonic() - t0:.2f}s "
+        f"({waited} of {len(preference)} candidate(s) answered)",
+        file=sys.stderr,
+    )
+    if args.format == "json":
+        json.dump(
+            {
+                "region": region,
+                "types": patterns,
+                "candidates": [
+                    {"rank": rank, "region": r, "status": status}
+                    for rank, r, status in rows
+                ],
+            },
+            sys.stdout,
+            indent=2,
+        )
+        sys.stdout.write("\n")
+    elif args.format == "csv":
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(["rank", "region", "status"])
+        writer.writerows(rows)
+    elif region:
+        print(region)
+    return 0 if region else 1
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = parse_args(argv)
+    patterns = list(
+        dict.fromkeys(
+            t.strip() for arg in args.types for t in arg.split(",") if t.strip()
+        )
+    )
+    clients = ClientPool(_new_session(args.profile))
+    if args.resolve:
+        return run_resolve(args, clients, patterns)
+    disabled: list[str] = []
+    if args.regions:
+        regions = [r.strip() for r in args.regions.split(",") if r.strip()]
+    else:
+        try:
+            regions, disabled = list_regions(clients, args.home_region)
+        except Exception as e:
+            print(f"cannot list regions: {e}", file=sys.stderr)
+            return 2
+    results = check_availability(clients, regions, patterns)
+    for region in disabled:
+        results[region] = RegionResult(region, INACCESSIBLE, error="not opted in")
+    types = expand_types(patterns, results.values())
+    WRITERS[args.format](sys.stdout, types, results)
+    if not any(r.status == "ok" for r in results.values()):
+        print("No region could be checked.", file=sys.stderr)
+        return 2
+    offered = set().union(*(r.offered for r in results.values()))
+    nowhere = [
+        p for p in patterns if not any(fnmatch.fnmatchcase(t, p) for t in offered)
+    ]
+    if nowhere:
+        print(f"Offered in no checked region: {', '.join(nowhere)}", file=sys.stderr)
+        return 1
+    return 0
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <instance_type>")
-        sys.exit(1)
-    
-    instance_type = sys.argv[1]
-    print(f"Checking availability for instance type: {instance_type}\n")
-    
-    availability = check_instance_availability(instance_type)
-    
-    for region, is_available in availability.items():
-        print(f"{region}: {'Available' if is_available else 'Not Available'}")
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""One-pass file index of the recipes tree, shared by the validators.
+
+Each validator used to walk recipes/ on its own with rglob. scan() walks
+the tree once with os.scandir and records every entry's path, kind, size
+and mtime. The checks then select the files they need from the index in
+memory, so `python -m scripts.validate_all` lists the tree once.
+"""
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from . import utils
+
+FILE = "file"
+DIR = "dir"
+OTHER = "other"  # sockets, broken links
+
+
+@dataclass(frozen=True)
+class Entry:
+    path: Path
+    kind: str
+    size: int
+    mtime: float
+
+
+class RepoIndex:
+    """Every entry under root, sorted by path."""
+
+    def __init__(self, root, entries):
+        self.root = Path(root)
+        self.entries = sorted(entries, key=lambda e: e.path)
+        self._by_path = {e.path: e for e in self.entries}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, path):
+        return self._by_path.get(Path(path))
+
+    def is_file(self, path):
+        entry = self.get(path)
+        return entry is not None and entry.kind == FILE
+
+    def is_dir(self, path):
+        entry = self.get(path)
+        return entry is not None and entry.kind == DIR
+
+    def files(self, name=None, suffixes=None):
+        """Paths of the files named name and/or ending in one of suffixes."""
+        return [
+            e.path
+            for e in self.entries
+            if e.kind == FILE
+            and (name is None or e.path.name == name)
+            and (suffixes is None or e.path.suffix in suffixes)
+        ]
+
+    def dirs(self, name=None):
+        return [
+            e.path
+            for e in self.entries
+            if e.kind == DIR and (name is None or e.path.name == name)
+        ]
+
+    def within(self, dirs):
+        """A RepoIndex of just the entries in (or equal to) one of dirs."""
+        dirs = [Path(d) for d in dirs]
+        return RepoIndex(
+            self.root,
+            [
+                e
+                for e in self.entries
+                if any(e.path == d or d in e.path.parents for d in dirs)
+            ],
+        )
+
+
+def scan(root=None):
+    """Walk root (default: recipes/) once and return its RepoIndex.
+
+    A symlink to a directory is recorded as a DIR, as Path.is_dir() sees
+    it, but not descended into, as rglob does not.
+    """
+    root = Path(root or utils.RECIPES)
+    entries = []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as it:
+            for de in it:
+                path = directory / de.name
+                try:
+                    if de.is_dir():
+                        kind = DIR
+                        if not de.is_symlink():
+                            pending.append(path)
+                    elif de.is_file():
+                        kind = FILE
+                    else:
+                        kind = OTHER
+                    st = de.stat()
+                    entries.append(Entry(path, kind, st.st_size, st.st_mtime))
+                except OSError:
+                    entries.append(Entry(path, OTHER, 0, 0.0))
+    return RepoIndex(root, entries)
@@ -0,0 +1,1096 @@
+"""Unit tests for the PCS instance availability audit.
+
+Covers scripts/audit_pcs_instance_availability.py and its helper modules
+(scripts/audit_pcs_*.py).
+
+Run with:
+  python -m unittest scripts.test_audit_pcs_instance_availability
+"""
+import dataclasses
+import fnmatch
+import http.client
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from scripts import audit_pcs_instance_availability as audit
+from scripts.audit_pcs_cache import OfferingsCache
+from scripts.audit_pcs_catalog import CatalogBuilder
+from scripts.audit_pcs_clients import ClientPool, ProfileMap
+from scripts.audit_pcs_concurrency import AimdLimit, ConcurrencyController
+from scripts.audit_pcs_gate import plan_gate, recipes_for_files
+from scripts.audit_pcs_http_cache import DocsPageCache
+from scripts.audit_pcs_manifest_index import (
+    TemplateIndex,
+    compare_manifest,
+    extract_instance_types,
+    load_template,
+)
+from scripts.audit_pcs_query import AuditResults, AvailabilityIndex, InstanceSpec
+from scripts.audit_pcs_serve import AuditService, make_server
+from scripts.audit_pcs_shards import parse_shard, shard_regions
+from scripts.audit_pcs_snapshots import SnapshotStore, carry_since, changed_cells
+from scripts.audit_pcs_trace import Tracer
+
+# region -> {instance_type: [az, ...]}
+FAKE_OFFERINGS = {
+    "us-east-1": {
+        "c7g.xlarge": ["us-east-1a", "us-east-1b", "us-east-1c"],
+        "hpc7a.48xlarge": ["us-east-1b"],
+    },
+    "eu-west-1": {
+        "c7g.xlarge": ["eu-west-1a", "eu-west-1b"],
+    },
+}
+FAKE_TOTAL_AZS = {"us-east-1": 6, "eu-west-1": 3}
+
+
+class FakeEvents:
+    def register_first(self, event_name, handler, unique_id=None):
+        pass
+
+
+class FakeMeta:
+    events = FakeEvents()
+
+
+class FakeEC2:
+    meta = FakeMeta()
+
+    def __init__(self, region, calls):
+        self.region = region
+        self.calls = calls
+
+    def describe_availability_zones(self, Filters):
+        self.calls.append(("describe_availability_zones", self.region))
+        n = FAKE_TOTAL_AZS.get(self.region, 0)
+        return {"AvailabilityZones": [{"ZoneName": f"{self.region}-{i}"} for i in range(n)]}
+
+    def describe_instance_type_offerings(self, LocationType, Filters=None):
+        self.calls.append(("describe_instance_type_offerings", LocationType))
+        patterns = Filters[0]["Values"] if Filters else ["*"]
+        offered = FAKE_OFFERINGS.get(self.region, {})
+        out = []
+        for itype in sorted(offered):
+            if not any(fnmatch.fnmatchcase(itype, p) for p in patterns):
+                continue
+            if LocationType == "region":
+                out.append({"InstanceType": itype, "Location": self.region})
+            else:
+                for az in offered[itype]:
+                    out.append({"InstanceType": itype, "Location": az})
+        return {"InstanceTypeOfferings": out}
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def client(self, service, region_name=None, config=None):
+        return FakeEC2(region_name, self.calls)
+
+
+class OfferingsCacheTest(unittest.TestCase):
+    TYPES = ["c7g.xlarge", "hpc7a.48xlarge"]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, types, max_age=3600, refresh=()):
+        session = FakeSession()
+        cache = OfferingsCache(self.cache_dir, max_age=max_age, refresh_regions=refresh)
+        try:
+            result = audit.offerings_for_region(session, "us-east-1", types, cache)
+        finally:
+            cache.close()
+        return result, session.calls, cache.stats
+
+    def test_warm_run_makes_no_api_calls(self):
+        cold, cold_calls, _ = self._run(self.TYPES)
+        warm, warm_calls, stats = self._run(self.TYPES)
+        self.assertEqual(len(cold_calls), 2)
+        self.assertEqual(warm_calls, [])
+        self.assertEqual(cold, warm)
+        self.assertEqual(stats.misses, 0)
+        self.assertEqual(warm[0], {"c7g.xlarge", "hpc7a.48xlarge"})
+        self.assertEqual(warm[1]["hpc7a.48xlarge"], {"us-east-1b"})
+        self.assertEqual(warm[2], 6)
+
+    def test_new_type_fetches_only_that_type(self):
+        self._run(["c7g.xlarge"])
+        (avail, az_map, _), calls, stats = self._run(self.TYPES)
+        self.assertNotIn(("describe_availability_zones", "us-east-1"), calls)
+        self.assertEqual(stats.hits, 2)
+        self.assertEqual(stats.misses, 1)
+        self.assertEqual(avail, {"c7g.xlarge", "hpc7a.48xlarge"})
+        self.assertEqual(len(az_map["c7g.xlarge"]), 3)
+
+    def test_stale_and_refreshed_entries_are_refetched(self):
+        self._run(self.TYPES)
+        _, calls, _ = self._run(self.TYPES, max_age=0)
+        self.assertEqual(len(calls), 2)
+        _, calls, _ = self._run(self.TYPES, refresh=["us-east-1"])
+        self.assertEqual(len(calls), 2)
+
+    def test_unoffered_types_are_cached_as_negative(self):
+        self._run(["m7g.8xlarge"])
+        (avail, az_map, _), calls, _ = self._run(["m7g.8xlarge"])
+        self.assertEqual(calls, [])
+        self.assertEqual(avail, set())
+        self.assertEqual(az_map, {})
+
+
+def _throttle_error():
+    return ClientError(
+        {"Error": {"Code": "RequestLimitExceeded", "Message": "slow down"}},
+        "DescribeInstanceTypeOfferings",
+    )
+
+
+class ConcurrencyControllerTest(unittest.TestCase):
+    def test_aimd_limit_halves_on_throttle_and_grows_on_success(self):
+        lim = AimdLimit(initial=16, maximum=32)
+        self.assertTrue(lim.on_throttle())
+        self.assertEqual(int(lim.limit), 8)
+        # A second throttle inside the cooldown is the same congestion event.
+        self.assertFalse(lim.on_throttle())
+        self.assertEqual(int(lim.limit), 8)
+        for _ in range(10):
+            lim.on_success()
+        self.assertEqual(int(lim.limit), 9)
+
+    def test_call_backs_off_and_retries_throttled_calls(self):
+        sleeps = []
+        controller = ConcurrencyController(sleep=sleeps.append)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise _throttle_error()
+            return "ok"
+
+        self.assertEqual(controller.call("us-east-1", flaky), "ok")
+        self.assertEqual(len(sleeps), 2)
+        self.assertEqual(controller.stats.throttles_by_region, {"us-east-1": 2})
+        self.assertLess(controller.region("us-east-1").limit, 4)
+
+    def test_non_throttle_errors_propagate(self):
+        controller = ConcurrencyController(sleep=lambda _: None)
+
+        def denied():
+            raise ClientError({"Error": {"Code": "AuthFailure"}}, "X")
+
+        with self.assertRaises(ClientError):
+            controller.call("us-east-1", denied)
+        self.assertEqual(controller.stats.retries, 0)
+
+    def test_pipelined_audit_matches_serial_lookups(self):
+        types = ["c7g.xlarge", "hpc7a.48xlarge", "m7g.8xlarge"]
+        regions = sorted(FAKE_OFFERINGS)
+        results, inaccessible = audit.audit_az_detail(FakeSession(), regions, types)
+        self.assertEqual(inaccessible, [])
+        for region in regions:
+            self.assertEqual(
+                results[region],
+                audit.offerings_for_region(FakeSession(), region, types),
+            )
+
+
+class QueryPlannerTest(unittest.TestCase):
+    def test_many_sizes_collapse_to_family_wildcard(self):
+        stats = audit.PlannerStats()
+        queries = audit.plan_offerings_queries(
+            ["c6i.xlarge", "c6i.4xlarge", "c6i.8xlarge", "t2.medium"], stats=stats
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(queries[0].filter_values, ("c6i.*", "t2.medium"))
+        self.assertEqual(len(queries[0].wanted), 4)
+        self.assertEqual(stats.wildcard_families, {"c6i"})
+
+    def test_large_type_lists_are_chunked_to_filter_limit(self):
+        types = [f"x{i}.large" for i in range(450)]
+        queries = audit.plan_offerings_queries(types)
+        self.assertEqual([len(q.filter_values) for q in queries], [200, 200, 50])
+        self.assertEqual(set().union(*(q.wanted for q in queries)), set(types))
+
+    def test_wildcard_results_are_trimmed_to_requested_types(self):
+        FAKE_OFFERINGS["us-east-1"]["hpc7a.96xlarge"] = ["us-east-1b"]
+        self.addCleanup(FAKE_OFFERINGS["us-east-1"].pop, "hpc7a.96xlarge")
+        stats = audit.PlannerStats()
+        session = FakeSession()
+        avail, az_map, _ = audit.offerings_for_region(
+            session,
+            "us-east-1",
+            ["hpc7a.12xlarge", "hpc7a.24xlarge", "hpc7a.48xlarge"],
+            planner_stats=stats,
+        )
+        self.assertEqual(avail, {"hpc7a.48xlarge"})
+        self.assertEqual(set(az_map), {"hpc7a.48xlarge"})
+        self.assertEqual((stats.planned, stats.made), (2, 2))
+
+    def test_throttled_page_is_retried_alone(self):
+        pages = {
+            None: {
+                "InstanceTypeOfferings": [{"InstanceType": "a.x", "Location": "z1"}],
+                "NextToken": "2",
+            },
+            "2": {"InstanceTypeOfferings": [{"InstanceType": "b.x", "Location": "z2"}]},
+        }
+        requests = []
+
+        def describe(LocationType, Filters=None, NextToken=None):
+            requests.append(NextToken)
+            if NextToken == "2" and requests.count("2") == 1:
+                raise _throttle_error()
+            return pages[NextToken]
+
+        ec2 = mock.Mock(describe_instance_type_offerings=describe)
+        clients = mock.Mock(client=lambda service, region: ec2)
+        stats = audit.PlannerStats()
+        ctx = audit._RegionContext(
+            clients,
+            "us-east-1",
+            controller=ConcurrencyController(sleep=lambda _: None),
+            planner_stats=stats,
+        )
+        pairs = ctx.paginate_offerings("availability-zone", None)
+        self.assertEqual(pairs, [("a.x", "z1"), ("b.x", "z2")])
+        self.assertEqual(requests, [None, "2", "2"])
+        self.assertEqual(stats.made, 2)
+
+
+class AvailabilityMatrixTest(unittest.TestCase):
+    def test_matrix_cells_match_single_cell_classification(self):
+        specs = [
+            audit.InstanceSpec("r1", t, "compute", "x86_64")
+            for t in ["c7g.xlarge", "hpc7a.48xlarge", "p5.48xlarge", "t2.medium"]
+        ]
+        regions = ["eu-west-1", "us-east-1", "ap-south-1", "il-central-1"]
+        doc_families = {
+            "eu-west-1": {"c7g", "t2", "p5"},
+            "us-east-1": {"c7g", "t2"},
+            "ap-south-1": {"hpc7a"},
+        }
+        az_results = {
+            r: audit.offerings_for_region(
+                FakeSession(), r, [s.type for s in specs]
+            )
+            for r in ("eu-west-1", "us-east-1")
+        }
+        matrix = audit.AvailabilityMatrix(specs, regions, doc_families, az_results)
+        seen = set()
+        for row, (itype, _) in enumerate(matrix.types):
+            for col, region in enumerate(regions):
+                expected = audit._region_cell(itype, region, doc_families, az_results)
+                got = (matrix.cell(row, col), matrix.status(row, col))
+                self.assertEqual(got, expected, (itype, region))
+                seen.add(got[0])
+        self.assertTrue({"OK", "--", "??", "OK(?)", "1/6*", "3/6"} <= seen, seen)
+
+
+class CatalogTest(unittest.TestCase):
+    def test_all_types_catalog_queries(self):
+        catalog, inaccessible = audit.audit_all_types(
+            FakeSession(), ["eu-west-1", "us-east-1", "ap-south-1"]
+        )
+        self.assertEqual(inaccessible, [])
+        self.assertEqual(catalog.types, ["c7g.xlarge", "hpc7a.48xlarge"])
+        self.assertEqual(catalog.az_count("c7g.xlarge", "us-east-1"), 3)
+        self.assertEqual(catalog.az_count("hpc7a.48xlarge", "eu-west-1"), 0)
+        self.assertEqual(catalog.azs_for("hpc7a.48xlarge"), ["us-east-1b"])
+        self.assertEqual(
+            catalog.regions_for("c7g.xlarge", min_azs=3), ["us-east-1"]
+        )
+        self.assertEqual(catalog.family_regions("c7g"), ["eu-west-1", "us-east-1"])
+        self.assertEqual(
+            catalog.types_in_az("us-east-1b"), ["c7g.xlarge", "hpc7a.48xlarge"]
+        )
+        self.assertEqual(catalog.types_in_region("eu-west-1"), ["c7g.xlarge"])
+        # Fake zone names plus the offered AZs not in that list.
+        self.assertEqual(catalog.region_azs[catalog.region_of["eu-west-1"]], 5)
+        self.assertTrue(catalog.has_region_data("ap-south-1"))
+
+    def test_count_matrix_matches_per_cell_queries(self):
+        builder = CatalogBuilder()
+        builder.add_region(
+            "r1", ["r1a", "r1b", "r1c"], [("a.large", "r1a"), ("a.large", "r1c")]
+        )
+        builder.add_region("r2", ["r2a"], [("b.large", "r2a"), ("a.large", "r2a")])
+        catalog = builder.build(["r1", "r2", "r3"])
+        counts = catalog.count_matrix()
+        for t, itype in enumerate(catalog.types):
+            for c, region in enumerate(catalog.regions):
+                self.assertEqual(
+                    counts[t * 3 + c], catalog.az_count(itype, region), (itype, region)
+                )
+        self.assertFalse(catalog.has_region_data("r3"))
+        self.assertEqual(catalog.azs_for("a.large", "r1"), ["r1a", "r1c"])
+
+
+class ShardMergeTest(unittest.TestCase):
+    REGIONS = "us-east-1,eu-west-1,ap-south-1,eu-south-2"
+
+    def _run(self, *argv):
+        with mock.patch("boto3.Session", lambda **kw: FakeSession()):
+            self.assertEqual(audit.main(list(argv)), 0)
+
+    def test_shards_cover_regions_once(self):
+        regions = self.REGIONS.split(",")
+        parts = [shard_regions(regions, i, 3) for i in (1, 2, 3)]
+        self.assertEqual(sorted(r for part in parts for r in part), sorted(regions))
+        self.assertEqual(parse_shard("2/3"), (2, 3))
+        for bad in ("0/3", "4/3", "x", "1/0"):
+            with self.assertRaises(ValueError):
+                parse_shard(bad)
+
+    def test_merge_matches_single_process_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            docs = tmp / "docs.html"
+            docs.write_text(DOCS_HTML)
+            common = ["--regions", self.REGIONS, "--docs-cache", str(docs)]
+            self._run(*common, "--output-dir", str(tmp / "single"))
+            partials = []
+            for i in (1, 2, 3):
+                out = tmp / f"shard{i}"
+                self._run(*common, "--shard", f"{i}/3", "--output-dir", str(out))
+                partials.append(str(out / f"audit-pcs-partial-{i}-of-3.json"))
+            self._run("merge", *partials, "--output-dir", str(tmp / "merged"))
+            for name in ("audit-pcs-instances.md", "audit-pcs-instances.csv"):
+                self.assertEqual(
+                    (tmp / "merged" / name).read_bytes(),
+                    (tmp / "single" / name).read_bytes(),
+                    name,
+                )
+            with mock.patch("sys.stderr"):
+                self.assertEqual(audit.main(["merge", *partials[:2]]), 1)
+
+
+GATE_MANIFEST = """recipes:
+  - name: arm
+    path: recipes/pcs/arm
+    instances:
+      - {type: c7g.xlarge, role: compute, arch: arm64}
+  - name: efa
+    path: recipes/pcs/efa
+    instances:
+      - {type: hpc7a.48xlarge, role: compute-efa, arch: x86_64}
+"""
+
+
+class GateTest(unittest.TestCase):
+    def test_changed_files_select_recipes(self):
+        paths = {"arm": "recipes/pcs/arm", "efa": "recipes/pcs/efa"}
+        changed = ["recipes/pcs/arm/assets/cluster.yaml", "recipes/pcs/armx/README.md"]
+        self.assertEqual(recipes_for_files(paths, changed), {"arm"})
+        self.assertEqual(recipes_for_files(paths, ["README.md"]), set())
+        manifest = ["scripts/pcs_instance_manifest.yml"]
+        self.assertEqual(recipes_for_files(paths, manifest), {"arm", "efa"})
+
+    def test_plan_checks_only_docs_gaps_most_first(self):
+        specs = [
+            InstanceSpec("a", "c7g.xlarge", "compute", "arm64"),
+            InstanceSpec("a", "hpc7a.48xlarge", "compute-efa", "x86_64"),
+        ]
+        docs = {"us-east-1": {"c7g", "hpc7a"}, "eu-west-1": {"c7g"}, "x-1": set()}
+        plan = plan_gate(specs, ["eu-west-1", "il-central-1", "us-east-1", "x-1"], docs)
+        self.assertEqual([r for r, _ in plan], ["x-1", "eu-west-1"])
+        self.assertEqual([s.type for s in plan[1][1]], ["hpc7a.48xlarge"])
+
+    def _gate(self, *argv):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "manifest.yml"
+            manifest.write_text(GATE_MANIFEST)
+            # The docs page lists neither c7g in us-east-1 nor anything in
+            # eu-south-2; FAKE_OFFERINGS has c7g in us-east-1 only.
+            docs = Path(tmp) / "docs.html"
+            docs.write_text(DOCS_HTML)
+            session = FakeSession()
+            with mock.patch("boto3.Session", lambda **kw: session), mock.patch(
+                "sys.stdout"
+            ) as out, mock.patch("sys.stderr"):
+                rc = audit.main(
+                    ["--gate", "--manifest", str(manifest), "--docs-cache", str(docs)]
+                    + list(argv)
+                )
+        printed = "".join(c.args[0] for c in out.write.call_args_list)
+        return rc, printed, session.calls
+
+    def test_gate_confirms_docs_gaps_with_ec2(self):
+        rc, printed, calls = self._gate(
+            "--regions", "us-east-1", "--changed-recipes", "arm,efa"
+        )
+        self.assertEqual(rc, 0, printed)
+        self.assertIn("Gate passed", printed)
+        self.assertEqual(
+            calls, [("describe_instance_type_offerings", "availability-zone")]
+        )
+
+        rc, printed, _ = self._gate(
+            "--regions", "us-east-1,eu-south-2", "--changed-recipes", "arm"
+        )
+        self.assertEqual(rc, 1)
+        self.assertIn(
+            "Gate FAILED: arm: c7g.xlarge (compute) is not offered in eu-south-2",
+            printed,
+        )
+
+        # Docs-only: the docs gap in us-east-1 is taken at face value.
+        rc, printed, calls = self._gate(
+            "--regions", "us-east-1", "--changed-recipes", "arm", "--no-az"
+        )
+        self.assertEqual((rc, calls), (1, []))
+
+    def test_gate_without_changed_recipes_passes(self):
+        rc, printed, calls = self._gate(
+            "--regions", "us-east-1", "--changed-recipes", "other"
+        )
+        self.assertEqual((rc, calls), (0, []))
+        self.assertIn("no manifest recipe changed", printed)
+
+
+class QueryTest(unittest.TestCase):
+    def _results(self):
+        specs = [
+            InstanceSpec("r1", "c7g.xlarge", "compute", "arm64"),
+            InstanceSpec("r1", "hpc7a.48xlarge", "compute-efa", "x86_64"),
+            InstanceSpec("r2", "c7g.xlarge", "login", "arm64"),
+        ]
+        regions = ["eu-west-1", "us-east-1", "ap-south-1", "il-central-1"]
+        az_results = {
+            r: audit.offerings_for_region(
+                FakeSession(), r, ["c7g.xlarge", "hpc7a.48xlarge"]
+            )
+            for r in ("eu-west-1", "us-east-1")
+        }
+        doc_families = {"ap-south-1": {"c7g"}, "us-east-1": {"c7g", "hpc7a"}}
+        return AuditResults(specs, regions, doc_families, az_results)
+
+    def test_index_queries(self):
+        index = AvailabilityIndex(self._results())
+        self.assertEqual(index.types(recipe="r1"), ["c7g.xlarge", "hpc7a.48xlarge"])
+        self.assertEqual(index.types(recipe="r1", arch="arm64"), ["c7g.xlarge"])
+        self.assertEqual(index.types(role="login"), ["c7g.xlarge"])
+        self.assertEqual(index.types(family="hpc7a"), ["hpc7a.48xlarge"])
+        self.assertEqual(index.types(recipe="nope"), [])
+        r1 = index.types(recipe="r1")
+        # hpc7a is in one us-east-1 AZ; eu-west-1 has AZ data and lacks it;
+        # ap-south-1 docs rule hpc7a out; il-central-1 has no data at all.
+        self.assertEqual(
+            index.regions_for(r1, min_azs=1), (["us-east-1"], ["il-central-1"])
+        )
+        self.assertEqual(index.regions_for(r1, min_azs=2), ([], ["il-central-1"]))
+        self.assertEqual(
+            index.regions_for(["c7g.xlarge"], min_azs=2),
+            (["eu-west-1", "us-east-1"], ["ap-south-1", "il-central-1"]),
+        )
+        self.assertEqual(
+            index.regions_for(["c7g.xlarge"], min_azs=0),
+            (["eu-west-1", "us-east-1", "ap-south-1"], ["il-central-1"]),
+        )
+
+    def test_saved_results_round_trip_and_cli(self):
+        results = self._results()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "results.json"
+            results.save(path)
+            self.assertEqual(AuditResults.load(path), results)
+            with mock.patch("sys.stdout") as out:
+                rc = audit.main(
+                    ["query", "--results", str(path), "--recipe", "r1", "--json"]
+                )
+            self.assertEqual(rc, 0)
+            printed = "".join(c.args[0] for c in out.write.call_args_list)
+            self.assertIn('"regions": ["us-east-1"]', printed)
+
+
+class ServeTest(unittest.TestCase):
+    def _get(self, path, etag=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.server_port)
+        self.addCleanup(conn.close)
+        conn.request("GET", path, headers={"If-None-Match": etag} if etag else {})
+        resp = conn.getresponse()
+        body = resp.read()
+        return resp.status, resp.getheader("ETag"), json.loads(body) if body else None
+
+    def test_refresh_publishes_new_answers_with_etags(self):
+        results = QueryTest._results(self)
+
+        def refresh(results, task):
+            if task != "us-east-1":
+                raise RuntimeError("throttled")
+            avail, az_map, total = results.az_results[task]
+            az_map = dict(az_map, **{"hpc7a.48xlarge": {"us-east-1b", "us-east-1c"}})
+            az_results = dict(results.az_results, **{task: (avail, az_map, total)})
+            return dataclasses.replace(results, az_results=az_results)
+
+        service = AuditService(
+            results, refresh, lambda r: ["us-east-1"], audit.serve_answers, 60
+        )
+        self.server = make_server(service.store, "127.0.0.1", 0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        status, etag, matrix = self._get("/matrix")
+        self.assertEqual(status, 200)
+        col = matrix["regions"].index("us-east-1")
+        hpc7a = next(t for t in matrix["types"] if t["type"] == "hpc7a.48xlarge")
+        self.assertEqual(hpc7a["cells"][col], "1/6")
+        self.assertEqual(self._get("/matrix", etag)[:2], (304, etag))
+        self.assertIn("ap-south-1", self._get("/impact/r1")[2])
+        self.assertEqual(self._get("/diff")[2]["changes"], [])
+
+        service.refresh_task("us-east-1")
+        status, new_etag, matrix = self._get("/matrix", etag)
+        self.assertEqual(status, 200)
+        self.assertNotEqual(new_etag, etag)
+        hpc7a = next(t for t in matrix["types"] if t["type"] == "hpc7a.48xlarge")
+        self.assertEqual(hpc7a["cells"][col], "2/6")
+        changes = self._get("/diff")[2]["changes"]
+        self.assertEqual(
+            changes,
+            [
+                {
+                    "type": "hpc7a.48xlarge",
+                    "region": "us-east-1",
+                    "change": "az-addition",
+                    "was": "1/6",
+                    "now": "2/6",
+                }
+            ],
+        )
+        self.assertEqual(len(self._get("/changes")[2]["changes"]), 1)
+
+        # A failed refresh keeps the last answers and reports the error.
+        service.refresh_task("eu-west-1")
+        self.assertEqual(self._get("/matrix", new_etag)[0], 304)
+        tasks = self._get("/status")[2]["tasks"]
+        self.assertEqual(tasks["eu-west-1"]["error"], "throttled")
+        self.assertIn("seconds", tasks["us-east-1"])
+        status, _, body = self._get("/nope")
+        self.assertEqual(status, 404)
+        self.assertIn("/matrix", body["paths"])
+
+    def test_failed_offerings_query_keeps_the_last_good_data(self):
+        results = QueryTest._results(self)
+        session = _FailingOfferingsSession()
+
+        def az_detail(regions, failures):
+            return audit.audit_az_detail(
+                session,
+                regions,
+                ["c7g.xlarge", "hpc7a.48xlarge"],
+                clients=ClientPool(session),
+                failures=failures,
+            )
+
+        def refresh(results, task):
+            return audit.refresh_region(results, task, az_detail)
+
+        service = AuditService(
+            results, refresh, lambda r: ["us-east-1"], audit.serve_answers, 60
+        )
+        before = service.store.get("/matrix")
+        with mock.patch("sys.stderr", io.StringIO()):
+            service.refresh_task("us-east-1")
+        self.assertIs(service.results, results)
+        self.assertEqual(service.store.get("/matrix"), before)
+        self.assertEqual(service.changes, deque())
+        error = json.loads(service.store.get("/status").body)["tasks"]["us-east-1"]
+        self.assertIn("offerings query failed", error["error"])
+
+
+class _FailingOfferingsEC2(FakeEC2):
+    def describe_instance_type_offerings(self, LocationType, Filters=None):
+        raise RuntimeError("InternalError")
+
+
+class _FailingOfferingsSession(FakeSession):
+    def client(self, service, region_name=None, config=None):
+        return _FailingOfferingsEC2(region_name, self.calls)
+
+
+class TraceTest(unittest.TestCase):
+    def _call(self, tracer, region, attempts):
+        model = mock.Mock()
+        model.name = "DescribeInstanceTypeOfferings"
+        context = {}
+        tracer._before_call(model=model, context=context)
+        for code in attempts:
+            parsed = {"Error": {"Code": code}} if code else {}
+            tracer._response_received(
+                context=context,
+                response_dict={"body": b"x" * 10},
+                parsed_response=parsed,
+            )
+        tracer._make_after_call(region)(context=context, parsed={})
+
+    def test_calls_are_attributed_to_spans_and_regions(self):
+        ticks = iter(range(100))
+        tracer = Tracer(clock=lambda: next(ticks))
+        with tracer.phase("az-detail"):
+            with tracer.span("offerings-query", values=2) as args:
+                self._call(tracer, "us-east-1", ["Throttling", ""])
+                self._call(tracer, "us-east-1", [""])
+            self._call(tracer, "eu-west-1", [""])
+        self.assertEqual(args, {"values": 2, "calls": 2, "retries": 1, "bytes": 30})
+        self.assertEqual(len(tracer.calls), 3)
+        regions = {r["region"]: r for r in tracer.to_json()["regions"]}
+        self.assertEqual(regions["us-east-1"]["throttles"], 1)
+        self.assertEqual(regions["eu-west-1"]["calls"], 1)
+        self.assertIn("phase az-detail", tracer.summary())
+        events = tracer.to_chrome()["traceEvents"]
+        self.assertEqual(
+            sorted(e["cat"] for e in events if e["ph"] == "X"),
+            ["api", "api", "api", "phase", "task"],
+        )
+
+
+class PipelineBenchTest(unittest.TestCase):
+    def test_full_audit_runs_against_fake_aws(self):
+        from scripts.bench_audit_pcs import FakeAwsProfile, bench_pipeline
+
+        profile = FakeAwsProfile(latency_ms=0, jitter_ms=0, throttle_rate=0.1)
+        (row,) = bench_pipeline([4], profile)
+        self.assertEqual(row["exit"], 0)
+        self.assertGreater(row["calls"], 4)
+
+
+class ClientPoolTest(unittest.TestCase):
+    def test_one_client_per_region_across_threads(self):
+        session = FakeSession()
+        made = []
+        real_client = session.client
+
+        def client(service, region_name=None, config=None):
+            made.append((service, region_name))
+            return real_client(service, region_name, config)
+
+        session.client = client
+        pool = ClientPool(session)
+        pool.prewarm("ec2", "us-east-1").join()
+        threads = [
+            threading.Thread(target=pool.client, args=("ec2", r))
+            for r in ["us-east-1", "eu-west-1"] * 8
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(made), [("ec2", "eu-west-1"), ("ec2", "us-east-1")])
+        self.assertIs(pool.client("ec2", "eu-west-1"), pool.client("ec2", "eu-west-1"))
+        self.assertEqual(pool.stats.created, 2)
+        self.assertIn("Clients: 2 created", pool.summary())
+
+    def test_profile_map_routes_regions_to_sessions(self):
+        profiles = ProfileMap(
+            ["aws-us-gov=gov", "me-*=bahrain", "aws-cn=china"], default="main"
+        )
+        self.assertEqual(profiles.profile_for("us-gov-west-1"), "gov")
+        self.assertEqual(profiles.profile_for("cn-north-1"), "china")
+        self.assertEqual(profiles.profile_for("me-south-1"), "bahrain")
+        self.assertEqual(profiles.profile_for("eu-west-1"), "main")
+        self.assertEqual(
+            profiles.discovery_regions(), ["us-east-1", "cn-north-1", "us-gov-west-1"]
+        )
+        with self.assertRaises(ValueError):
+            ProfileMap(["aws-us-gov"])
+
+        sessions = {}
+
+        def session_for(profile_name=None):
+            return sessions.setdefault(profile_name, FakeSession())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            docs = Path(tmp) / "docs.html"
+            docs.write_text(DOCS_HTML)
+            argv = [
+                "--regions",
+                "us-east-1,eu-west-1,us-gov-west-1",
+                "--profile-map",
+                "aws-us-gov=gov",
+                "--docs-cache",
+                str(docs),
+                "--output-dir",
+                tmp,
+            ]
+            with mock.patch("boto3.Session", session_for), mock.patch("sys.stderr"):
+                self.assertEqual(audit.main(argv), 0)
+            report = (Path(tmp) / "audit-pcs-instances.csv").read_text()
+        self.assertEqual(set(sessions), {None, "gov"})
+
+        def az_lookups(session):
+            return {r for op, r in session.calls if op == "describe_availability_zones"}
+
+        self.assertEqual(az_lookups(sessions["gov"]), {"us-gov-west-1"})
+        self.assertEqual(az_lookups(sessions[None]), {"us-east-1", "eu-west-1"})
+        self.assertIn("us-gov-west-1", report)
+
+
+class StartupTest(unittest.TestCase):
+    """python -X importtime checks that offline paths never load AWS libs."""
+
+    AWS_MODULES = ("boto3", "botocore", "urllib.request", "sqlite3")
+
+    def _imports(self, *args):
+        from scripts.bench_audit_pcs import parse_importtime
+
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", *args],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+        return parse_importtime(proc.stderr)
+
+    def test_module_import_is_lightweight(self):
+        imports = self._imports("-c", "import scripts.audit_pcs_instance_availability")
+        for name in self.AWS_MODULES + ("yaml", "concurrent.futures"):
+            self.assertNotIn(name, imports)
+        _, total_us = imports["scripts.audit_pcs_instance_availability"]
+        _, boto3_us = self._imports("-c", "import boto3")["boto3"]
+        self.assertLess(total_us, boto3_us)
+
+    def test_offline_run_does_not_load_aws_libraries(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            docs = Path(tmp) / "docs.html"
+            docs.write_text(DOCS_HTML)
+            imports = self._imports(
+                "-m",
+                "scripts.audit_pcs_instance_availability",
+                "--no-az",
+                "--docs-cache",
+                str(docs),
+                "--regions",
+                "us-east-1,eu-west-1",
+                "--output-dir",
+                tmp,
+            )
+        for name in self.AWS_MODULES:
+            self.assertNotIn(name, imports)
+
+
+class SnapshotDiffTest(unittest.TestCase):
+    SPECS = [
+        audit.InstanceSpec("r1", t, "compute", "x86_64")
+        for t in ["c7g.xlarge", "hpc7a.48xlarge"]
+    ]
+    REGIONS = ["eu-west-1", "us-east-1"]
+
+    def _snapshot(self, doc_families, az_results, created):
+        matrix = audit.AvailabilityMatrix(
+            self.SPECS, self.REGIONS, doc_families, az_results
+        )
+        return audit.snapshot_from_matrix(matrix, created=created)
+
+    def test_diff_reports_only_changed_cells_with_age(self):
+        docs = {"eu-west-1": {"c7g"}, "us-east-1": {"c7g", "hpc7a"}}
+        az = {"us-east-1": ({"c7g.xlarge"}, {"c7g.xlarge": {"a", "b"}}, 3)}
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(Path(tmp))
+            first = self._snapshot(docs, az, created=1_000_000)
+            carry_since(store.latest(), first)
+            store.append(first)
+
+            docs2 = {"eu-west-1": {"c7g", "hpc7a"}, "us-east-1": {"c7g", "hpc7a"}}
+            az2 = {"us-east-1": ({"c7g.xlarge"}, {"c7g.xlarge": {"a"}}, 3)}
+            second = self._snapshot(docs2, az2, created=1_000_000 + 3 * 86400)
+            base = store.resolve("latest")
+            carry_since(base, second)
+            changed = changed_cells(base, second)
+
+            cells = {
+                (second.types[i // 2], second.regions[i % 2]): i for i in changed
+            }
+            self.assertEqual(
+                set(cells),
+                {("hpc7a.48xlarge", "eu-west-1"), ("c7g.xlarge", "us-east-1")},
+            )
+            i = cells[("hpc7a.48xlarge", "eu-west-1")]
+            self.assertEqual(
+                audit.classify_change(
+                    base.kind[i], base.az_count[i], second.kind[i], second.az_count[i]
+                ),
+                "new-launch",
+            )
+            # Unchanged cells keep the original timestamp.
+            self.assertEqual(second.since[second.index(0, 0)], 1_000_000)
+            self.assertEqual(second.since[i], 1_000_000 + 3 * 86400)
+
+            out = Path(tmp) / "diff.md"
+            audit.write_diff_markdown(out, base, second, changed)
+            text = out.read_text()
+            self.assertIn("| regression | `c7g.xlarge` | us-east-1 | 2/3 | 1/3 |", text)
+            self.assertIn("(3d 0h)", text)
+            self.assertEqual(text.count("| new-launch |"), 1)
+
+    def test_first_diff_against_latest_still_saves_a_snapshot(self):
+        docs = {"eu-west-1": {"c7g"}, "us-east-1": {"c7g", "hpc7a"}}
+        results = AuditResults(self.SPECS, self.REGIONS, docs)
+        with tempfile.TemporaryDirectory() as tmp:
+            history = Path(tmp) / "history"
+            with mock.patch("sys.stderr", io.StringIO()) as err:
+                audit.write_reports(
+                    Path(tmp) / "out",
+                    results,
+                    snapshot_dir=str(history),
+                    diff_against="latest",
+                )
+            self.assertIn("no baseline to diff against", err.getvalue())
+            self.assertEqual(len(SnapshotStore(history).paths()), 1)
+            diff_path = Path(tmp) / "out" / "audit-pcs-instances-diff.md"
+            self.assertFalse(diff_path.exists())
+
+    def test_diff_against_latest_needs_snapshot_dir(self):
+        with mock.patch("sys.stderr", io.StringIO()):
+            with self.assertRaises(SystemExit):
+                audit.parse_args(["--diff-against", "latest"])
+
+    def test_collision_suffixes_sort_after_their_run(self):
+        docs = {"eu-west-1": {"c7g"}, "us-east-1": {"c7g", "hpc7a"}}
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SnapshotStore(Path(tmp))
+            for n in range(11):
+                snap = self._snapshot(docs, {}, created=1_000_000 + n)
+                snap.run_id = "20260101T000000Z"
+                store.append(snap)
+            names = [p.name.split(".snap")[0] for p in store.paths()]
+            self.assertEqual(
+                names,
+                ["20260101T000000Z"] + [f"20260101T000000Z.{n}" for n in range(2, 12)],
+            )
+            self.assertEqual(store.latest().run_id, "20260101T000000Z.11")
+
+
+DOCS_HTML = """<html><head><script>var x = "<p>General Purpose: Bogus</p>";</script>
+<style>p { color: red; }</style></head><body>
+<h2>US East (N. Virginia) &mdash; us-east-1</h2>
+<p>The following instance types are offered in this Region.</p>
+<p>General Purpose: M7g | T2 | Mac-m4pro Compute Optimized: C7i-flex | Hpc7a</p>
+<p>Accelerated Computing: <code>P5</code> | <code>P6-B200</code></p>
+<h2>Europe (Spain) &#x2014; eu-south-2</h2>
+<p>Memory Optimized: R7g, X2gd</p>
+<h2>AWS GovCloud (US-West) - us-gov-west-1</h2><p>High Performance Computing: Hpc6a<br>
+Previous Generation: M4</p></body></html>
+"""
+
+
+class DocsParserTest(unittest.TestCase):
+    EXPECTED = {
+        "us-east-1": {"m7g", "t2", "mac-m4pro", "c7i-flex", "hpc7a", "p5", "p6-b200"},
+        # Lists with characters outside the family alphabet are ignored.
+        "eu-south-2": set(),
+        "us-gov-west-1": {"hpc6a", "m4"},
+    }
+
+    def test_scrape_doc_families(self):
+        self.assertEqual(audit.scrape_doc_families(html=DOCS_HTML), self.EXPECTED)
+
+    def test_result_does_not_depend_on_chunk_boundaries(self):
+        raw = DOCS_HTML.encode()
+        for size in (1, 7, 64):
+            chunks = audit._decode_chunks(
+                raw[i : i + size] for i in range(0, len(raw), size)
+            )
+            self.assertEqual(audit.scrape_doc_families(chunks=chunks), self.EXPECTED)
+
+    def test_long_hyphenated_line_parses_quickly(self):
+        from scripts.bench_audit_pcs import long_line_docs_page
+
+        families = audit.scrape_doc_families(html=long_line_docs_page(50_000))
+        self.assertEqual(set(families), {"eu-west-1"})
+
+
+class _DocsHandler(BaseHTTPRequestHandler):
+    """Serves DOCS_HTML with an ETag; honours If-None-Match unless told not to."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        etag = '"v1"'
+        if server.honour_etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = DOCS_HTML.encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DocsPageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _DocsHandler)
+        self.server.requests = []
+        self.server.honour_etag = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/ec2-instance-regions.html"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.parses = 0
+
+    def _fetch(self, parser_version=audit.DOCS_PARSER_VERSION):
+        def parse(chunks):
+            self.parses += 1
+            return audit.scrape_doc_families(chunks=audit._decode_chunks(chunks))
+
+        return DocsPageCache(Path(self.tmp.name)).fetch_families(
+            self.url, parse, parser_version
+        )
+
+    def test_second_fetch_is_conditional_and_not_reparsed(self):
+        first = self._fetch()
+        second = self._fetch()
+        self.assertEqual(first.status, "downloaded")
+        self.assertEqual(second.status, "not-modified")
+        self.assertEqual(second.families, DocsParserTest.EXPECTED)
+        self.assertEqual(self.parses, 1)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+
+    def test_same_hash_reuses_parse_when_server_ignores_validators(self):
+        self.server.honour_etag = False
+        self._fetch()
+        again = self._fetch()
+        self.assertEqual(again.status, "unchanged-hash")
+        self.assertFalse(again.parsed)
+        self.assertEqual(self.parses, 1)
+
+    def test_new_parser_version_reparses_an_unchanged_page(self):
+        self._fetch()
+        again = self._fetch(parser_version=audit.DOCS_PARSER_VERSION + 1)
+        self.assertEqual(again.status, "not-modified")
+        self.assertTrue(again.parsed)
+        self.assertEqual(self.parses, 2)
+
+
+CFN_TEMPLATE = """\
+Parameters:
+  NodeArchitecture:
+    Type: String
+    Default: x86
+    AllowedValues: [x86, Graviton]
+  LoginInstanceType:
+    Type: String
+    Default: t3.large
+Mappings:
+  Architecture:
+    ComputeNodeInstances:
+      x86: c7i.xlarge
+      Graviton: c7g.xlarge
+      HPC: hpc7a.48xlarge
+  Overrides:
+    eu-south-1:
+      x86: c6i.xlarge
+Resources:
+  LoginNodeGroup:
+    Type: AWS::PCS::ComputeNodeGroup
+    Properties:
+      Name: !Sub '${AWS::StackName}-login'
+      InstanceConfigs:
+        - InstanceType: !Ref LoginInstanceType
+  ComputeNodeGroup:
+    Type: AWS::PCS::ComputeNodeGroup
+    Properties:
+      InstanceConfigs:
+        - InstanceType: !FindInMap
+            - Overrides
+            - !Ref AWS::Region
+            - !Ref NodeArchitecture
+            - DefaultValue: !FindInMap [Architecture, ComputeNodeInstances, !Ref NodeArchitecture]
+  EfaNodeGroup:
+    Type: AWS::PCS::ComputeNodeGroup
+    Properties:
+      InstanceConfigs:
+        - InstanceType: !FindInMap [Architecture, ComputeNodeInstances, HPC]
+  Infra:
+    Type: AWS::ImageBuilder::InfrastructureConfiguration
+    Properties:
+      InstanceTypes: ['m7g.4xlarge', !GetAtt Other.Type]
+"""
+
+
+class ManifestIndexTest(unittest.TestCase):
+    def test_cfn_tags_load_as_long_form(self):
+        t = load_template("A: !Ref X\nB: !GetAtt R.Arn\nC: !Sub 'x'\n")
+        self.assertEqual(t["A"], {"Ref": "X"})
+        self.assertEqual(t["B"], {"Fn::GetAtt": ["R", "Arn"]})
+        self.assertEqual(t["C"], {"Fn::Sub": "x"})
+
+    def test_extract_follows_refs_and_mappings(self):
+        found = {
+            (i["type"], i["role"], i["arch"])
+            for i in extract_instance_types(load_template(CFN_TEMPLATE))
+        }
+        self.assertEqual(
+            found,
+            {
+                ("t3.large", "login", "x86_64"),
+                ("c6i.xlarge", "compute", "x86_64"),
+                ("c7i.xlarge", "compute", "x86_64"),
+                ("c7g.xlarge", "compute", "arm64"),
+                ("hpc7a.48xlarge", "compute-efa", "x86_64"),
+                ("m7g.4xlarge", "imagebuilder", "arm64"),
+            },
+        )
+
+    def test_drift_and_content_hash_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "r").mkdir()
+            (root / "r" / "cluster.yaml").write_text(CFN_TEMPLATE)
+            (root / "r" / "main.tf").write_text("")
+            recipes = [
+                {
+                    "name": "r",
+                    "path": "r",
+                    "files": ["cluster.yaml"],
+                    "instances": [
+                        {"type": "c7i.xlarge", "role": "compute", "arch": "x86_64"},
+                        {"type": "c5.xlarge", "role": "compute", "arch": "x86_64"},
+                    ],
+                },
+                {"name": "tf", "path": "r", "files": ["main.tf"], "instances": []},
+            ]
+            index = TemplateIndex(cache_dir=root / "cache", jobs=1)
+            drift, tf = compare_manifest(recipes, index, repo_root=root)
+            self.assertEqual(drift.stale, ["c5.xlarge"])
+            self.assertIn("hpc7a.48xlarge", drift.missing)
+            self.assertNotIn("c7i.xlarge", drift.missing)
+            self.assertTrue(drift.drifted)
+            self.assertTrue(tf.skipped)
+            self.assertFalse(tf.drifted)
+            self.assertEqual(index.stats.parsed, 1)
+
+            again = TemplateIndex(cache_dir=root / "cache", jobs=1)
+            compare_manifest(recipes, again, repo_root=root)
+            self.assertEqual((again.stats.parsed, again.stats.cached), (0, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Unit tests for scripts/instance_region.py.
+
+Run with:
+  python -m unittest scripts.test_instance_region
+"""
+import fnmatch
+import io
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from scripts import instance_region
+from scripts.audit_pcs_clients import ClientPool
+
+# region -> instance types offered there
+OFFERINGS = {
+    "us-east-1": ["c7g.xlarge", "hpc7a.48xlarge"],
+    "eu-west-1": ["c7g.xlarge"],
+}
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, LocationType, Filters):
+        region = self.client.region
+        self.client.calls.append(("describe_instance_type_offerings", region))
+        patterns = Filters[0]["Values"]
+        yield {
+            "InstanceTypeOfferings": [
+                {"InstanceType": t, "Location": region}
+                for t in OFFERINGS.get(region, [])
+                if any(fnmatch.fnmatchcase(t, p) for p in patterns)
+            ]
+        }
+
+
+class FakeEC2:
+    def __init__(self, region, calls):
+        self.region = region
+        self.calls = calls
+
+    def get_paginator(self, name):
+        return FakePaginator(self)
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def client(self, service, region_name=None, config=None):
+        return FakeEC2(region_name, self.calls)
+
+
+class _OptInEC2(FakeEC2):
+    def get_paginator(self, name):
+        if self.region == "il-central-1":
+            raise ClientError(
+                {"Error": {"Code": "OptInRequired", "Message": "opt in"}}, name
+            )
+        if self.region == "us-gov-west-1":
+            raise EndpointConnectionError(
+                endpoint_url="https://ec2.us-gov-west-1.amazonaws.com"
+            )
+        return super().get_paginator(name)
+
+
+class _OptInSession(FakeSession):
+    def client(self, service, region_name=None, config=None):
+        return _OptInEC2(region_name, self.calls)
+
+
+class InstanceRegionTest(unittest.TestCase):
+    def test_batched_lookup_separates_inaccessible_from_not_offered(self):
+        session = _OptInSession()
+        with mock.patch("boto3.Session", lambda **kw: session), mock.patch(
+            "sys.stdout", new_callable=io.StringIO
+        ) as out, mock.patch("sys.stderr"):
+            rc = instance_region.main(
+                [
+                    "c7g.xlarge,hpc7*",
+                    "m9.large",
+                    "--regions",
+                    "us-east-1,eu-west-1,il-central-1,us-gov-west-1",
+                    "--format",
+                    "json",
+                ]
+            )
+        self.assertEqual(rc, 1)  # m9.large is offered nowhere
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            report["availability"],
+            {
+                "c7g.xlarge": ["eu-west-1", "us-east-1"],
+                "hpc7a.48xlarge": ["us-east-1"],
+                "m9.large": [],
+            },
+        )
+        self.assertEqual(report["inaccessible"], ["il-central-1", "us-gov-west-1"])
+        # One multi-value query per reachable region, whatever the type count.
+        self.assertEqual(len(session.calls), 2)
+
+    def test_csv_rows(self):
+        results = {
+            "us-east-1": instance_region.RegionResult("us-east-1", offered={"a.x"}),
+            "eu-west-1": instance_region.RegionResult("eu-west-1", "error"),
+        }
+        out = io.StringIO()
+        instance_region.write_csv(out, ["a.x"], results)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            [
+                "instance_type,region,status",
+                "a.x,eu-west-1,error",
+                "a.x,us-east-1,available",
+            ],
+        )
+
+
+class _SlowEC2(FakeEC2):
+    release = None  # threading.Event the slow region waits for
+
+    def get_paginator(self, name):
+        if self.region == "us-east-1":
+            self.release.wait(5)
+        return super().get_paginator(name)
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        _SlowEC2.release = threading.Event()
+        self.addCleanup(_SlowEC2.release.set)
+        session = FakeSession()
+        session.client = lambda service, region_name=None, config=None: _SlowEC2(
+            region_name, session.calls
+        )
+        self.clients = ClientPool(session)
+
+    def test_returns_best_region_without_waiting_for_worse_ones(self):
+        # ap-south-1 offers nothing; eu-west-1 has c7g; us-east-1 never answers.
+        region, answered = instance_region.resolve_region(
+            self.clients, ["ap-south-1", "eu-west-1", "us-east-1"], ["c7g.*"]
+        )
+        self.assertEqual(region, "eu-west-1")
+        self.assertNotIn("us-east-1", answered)
+        rows = instance_region.resolve_rows(
+            ["ap-south-1", "eu-west-1", "us-east-1"], answered, ["c7g.*"]
+        )
+        self.assertEqual(
+            [status for _, _, status in rows], ["not-offered", "available", "cancelled"]
+        )
+
+    def test_waits_for_a_better_region_still_in_flight(self):
+        threading.Timer(0.2, _SlowEC2.release.set).start()
+        region, _ = instance_region.resolve_region(
+            self.clients, ["us-east-1", "eu-west-1"], ["c7g.xlarge", "hpc7a.48xlarge"]
+        )
+        self.assertEqual(region, "us-east-1")
+        region, _ = instance_region.resolve_region(
+            self.clients, ["eu-west-1", "ap-south-1"], ["hpc7a.48xlarge"]
+        )
+        self.assertIsNone(region)
+
+    def test_preference_file_ranks_by_latency(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "prefs.yaml"
+            path.write_text(
+                "regions:\n"
+                "  - {code: eu-north-1, latency_ms: 95}\n"
+                "  - {code: ap-south-1}\n"
+                "  - {code: us-east-2, latency_ms: 11}\n"
+            )
+            self.assertEqual(
+                instance_region.load_preference(path),
+                ["us-east-2", "eu-north-1", "ap-south-1"],
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
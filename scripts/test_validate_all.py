@@ -0,0 +1,118 @@
+"""Unit tests for the recipe validators (scripts/validate_all.py and the
+repo index and checks it runs).
+
+Run with:
+  python -m unittest scripts.test_validate_all
+"""
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from scripts import repo_index, utils, validate_all
+from scripts import validate_shellcheck, validate_structure
+from scripts.validate_cache import ResultCache
+
+
+class RepoIndexTest(unittest.TestCase):
+    def test_scan_records_every_entry_once(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            (root / "ns" / "r1" / "assets").mkdir(parents=True)
+            (root / "ns" / "r1" / "metadata.yml").write_text("name: r1\n")
+            (root / "ns" / "r1" / "assets" / "main.yaml").write_text("x: 1\n")
+            index = repo_index.scan(root)
+            self.assertEqual(len(index), 5)
+            meta = index.get(root / "ns" / "r1" / "metadata.yml")
+            self.assertEqual((meta.kind, meta.size), (repo_index.FILE, 9))
+            self.assertTrue(index.is_dir(root / "ns" / "r1" / "assets"))
+            self.assertFalse(index.is_file(root / "ns" / "r1" / "assets"))
+            self.assertEqual(
+                index.files(suffixes={".yaml"}),
+                [root / "ns" / "r1" / "assets" / "main.yaml"],
+            )
+            self.assertEqual(
+                validate_structure.find_recipe_dirs(index), [root / "ns" / "r1"]
+            )
+
+    def test_symlinked_dirs_are_dirs_but_not_walked(self):
+        with tempfile.TemporaryDirectory() as d:
+            root = Path(d)
+            (root / "shared" / "docs").mkdir(parents=True)
+            (root / "shared" / "docs" / "README.md").write_text("x\n")
+            (root / "r1").mkdir()
+            (root / "r1" / "docs").symlink_to(root / "shared" / "docs")
+            index = repo_index.scan(root)
+            self.assertTrue(index.is_dir(root / "r1" / "docs"))
+            self.assertEqual(
+                index.files(name="README.md"), [root / "shared" / "docs" / "README.md"]
+            )
+
+    def test_checks_select_what_rglob_found(self):
+        index = repo_index.scan()
+        self.assertEqual(
+            validate_structure.find_recipe_dirs(index),
+            sorted(m.parent for m in utils.RECIPES.rglob("metadata.yml")),
+        )
+        strict, advisory = validate_shellcheck.find_shell_scripts(index)
+        self.assertEqual(
+            sorted(strict + advisory),
+            sorted(
+                p
+                for p in utils.RECIPES.rglob("*.sh")
+                if "/.terraform/" not in p.as_posix()
+            ),
+        )
+
+    def test_run_continues_past_a_failed_check(self):
+        calls = []
+        checks = [
+            ("first", lambda index, cache: calls.append("first") or 1),
+            ("second", lambda index, cache: calls.append("second") or 0),
+        ]
+        with mock.patch("sys.stdout", io.StringIO()):
+            failed = validate_all.run(repo_index.RepoIndex(".", []), checks)
+        self.assertEqual(failed, ["first"])
+        self.assertEqual(calls, ["first", "second"])
+
+
+class ValidateCacheTest(unittest.TestCase):
+    META = utils.RECIPES / "pcs" / "nice_dcv" / "metadata.yml"
+
+    def test_results_are_reused_until_the_key_changes(self):
+        index = repo_index.scan(self.META.parent)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return [(1, "finding")]
+
+        with tempfile.TemporaryDirectory() as d:
+            path = Path(d) / "cache.json"
+            cache = ResultCache(path, index)
+            self.assertEqual(cache.get("c", 1, self.META, compute), [(1, "finding")])
+            cache.save()
+            cache = ResultCache(path, index)
+            self.assertEqual(cache.get("c", 1, self.META, compute), [[1, "finding"]])
+            cache.get("c", 2, self.META, compute)  # validator version bumped
+            cache.get("c", 2, self.META, compute, salt="tool 0.2")
+            self.assertEqual(len(calls), 3)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_since_selects_touched_recipes(self):
+        index = repo_index.scan()
+        touched = validate_all.touched_recipes(
+            index, ["recipes/pcs/nice_dcv/metadata.yml", "docs/TESTING.md"]
+        )
+        self.assertEqual(touched, [self.META.parent])
+        within = index.within(touched)
+        self.assertEqual(within.dirs(name="nice_dcv"), [self.META.parent])
+        self.assertEqual(within.files(name="metadata.yml"), [self.META])
+        self.assertIsNone(
+            validate_all.touched_recipes(index, ["config/metadata/values.yml"])
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""Run every recipe validator over one scan of recipes/ (`make validate`).
+
+The tree is walked once (see repo_index) and each validator's check()
+reads the files it needs from that index, all in one interpreter. Every
+check runs even if an earlier one fails, so one run reports everything;
+the exit status is non-zero if any blocking check failed.
+
+Per-file results are cached between runs (see validate_cache), so only
+files that changed since the last run are checked again; --no-cache
+turns this off. --since REF narrows the run to the recipes with files
+changed since REF, committed or not.
+
+cfn-lint is advisory here, as it has always been in `make validate`: its
+findings are printed but never fail the run, and a missing cfn-lint is
+skipped with a warning. Its results are not cached.
+"""
+import argparse
+import re
+import shutil
+import subprocess
+import sys
+
+from . import (
+    repo_index,
+    utils,
+    validate_metadata,
+    validate_partitions,
+    validate_shellcheck,
+    validate_structure,
+)
+from .validate_cache import DEFAULT_CACHE_PATH, ResultCache
+
+CFN_TEMPLATE_MARKER = re.compile(r"AWSTemplateFormatVersion|^Resources:", re.MULTILINE)
+
+
+def find_cfn_templates(index):
+    """CloudFormation templates: YAML files anywhere under an assets/ dir."""
+    templates = []
+    for path in index.files(suffixes={".yaml", ".yml"}):
+        if "assets" not in path.relative_to(index.root).parts[:-1]:
+            continue
+        try:
+            text = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+        if CFN_TEMPLATE_MARKER.search(text):
+            templates.append(path)
+    return templates
+
+
+def check_cfn_lint(index, cache=None):
+    """Run cfn-lint over every template in index; advisory, always 0."""
+    templates = find_cfn_templates(index)
+    if not templates:
+        print("No CFN templates found.")
+        return 0
+    if shutil.which("cfn-lint") is None:
+        print("WARNING: cfn-lint is not installed. Skipping.")
+        return 0
+    sys.stdout.flush()
+    subprocess.run(["cfn-lint", "-t", *map(str, templates)])
+    return 0
+
+
+CHECKS = [
+    ("Validating recipe structure", validate_structure.check),
+    ("Validating recipe metadata", validate_metadata.check),
+    ("Checking partition safety", validate_partitions.check),
+    (
+        "Running ShellCheck (strict: pcs-scripts, advisory: others)",
+        validate_shellcheck.check,
+    ),
+    ("Running cfn-lint", check_cfn_lint),
+]
+
+
+# Changes to the validators or the metadata config can change any recipe's
+# result, so they select every recipe.
+GLOBAL_PREFIXES = (
+    "config/",
+    "scripts/repo_index.py",
+    "scripts/utils.py",
+    "scripts/validate_",
+)
+
+
+def git_changed_files(ref):
+    """Repo-relative paths changed since ref: committed, staged, unstaged
+    and untracked."""
+    commands = [
+        ["git", "diff", "--name-only", ref, "--"],
+        ["git", "ls-files", "--others", "--exclude-standard"],
+    ]
+    files = []
+    for cmd in commands:
+        proc = subprocess.run(cmd, cwd=utils.REPO, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise ValueError(
+                f"cannot list files changed since {ref}: {proc.stderr.strip()}"
+            )
+        files.extend(line for line in proc.stdout.splitlines() if line)
+    return files
+
+
+def touched_recipes(index, files):
+    """Recipe dirs containing any of files, or None if every recipe is."""
+    if any(f.startswith(GLOBAL_PREFIXES) for f in files):
+        return None
+    recipe_dirs = validate_structure.find_recipe_dirs(index)
+    paths = [utils.REPO / f for f in files]
+    return [d for d in recipe_dirs if any(d in p.parents for p in paths)]
+
+
+def run(index, checks=CHECKS, cache=None):
+    """Run checks over index in order; return the names of those that failed."""
+    failed = []
+    for title, check in checks:
+        print(f"=== {title} ===")
+        if check(index, cache) != 0:
+            failed.append(title)
+        print("")
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run every recipe validator over one scan of recipes/."
+    )
+    parser.add_argument(
+        "--since",
+        metavar="REF",
+        help="Only check recipes with files changed since this git ref, "
+        "including uncommitted and untracked files. A change to the "
+        "validators or config/ checks every recipe.",
+    )
+    parser.add_argument(
+        "--cache",
+        default=str(DEFAULT_CACHE_PATH),
+        help="Result cache file (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Check every file again, without reading or writing the cache.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    index = repo_index.scan()
+    if args.since:
+        try:
+            touched = touched_recipes(index, git_changed_files(args.since))
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            sys.exit(2)
+        if touched is None:
+            print(f"Validators or config changed since {args.since}: checking all.")
+        elif not touched:
+            print(f"No recipe changed since {args.since}; nothing to validate.")
+            return
+        else:
+            print(f"Checking {len(touched)} recipe(s) changed since {args.since}:")
+            for d in touched:
+                print(f"  {d.relative_to(utils.REPO)}")
+            index = index.within(touched)
+        print("")
+    cache = None if args.no_cache else ResultCache(args.cache, index)
+    failed = run(index, cache=cache)
+    if cache is not None:
+        cache.save()
+        print(cache.summary())
+    if failed:
+        print(f"=== Validation FAILED: {'; '.join(failed)} ===")
+        sys.exit(1)
+    print("=== All validation complete ===")
+
+
+if __name__ == "__main__":
+    main()
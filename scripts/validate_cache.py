@@ -0,0 +1,103 @@
+"""Persistent per-file result cache for the recipe validators.
+
+Editing one recipe should not mean re-parsing every metadata.yml,
+re-scanning every template and re-running ShellCheck on every script.
+validate_all keeps each per-file result in a JSON cache between runs.
+A result is reused only while its key is unchanged. The key covers the
+check's name and CACHE_VERSION, a salt (the ShellCheck version and
+severity, or the namespace list the metadata check depends on) and the
+sha256 of the file's content.
+
+Hashing every file on every run would cost a read per file, so each
+file's hash is stored with the size and mtime the repo index recorded
+for it. The file is re-read only when either of them changes.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from . import utils
+
+DEFAULT_CACHE_PATH = Path.joinpath(utils.REPO, ".validate-cache.json")
+
+# Bump to discard every existing cache file (e.g. when its layout changes).
+FORMAT = 1
+
+
+class ResultCache:
+    """Check results by (check, file), valid while the file's key holds."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, index=None):
+        self.path = Path(path)
+        self.index = index
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}  # repo-relative path -> [size, mtime, sha256]
+        self._results = {}  # "check:path" -> [key, result]
+        self._load()
+
+    def _load(self):
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("format") != FORMAT:
+            return
+        self._digests = data.get("digests", {})
+        self._results = data.get("results", {})
+
+    def digest(self, path):
+        """sha256 of path's content, reusing the stored one while the
+        index shows the same size and mtime."""
+        rel = Path(path).relative_to(utils.REPO).as_posix()
+        entry = self.index.get(path) if self.index is not None else None
+        stamp = [entry.size, entry.mtime] if entry is not None else None
+        known = self._digests.get(rel)
+        if stamp is not None and known and known[:2] == stamp:
+            return known[2]
+        sha = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+        if stamp is not None:
+            self._digests[rel] = stamp + [sha]
+        return sha
+
+    def get(self, check, version, path, compute, salt=""):
+        """The cached result of compute() for path, or compute()'s result.
+
+        Results round-trip through JSON, so tuples come back as lists.
+        """
+        try:
+            digest = self.digest(path)
+        except OSError:
+            return compute()  # unreadable; let the check report it
+        key = hashlib.sha256(
+            "\0".join([check, str(version), salt, digest]).encode()
+        ).hexdigest()
+        slot = f"{check}:{Path(path).relative_to(utils.REPO).as_posix()}"
+        cached = self._results.get(slot)
+        if cached and cached[0] == key:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        result = compute()
+        self._results[slot] = [key, result]
+        return result
+
+    def save(self):
+        data = {"format": FORMAT, "digests": self._digests, "results": self._results}
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, sort_keys=True))
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        return (
+            f"Cache: {self.hits} result(s) reused, {self.misses} recomputed "
+            f"({self.path.name})"
+        )
+
+
+def cached(cache, check, version, path, compute, salt=""):
+    """compute() through cache, or directly when there is no cache."""
+    if cache is None:
+        return compute()
+    return cache.get(check, version, path, compute, salt)
@@ -3,10 +3,14 @@ import sys
 import yaml
 import semver
 from pathlib import Path
-from . import utils
+from . import repo_index, utils
+from .validate_cache import cached
 
 REQUIRED_FIELDS = ["name", "version", "description", "tags", "type"]
 
+# Bump when validate_one changes, so cached results are recomputed.
+CACHE_VERSION = 1
+
 
 def load_valid_namespaces():
     config = utils.load_config()
@@ -43,22 +47,38 @@ def validate_one(meta_path, valid_namespaces):
     return errors
 
 
-def main():
-    valid_namespaces = load_valid_namespaces()
-    meta_files = sorted(utils.RECIPES.rglob("metadata.yml"))
+def check(index, cache=None):
+    """Report on every metadata.yml in index; return the exit status."""
+    meta_files = index.files(name="metadata.yml")
     if not meta_files:
         print("WARNING: No metadata.yml files found.")
-        sys.exit(0)
+        return 0
+    valid_namespaces = load_valid_namespaces()
+    salt = ",".join(sorted(valid_namespaces))
     all_errors = []
     for mf in meta_files:
-        all_errors.extend(validate_one(mf, valid_namespaces))
+        all_errors.extend(
+            cached(
+                cache,
+                "metadata",
+                CACHE_VERSION,
+                mf,
+                lambda: validate_one(mf, valid_namespaces),
+                salt,
+            )
+        )
     if all_errors:
         print(f"Metadata validation FAILED ({len(all_errors)} errors):")
         for e in all_errors:
             print(f"  ERROR: {e}")
-        sys.exit(1)
-    else:
-        print(f"Metadata validation passed: {len(meta_files)} files OK.")
+        return 1
+    print(f"Metadata validation passed: {len(meta_files)} files OK.")
+    return 0
+
+
+def main():
+    sys.exit(check(repo_index.scan()))
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,21 @@ Lines with '# partition-exception:' are excluded.
 import re
 import sys
 from pathlib import Path
-from . import utils
+from . import repo_index, utils
+from .validate_cache import cached
 
 HARDCODED_ARN = re.compile(r'arn:aws:')
 PARTITION_SUB = re.compile(r'arn:\$\{AWS::Partition\}:')
 EXCEPTION_MARKER = "partition-exception:"
+CFN_SUFFIXES = {".yaml", ".yml", ".json"}
 
+# Bump when check_file changes, so cached results are recomputed.
+CACHE_VERSION = 1
 
-def find_cfn_files():
-    patterns = ["*.yaml", "*.yml", "*.json"]
-    files = []
-    for asset_dir in utils.RECIPES.rglob("assets"):
-        if asset_dir.is_dir():
-            for pat in patterns:
-                files.extend(asset_dir.glob(pat))
-    return sorted(files)
+
+def find_cfn_files(index):
+    """YAML/JSON files directly inside an assets/ directory."""
+    return [f for f in index.files(suffixes=CFN_SUFFIXES) if f.parent.name == "assets"]
 
 
 def check_file(filepath):
@@ -40,15 +40,19 @@ def check_file(filepath):
     return violations
 
 
-def main():
-    cfn_files = find_cfn_files()
+def check(index, cache=None):
+    """Report on every template in index; return the exit status."""
+    cfn_files = find_cfn_files(index)
     if not cfn_files:
         print("WARNING: No CloudFormation template files found.")
-        sys.exit(0)
+        return 0
     all_violations = []
     for fp in cfn_files:
         rel = fp.relative_to(utils.REPO)
-        for lineno, line in check_file(fp):
+        violations = cached(
+            cache, "partitions", CACHE_VERSION, fp, lambda: check_file(fp)
+        )
+        for lineno, line in violations:
             all_violations.append(f"{rel}:{lineno}: {line}")
     if all_violations:
         print(f"Partition safety FAILED ({len(all_violations)} violations):")
@@ -56,9 +60,14 @@ def main():
         print("To suppress: add '# partition-exception: <reason>'\n")
         for v in all_violations:
             print(f"  {v}")
-        sys.exit(1)
-    else:
-        print(f"Partition safety passed: {len(cfn_files)} files scanned.")
+        return 1
+    print(f"Partition safety passed: {len(cfn_files)} files scanned.")
+    return 0
+
+
+def main():
+    sys.exit(check(repo_index.scan()))
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -22,7 +22,8 @@ import subprocess
 import sys
 from pathlib import Path
 
-from . import utils
+from . import repo_index, utils
+from .validate_cache import cached
 
 # Scripts under this path must pass ShellCheck cleanly.
 STRICT_PREFIX = Path.joinpath(utils.RECIPES, "pcs-scripts")
@@ -33,11 +34,15 @@ ADVISORY_SEVERITY = "warning"
 # Path fragments to skip entirely (vendored or generated code).
 SKIP_FRAGMENTS = ("/.terraform/",)
 
+# Bump when the way scripts are checked changes, so cached results are
+# recomputed. The ShellCheck version is part of every cache key as well.
+CACHE_VERSION = 1
 
-def find_shell_scripts():
-    """Return (strict, advisory) lists of *.sh paths under recipes/."""
+
+def find_shell_scripts(index):
+    """Return (strict, advisory) lists of *.sh paths in index."""
     strict, advisory = [], []
-    for path in sorted(utils.RECIPES.rglob("*.sh")):
+    for path in index.files(suffixes={".sh"}):
         posix = path.as_posix()
         if any(frag in posix for frag in SKIP_FRAGMENTS):
             continue
@@ -59,24 +64,42 @@ def run_shellcheck(path, severity=None):
     return proc.returncode == 0, (proc.stdout + proc.stderr).strip()
 
 
-def main():
-    strict, advisory = find_shell_scripts()
+def shellcheck_version():
+    """`shellcheck --version` output, to key cached results by."""
+    proc = subprocess.run(["shellcheck", "--version"], capture_output=True, text=True)
+    return proc.stdout.strip()
+
+
+def check(index, cache=None):
+    """Check every shell script in index; return the exit status."""
+    strict, advisory = find_shell_scripts(index)
 
     if shutil.which("shellcheck") is None:
         msg = "ShellCheck is not installed."
         if os.environ.get("SHELLCHECK_OPTIONAL") == "1":
             print(f"WARNING: {msg} Skipping (SHELLCHECK_OPTIONAL=1).")
-            sys.exit(0)
+            return 0
         print(f"ERROR: {msg} Install it to enforce the pcs-scripts gate.")
         print("  Debian/Ubuntu: apt-get install -y shellcheck")
         print("  macOS: brew install shellcheck")
         print("  Or set SHELLCHECK_OPTIONAL=1 to skip locally.")
-        sys.exit(1)
+        return 1
+    version = shellcheck_version() if cache is not None else ""
+
+    def shellcheck(path, severity=None):
+        return cached(
+            cache,
+            "shellcheck",
+            CACHE_VERSION,
+            path,
+            lambda: run_shellcheck(path, severity=severity),
+            f"{version}\0{severity or ''}",
+        )
 
     # --- Advisory tier: report warning+ findings, never fail ----------------
     advisory_hits = 0
     for path in advisory:
-        ok, output = run_shellcheck(path, severity=ADVISORY_SEVERITY)
+        ok, output = shellcheck(path, severity=ADVISORY_SEVERITY)
         if not ok and output:
             advisory_hits += 1
             rel = path.relative_to(utils.REPO)
@@ -98,7 +121,7 @@ def main():
     # --- Strict tier: any finding fails the build ---------------------------
     strict_failures = []
     for path in strict:
-        ok, output = run_shellcheck(path)
+        ok, output = shellcheck(path)
         if not ok:
             rel = path.relative_to(utils.REPO)
             strict_failures.append((rel, output))
@@ -110,9 +133,15 @@ def main():
             print(f"  {rel}")
             for line in output.splitlines():
                 print(f"    {line}")
-        sys.exit(1)
+        return 1
 
     print(f"ShellCheck passed: {len(strict)} script(s) in pcs-scripts are clean.")
+    return 0
+
+
+def main():
+    sys.exit(check(repo_index.scan()))
 
 
-main()
+if __name__ == "__main__":
+    main()
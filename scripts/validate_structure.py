@@ -1,46 +1,52 @@
 """Validate that every recipe directory has required files and subdirs."""
 import sys
 from pathlib import Path
-from . import utils
+from . import repo_index, utils
 
 REQUIRED_FILES = ["README.md", "metadata.yml", "Makefile"]
 REQUIRED_DIRS = ["assets", "docs", "tests"]
 
 
-def find_recipe_dirs():
-    recipes = []
-    for meta in utils.RECIPES.rglob("metadata.yml"):
-        recipes.append(meta.parent)
-    return sorted(recipes)
+def find_recipe_dirs(index):
+    return sorted(meta.parent for meta in index.files(name="metadata.yml"))
 
 
-def validate_recipe(recipe_dir):
+def validate_recipe(recipe_dir, index):
     errors = []
     rel = recipe_dir.relative_to(utils.REPO)
     for f in REQUIRED_FILES:
-        if not (recipe_dir / f).is_file():
+        if not index.is_file(recipe_dir / f):
             errors.append(f"{rel}: missing required file '{f}'")
     for d in REQUIRED_DIRS:
-        if not (recipe_dir / d).is_dir():
+        if not index.is_dir(recipe_dir / d):
             errors.append(f"{rel}: missing required directory '{d}/'")
     return errors
 
 
-def main():
-    recipe_dirs = find_recipe_dirs()
+def check(index, cache=None):
+    """Report on every recipe in index; return the exit status.
+
+    Nothing is cached: every check is a lookup in the index.
+    """
+    recipe_dirs = find_recipe_dirs(index)
     if not recipe_dirs:
         print("WARNING: No recipe directories found.")
-        sys.exit(0)
+        return 0
     all_errors = []
     for rd in recipe_dirs:
-        all_errors.extend(validate_recipe(rd))
+        all_errors.extend(validate_recipe(rd, index))
     if all_errors:
         print(f"Structure validation FAILED ({len(all_errors)} errors):")
         for e in all_errors:
             print(f"  ERROR: {e}")
-        sys.exit(1)
-    else:
-        print(f"Structure validation passed: {len(recipe_dirs)} recipes OK.")
+        return 1
+    print(f"Structure validation passed: {len(recipe_dirs)} recipes OK.")
+    return 0
+
+
+def main():
+    sys.exit(check(repo_index.scan()))
 
 
-main()
+if __name__ == "__main__":
+    main()